@@ -16,6 +16,7 @@ import dj_database_url # Import dj_database_url for production database configur
 from dotenv import load_dotenv # Import load_dotenv for local environment variables
 load_dotenv()
 from django.conf.global_settings import LOGIN_URL
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -154,3 +155,114 @@ if not DEBUG:
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Cache
+# CACHE_BACKEND selects the shared cache used for catalog reads (shop/catalog_cache.py)
+# and the header badge counters (cart/counters.py):
+#   locmem - per-process memory; only for a single process (WEB_CONCURRENCY=1 / runserver)
+#   file   - files under CACHE_LOCATION, shared by all processes on the host
+#            (default whenever gunicorn.conf.py runs more than one worker)
+#   redis  - any Redis-protocol server at CACHE_LOCATION (needs the `redis` package)
+# The catalog version counter and the badge counters must be shared by every worker:
+# with locmem, a change handled by one worker would leave the others serving stale pages.
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', 2))  # gunicorn workers, see gunicorn.conf.py
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'file' if WEB_CONCURRENCY > 1 else 'locmem')
+if CACHE_BACKEND == 'locmem' and WEB_CONCURRENCY > 1:
+    raise ImproperlyConfigured(
+        "CACHE_BACKEND=locmem is per process; use 'file' or 'redis' with WEB_CONCURRENCY > 1.")
+if CACHE_BACKEND == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('CACHE_LOCATION', 'redis://127.0.0.1:6379/1'),
+        }
+    }
+elif CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('CACHE_LOCATION', os.path.join(BASE_DIR, '.cache', 'django')),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'fashionstore',
+        }
+    }
+# `manage.py test` swaps in a private locmem cache, so tests never read or clear the shared one
+TEST_RUNNER = 'FashionStore.test_runner.FashionStoreTestRunner'
+CATALOG_CACHE_TIMEOUT = int(os.environ.get('CATALOG_CACHE_TIMEOUT', 600))  # Seconds per catalog entry
+# Per-user cart/favorite badge counters (cart/counters.py); adjusted in place, reloaded after this
+BADGE_COUNT_TIMEOUT = int(os.environ.get('BADGE_COUNT_TIMEOUT', 3600))
+
+# Stock held for an unpaid ONLINE order (cart/reservations.py). Expired holds are
+# released by `manage.py release_expired_reservations`; run it from cron every minute or so.
+STOCK_RESERVATION_TTL_SECONDS = int(os.environ.get('STOCK_RESERVATION_TTL_SECONDS', 900))
+
+# Payment gateway (cart/payments.py)
+RAZORPAY_KEY_ID = os.environ.get('RAZORPAY_KEY_ID', 'rzp_test_oCeVyBXbBVFero')
+RAZORPAY_KEY_SECRET = os.environ.get('RAZORPAY_KEY_SECRET', 'fx3Z2TYQfYCbSSY77AQ5C0QY')
+# e.g. http://127.0.0.1:8765 for `manage.py run_fake_gateway`
+PAYMENT_GATEWAY_BASE_URL = os.environ.get('PAYMENT_GATEWAY_BASE_URL', 'https://api.razorpay.com')
+PAYMENT_GATEWAY_CONNECT_TIMEOUT = float(os.environ.get('PAYMENT_GATEWAY_CONNECT_TIMEOUT', 3.05))
+PAYMENT_GATEWAY_TIMEOUT = float(os.environ.get('PAYMENT_GATEWAY_TIMEOUT', 10))  # Read timeout, seconds
+PAYMENT_GATEWAY_RETRIES = int(os.environ.get('PAYMENT_GATEWAY_RETRIES', 2))
+PAYMENT_GATEWAY_POOL_SIZE = int(os.environ.get('PAYMENT_GATEWAY_POOL_SIZE', 10))
+PAYMENT_GATEWAY_BREAKER_THRESHOLD = int(os.environ.get('PAYMENT_GATEWAY_BREAKER_THRESHOLD', 5))
+PAYMENT_GATEWAY_BREAKER_RESET_SECONDS = float(os.environ.get('PAYMENT_GATEWAY_BREAKER_RESET_SECONDS', 30))
+# Secret configured for the Razorpay webhook; the webhook endpoint refuses requests while it is empty
+RAZORPAY_WEBHOOK_SECRET = os.environ.get('RAZORPAY_WEBHOOK_SECRET', '')
+
+# Payment confirmation inbox (cart/payment_inbox.py), drained by `manage.py process_payment_events`
+PAYMENT_EVENT_MAX_ATTEMPTS = int(os.environ.get('PAYMENT_EVENT_MAX_ATTEMPTS', 5))
+# Wait before retrying a failed event; doubles with every further failure
+PAYMENT_EVENT_RETRY_SECONDS = int(os.environ.get('PAYMENT_EVENT_RETRY_SECONDS', 30))
+
+# Orders per page on "My Orders" (cart/order_history.py)
+ORDER_HISTORY_PAGE_SIZE = int(os.environ.get('ORDER_HISTORY_PAGE_SIZE', 10))
+
+# Fashion Bot intent model (shop/chatbot_model.py), built by `manage.py build_chatbot_model`
+CHATBOT_INTENTS_PATH = os.path.join(BASE_DIR, 'shop', 'chatbot_intents.json')
+CHATBOT_ARTIFACT_DIR = os.environ.get('CHATBOT_ARTIFACT_DIR', os.path.join(BASE_DIR, '.cache', 'chatbot'))
+# Seconds between checks for an edited intents file or rebuilt artifact (shop/chatbot_registry.py); 0 disables
+CHATBOT_RELOAD_CHECK_SECONDS = int(os.environ.get('CHATBOT_RELOAD_CHECK_SECONDS', 10))
+# spaCy pipeline for slot extraction: 'full', 'lean' (no parser/ner) or 'blank' (tokenizer + lookup lemmas)
+CHATBOT_NLP_MODE = os.environ.get('CHATBOT_NLP_MODE', 'lean')
+# Minimum LinearSVC decision score for an intent; lower scores get the 'fallback' reply.
+# Tune against logged messages with `manage.py evaluate_chatbot --threshold ...`.
+CHATBOT_CONFIDENCE_THRESHOLD = float(os.environ.get('CHATBOT_CONFIDENCE_THRESHOLD', -0.5))
+CHATBOT_BATCH_MAX_MESSAGES = 1000  # Per request to chatbot/batch/
+# Per-process LRU caches of analysed messages and product replies (shop/chatbot_cache.py)
+CHATBOT_CACHE_SIZE = int(os.environ.get('CHATBOT_CACHE_SIZE', 1024))  # Entries per cache
+CHATBOT_CACHE_TTL = int(os.environ.get('CHATBOT_CACHE_TTL', 600))  # Seconds
+# Multi-turn chatbot conversations (shop/chatbot_sessions.py), kept in the shared cache
+CHATBOT_SESSION_TTL = int(os.environ.get('CHATBOT_SESSION_TTL', 1800))  # Seconds since the last message
+CHATBOT_SESSION_MAX_RESULT_IDS = 500  # Larger result sets are not kept for refinement
+# Seconds before a worker rebuilds its chatbot product attribute index (shop/chatbot_index.py)
+CHATBOT_INDEX_REFRESH_SECONDS = int(os.environ.get('CHATBOT_INDEX_REFRESH_SECONDS', 300))
+# True makes the chat widget use the streaming chatbot/stream/ endpoint (server-sent events).
+# Run the ASGI app for it: gunicorn FashionStore.asgi -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker
+CHATBOT_STREAMING = os.environ.get('CHATBOT_STREAMING', 'False').lower() == 'true'
+# Load the chatbot and catalog caches in the gunicorn master before forking (gunicorn.conf.py, shop/warmup.py).
+# While enabled, /ready/ answers 503 until the warm-up has finished.
+WARMUP_ON_BOOT = os.environ.get('WARMUP_ON_BOOT', 'False').lower() == 'true'
+
+# Product listing facet index (shop/facets.py)
+# Seconds before a worker rebuilds its in-memory facet counts from the database.
+# Saves in the same worker are applied immediately through signals.
+FACET_INDEX_REFRESH_SECONDS = int(os.environ.get('FACET_INDEX_REFRESH_SECONDS', 300))
+
+# Product full-text search (shop/search.py)
+# 'auto' uses SQLite FTS5 when available and the in-process index otherwise ('fts5' / 'memory' to force one).
+SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND', 'auto')
+SEARCH_RESULT_LIMIT = 500  # Ranked matches listed per search; the listing says when more matched
+SEARCH_INDEX_REFRESH_SECONDS = int(os.environ.get('SEARCH_INDEX_REFRESH_SECONDS', 300))
+
+# Product listing pagination (shop/pagination.py)
+# True switches ProductListView from ?page=N (OFFSET + COUNT(*)) to opaque ?cursor= keyset pages.
+PRODUCT_LIST_CURSOR_PAGINATION = os.environ.get('PRODUCT_LIST_CURSOR_PAGINATION', 'False').lower() == 'true'
+
+# Product popularity (shop/popularity.py): a sale/favorite counts half as much after this many days.
+POPULARITY_HALF_LIFE_DAYS = 30
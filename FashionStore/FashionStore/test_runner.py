@@ -0,0 +1,27 @@
+"""
+Test runner that points the default cache at a private in-memory cache.
+
+settings.py defaults to the file cache under .cache/django, which outlives the
+test database and is shared with any server running from the same checkout.
+Tests that clear or fill the cache must not touch it.
+"""
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'fashionstore-tests',
+    }
+}
+
+
+class FashionStoreTestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._cache_override = override_settings(CACHES=TEST_CACHES)
+        self._cache_override.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._cache_override.disable()
+        super().teardown_test_environment(**kwargs)
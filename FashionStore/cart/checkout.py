@@ -0,0 +1,172 @@
+"""
+Transactional checkout for OrderFormView / paymentsuccessView.
+
+Checkout used to create one Order_items row per query and decrement stock
+with product.save(), after a check_stock() that compared stock in Python.
+Two shoppers could both pass the check for the last unit, and the second
+save() silently overwrote the first (lost update). Now:
+
+* the order lines are written with a single bulk_create();
+* stock is taken with one conditional UPDATE per product,
+      UPDATE shop_product SET stock = stock - q, ... WHERE id = p AND stock >= q
+  so the database decides who gets the last unit, and the sold units and
+  popularity are folded into that same statement;
+* everything runs in one transaction, so an oversold line rolls back the
+  order, its items and any stock already taken.
+
+Units held for unpaid online orders (cart/reservations.py) are not sellable:
+every stock check is against `stock - reserved`.
+"""
+import logging
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from cart import counters, reservations
+from cart.models import Cart, Order_items
+from shop import catalog_cache, popularity
+from shop.models import Product
+
+logger = logging.getLogger(__name__)
+
+
+class CheckoutError(Exception):
+    pass
+
+
+class EmptyCart(CheckoutError):
+    pass
+
+
+class OutOfStock(CheckoutError):
+    def __init__(self, product_id):
+        super().__init__(f"Not enough stock for product {product_id}.")
+        self.product_id = product_id
+
+
+def cart_lines(user):
+    return list(Cart.objects.filter(user=user).select_related('product'))
+
+
+def cart_total(lines):
+    return sum(line.quantity * line.product.price for line in lines)
+
+
+def _quantities(rows):
+    """Sums (product_id, quantity) pairs per product."""
+    quantities = Counter()
+    for product_id, quantity in rows:
+        quantities[product_id] += quantity
+    return quantities
+
+
+def create_order(order, lines):
+    """
+    Saves `order` and all of its lines (one INSERT for the lines), with the
+    line count, total and each product's current name/price/image copied in
+    for order history.
+    """
+    order.line_count = len(lines)
+    order.total = cart_total(lines)
+    order.save()
+    Order_items.objects.bulk_create([
+        Order_items(order=order, product_id=line.product_id, quantity=line.quantity,
+                    unit_price=line.product.price, product_name=line.product.name,
+                    product_image=line.product.image.name or None)
+        for line in lines
+    ])
+
+
+def take_stock(quantities, when=None, held=None):
+    """
+    Decrements stock for {product_id: quantity} and counts the units as sold.
+    `held` gives the units per product already reserved for this order; those
+    come out of Product.reserved instead of the sellable stock.
+    Raises OutOfStock for the first product that cannot cover its quantity;
+    call it inside a transaction so the earlier decrements roll back too.
+    """
+    held = held or {}
+    boost = popularity.decay_boost(when)
+    now = timezone.now()
+    # Fixed product order, so concurrent checkouts lock rows in the same sequence
+    for product_id, quantity in sorted(quantities.items()):
+        from_hold = min(held.get(product_id, 0), quantity)
+        updates = dict(stock=F('stock') - quantity, updated=now, **popularity.sale_updates(quantity, boost))
+        if from_hold:
+            updates['reserved'] = F('reserved') - from_hold
+        # Afterwards stock must still cover whatever other orders have reserved
+        taken = Product.objects.filter(
+            pk=product_id, stock__gte=F('reserved') - from_hold + quantity
+        ).update(**updates)
+        if not taken:
+            raise OutOfStock(product_id)
+    # .update() skips the Product signals. Orphan just the sold products' stock figures and the
+    # popularity-sorted listings, not the whole catalog.
+    catalog_cache.bump_stock_versions_on_commit(quantities)
+    catalog_cache.bump_version_on_commit(catalog_cache.POPULARITY)
+
+
+def _clear_cart(user_id):
+    Cart.objects.filter(user_id=user_id).delete()
+    transaction.on_commit(lambda: counters.reset_cart(user_id))
+
+
+@transaction.atomic
+def checkout_cod(user, order):
+    """Places a cash-on-delivery order for the user's cart."""
+    lines = cart_lines(user)
+    if not lines:
+        raise EmptyCart()
+    quantities = _quantities((line.product_id, line.quantity) for line in lines)
+    reservations.release_expired(product_ids=list(quantities))
+    order.user = user
+    order.is_ordered = True
+    order.amount = cart_total(lines)
+    create_order(order, lines)
+    take_stock(quantities)
+    _clear_cart(user.pk)
+    return order
+
+
+def start_online_checkout(user, order):
+    """
+    Saves an unpaid ONLINE order for the user's cart, reserves its stock for
+    STOCK_RESERVATION_TTL_SECONDS and returns the total. The stock is taken
+    by complete_online_payment() once Razorpay confirms the payment.
+    """
+    lines = cart_lines(user)
+    if not lines:
+        raise EmptyCart()
+    quantities = _quantities((line.product_id, line.quantity) for line in lines)
+    # Give back abandoned holds on these products before judging what is left
+    reservations.release_expired(product_ids=list(quantities))
+    order.user = user
+    order.is_ordered = False
+    order.amount = cart_total(lines)
+    with transaction.atomic():
+        create_order(order, lines)
+        short = reservations.hold(order, quantities)
+        if short is not None:
+            raise OutOfStock(short)
+    return order.amount
+
+
+@transaction.atomic
+def cancel_online_checkout(order):
+    """Undoes start_online_checkout() when no payment could be started: frees the holds, drops the order."""
+    reservations.release(reservations.claim(order.reservations.all()))
+    order.delete()
+
+
+@transaction.atomic
+def complete_online_payment(order):
+    """Converts the order's reserved stock into a sale and marks it ordered."""
+    held = reservations.claim(order.reservations.all())
+    # Holds the sweeper already released (payment finished after the TTL) come from free stock
+    take_stock(_quantities(order.items.values_list('product_id', 'quantity')), held=held)
+    order.is_ordered = True
+    order.save(update_fields=['is_ordered'])
+    _clear_cart(order.user_id)
+    return order
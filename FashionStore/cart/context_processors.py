@@ -1,5 +1,4 @@
-from cart.models import Cart
-from cart.models import  Favorite
+from cart import counters
 
 
 def cart_and_favorite_counts(request):
@@ -7,13 +6,8 @@ def cart_and_favorite_counts(request):
     favorite_items_count = 0
 
     if request.user.is_authenticated:
-        user = request.user
-
-        cart_items = Cart.objects.filter(user=user)
-        for item in cart_items:
-            cart_total_quantity += item.quantity
-
-        favorite_items_count = Favorite.objects.filter(user=user).count()
+        # Served from the per-user counters in cart/counters.py
+        cart_total_quantity, favorite_items_count = counters.get_counts(request.user.pk)
 
     return {
         'cart_item_count': cart_total_quantity,
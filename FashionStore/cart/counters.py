@@ -0,0 +1,85 @@
+"""
+Per-user cart quantity / favorites counters for the header badges.
+
+The counts live in the shared cache. The cart and favorites views adjust them
+in place with cache.incr() after each change, so rendering the header costs
+no queries. When a counter is missing (first visit, eviction, timeout) both
+are rebuilt together with a single aggregate query.
+
+Only Redis, memcached and locmem implement incr() atomically. FileBasedCache
+reads the value and writes it back, so two concurrent adjustments could lose
+one. On such a backend a change deletes the counter instead, and the next
+render rebuilds it from the database.
+
+Every worker must adjust and read the same counters, so the cache has to be
+shared between processes: settings.py defaults CACHE_BACKEND to the file
+backend and refuses locmem when gunicorn runs more than one worker.
+"""
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.memcached import BaseMemcachedCache
+from django.core.cache.backends.redis import RedisCache
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from cart.models import Cart, Favorite
+from shop.models import CustomUser
+
+def _cart_key(user_id):
+    return f"badges:cart:{user_id}"
+
+
+def _favorite_key(user_id):
+    return f"badges:favorites:{user_id}"
+
+
+def _load_counts(user_id):
+    cart_quantity = Cart.objects.filter(user=OuterRef('pk')).values('user').annotate(
+        total=Sum('quantity')).values('total')
+    favorites = Favorite.objects.filter(user=OuterRef('pk')).values('user').annotate(
+        total=Count('id')).values('total')
+    row = CustomUser.objects.filter(pk=user_id).annotate(
+        cart_quantity=Coalesce(Subquery(cart_quantity, output_field=IntegerField()), Value(0)),
+        favorites=Coalesce(Subquery(favorites, output_field=IntegerField()), Value(0)),
+    ).values_list('cart_quantity', 'favorites').first()
+    return row or (0, 0)
+
+
+def get_counts(user_id):
+    """Returns (cart quantity, favorites count) for a user."""
+    cached = cache.get_many([_cart_key(user_id), _favorite_key(user_id)])
+    if len(cached) == 2:
+        return cached[_cart_key(user_id)], cached[_favorite_key(user_id)]
+    cart_quantity, favorites = _load_counts(user_id)
+    timeout = getattr(settings, 'BADGE_COUNT_TIMEOUT', 3600)
+    cache.set_many({_cart_key(user_id): cart_quantity, _favorite_key(user_id): favorites}, timeout)
+    return cart_quantity, favorites
+
+
+_ATOMIC_INCR_BACKENDS = (RedisCache, BaseMemcachedCache, LocMemCache)
+
+
+def _adjust(key, delta):
+    if not delta:
+        return
+    if not isinstance(caches['default'], _ATOMIC_INCR_BACKENDS):
+        cache.delete(key)
+        return
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        pass  # Not cached yet; the next get_counts() loads the real value
+
+
+def adjust_cart(user_id, delta):
+    _adjust(_cart_key(user_id), delta)
+
+
+def adjust_favorites(user_id, delta):
+    _adjust(_favorite_key(user_id), delta)
+
+
+def reset_cart(user_id):
+    """For bulk cart changes (checkout); forces a reload on the next render."""
+    cache.delete(_cart_key(user_id))
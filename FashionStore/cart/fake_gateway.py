@@ -0,0 +1,122 @@
+"""
+Local stand-in for the parts of the Razorpay API that checkout calls
+(POST /v1/orders, GET /v1/orders/<id>), for offline load and failure testing.
+
+Latency, injected 5xx errors and hung requests (to trip client timeouts) are
+configurable. Like Razorpay, every create makes a new order, even when a hung
+request is answered after the client gave up; count them in `orders` to
+check that client retries do not create duplicates. Run it with `manage.py run_fake_gateway` and
+set PAYMENT_GATEWAY_BASE_URL=http://127.0.0.1:8765. Only the server API is
+faked: the browser checkout.js widget still talks to Razorpay.
+"""
+import json
+import random
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeGatewayState:
+    def __init__(self, latency=0.0, error_rate=0.0, hang_rate=0.0, hang_seconds=30.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.lock = threading.Lock()
+        self.orders = {}
+        self.requests = 0
+        self.failures = 0
+
+    def create_order(self, data):
+        with self.lock:
+            order = {
+                'id': f"order_{secrets.token_hex(7)}",
+                'entity': 'order',
+                'amount': data['amount'],
+                'amount_paid': 0,
+                'amount_due': data['amount'],
+                'currency': data.get('currency', 'INR'),
+                'receipt': data.get('receipt'),
+                'status': 'created',
+                'attempts': 0,
+                'notes': data.get('notes', []),
+                'created_at': int(time.time()),
+            }
+            self.orders[order['id']] = order
+            return order
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive, so the client's pooled connections are reused
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client timed out on a hung request and went away
+
+    def _error(self, status, code, description):
+        self._send(status, {'error': {'code': code, 'description': description}})
+
+    def _inject_faults(self):
+        """Applies the configured latency/faults; returns True if the request was already answered."""
+        state = self.state
+        with state.lock:
+            state.requests += 1
+        if state.latency:
+            time.sleep(state.latency)
+        if state.hang_rate and random.random() < state.hang_rate:
+            time.sleep(state.hang_seconds)
+        if state.error_rate and random.random() < state.error_rate:
+            with state.lock:
+                state.failures += 1
+            self._error(500, 'SERVER_ERROR', "Injected failure")
+            return True
+        return False
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        if self.path.rstrip('/') != '/v1/orders':
+            return self._error(404, 'BAD_REQUEST_ERROR', "The requested URL was not found on the server.")
+        if self._inject_faults():
+            return
+        try:
+            data = json.loads(raw or b'{}')
+        except ValueError:
+            return self._error(400, 'BAD_REQUEST_ERROR', "Invalid JSON body")
+        if not isinstance(data.get('amount'), int) or data['amount'] < 100:
+            return self._error(400, 'BAD_REQUEST_ERROR', "The amount must be atleast INR 1.00")
+        self._send(200, self.state.create_order(data))
+
+    def do_GET(self):
+        prefix = '/v1/orders/'
+        if not self.path.startswith(prefix):
+            return self._error(404, 'BAD_REQUEST_ERROR', "The requested URL was not found on the server.")
+        if self._inject_faults():
+            return
+        order = self.state.orders.get(self.path[len(prefix):].split('?')[0])
+        if order is None:
+            return self._error(400, 'BAD_REQUEST_ERROR', "The id provided does not exist")
+        self._send(200, order)
+
+
+def make_server(host='127.0.0.1', port=8765, **options):
+    """Returns a ThreadingHTTPServer; port=0 picks a free port (see server.server_address)."""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.state = FakeGatewayState(**options)
+    return server
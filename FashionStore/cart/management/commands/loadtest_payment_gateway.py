@@ -0,0 +1,47 @@
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from cart.payments import PaymentGatewayError, get_gateway
+
+
+class Command(BaseCommand):
+    help = ("Creates gateway orders concurrently through the shared gateway client and reports "
+            "throughput, latency and failures. Point PAYMENT_GATEWAY_BASE_URL at run_fake_gateway.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument('--amount', type=int, default=49900, help="Order amount in paise.")
+
+    def handle(self, *args, **options):
+        gateway = get_gateway()
+        outcomes = Counter()
+        latencies = []
+
+        def create(n):
+            started = time.perf_counter()
+            try:
+                gateway.create_order(options['amount'], receipt=f"loadtest-{started}-{n}")
+                outcome = 'ok'
+            except PaymentGatewayError as e:
+                outcome = type(e).__name__
+            return outcome, time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            for outcome, latency in pool.map(create, range(options['requests'])):
+                outcomes[outcome] += 1
+                latencies.append(latency)
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2] * 1000
+        p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000
+        self.stdout.write(f"{options['requests']} requests in {elapsed:.2f}s "
+                          f"({options['requests'] / elapsed:.1f} req/s), p50 {p50:.1f} ms, p95 {p95:.1f} ms")
+        for outcome, count in sorted(outcomes.items()):
+            self.stdout.write(f"  {outcome}: {count}")
+        self.stdout.write(f"Circuit breaker: {gateway.breaker.state}")
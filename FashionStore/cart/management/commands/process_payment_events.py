@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from cart.payment_inbox import process_batch
+
+
+class Command(BaseCommand):
+    help = "Completes paid orders from the payment event inbox (the checkout callback and webhook only queue them)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help="Events handled per transaction.")
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds to sleep when the inbox is empty.")
+        parser.add_argument('--once', action='store_true', help="Drain the inbox once and exit.")
+
+    def handle(self, *args, **options):
+        processed = 0
+        while True:
+            close_old_connections()
+            handled = process_batch(batch_size=options['batch_size'])
+            processed += handled
+            if handled:
+                continue
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} payment events."))
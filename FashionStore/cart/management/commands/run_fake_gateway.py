@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from cart.fake_gateway import make_server
+
+
+class Command(BaseCommand):
+    help = "Runs a local stand-in for the Razorpay orders API (set PAYMENT_GATEWAY_BASE_URL to its address)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency-ms', type=int, default=0, help="Delay added to every request.")
+        parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with a 500.")
+        parser.add_argument('--hang-rate', type=float, default=0.0,
+                            help="Fraction of requests held for --hang-seconds (trips client timeouts).")
+        parser.add_argument('--hang-seconds', type=float, default=30.0)
+
+    def handle(self, *args, **options):
+        server = make_server(
+            options['host'], options['port'],
+            latency=options['latency_ms'] / 1000,
+            error_rate=options['error_rate'],
+            hang_rate=options['hang_rate'],
+            hang_seconds=options['hang_seconds'],
+        )
+        host, port = server.server_address[:2]
+        self.stdout.write(self.style.SUCCESS(f"Fake payment gateway listening on http://{host}:{port}"))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            state = server.state
+            self.stdout.write(f"Served {state.requests} requests, {state.failures} injected failures, "
+                              f"{len(state.orders)} orders.")
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.4 on 2026-10-16 20:57
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def merge_duplicate_rows(apps, schema_editor):
+    # Racing add-to-cart clicks could leave several rows per (user, product);
+    # fold them into the oldest one before the constraint is added.
+    Cart = apps.get_model('cart', 'Cart')
+    duplicates = (
+        Cart.objects.values('user_id', 'product_id')
+        .annotate(rows=Count('id'), total=Sum('quantity'))
+        .filter(rows__gt=1)
+    )
+    for group in duplicates:
+        rows = Cart.objects.filter(user_id=group['user_id'], product_id=group['product_id']).order_by('id')
+        keep = rows.first()
+        rows.exclude(pk=keep.pk).delete()
+        Cart.objects.filter(pk=keep.pk).update(quantity=group['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0002_alter_order_items_order'),
+        ('shop', '0009_product_catalog_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_rows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(fields=('user', 'product'), name='cart_unique_user_product'),
+        ),
+    ]
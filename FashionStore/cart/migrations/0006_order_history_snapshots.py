@@ -0,0 +1,70 @@
+# Generated by Django 5.2.4 on 2026-10-16 21:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_snapshots(apps, schema_editor):
+    # Existing orders only have live product rows to go by; snapshot them as they are now
+    Order = apps.get_model('cart', 'Order')
+    Order_items = apps.get_model('cart', 'Order_items')
+    totals = {}
+    items = Order_items.objects.select_related('product').order_by('id')
+    batch = []
+    for item in items.iterator(chunk_size=500):
+        item.unit_price = item.product.price
+        item.product_name = item.product.name
+        item.product_image = item.product.image.name if item.product.image else None
+        batch.append(item)
+        count, total = totals.get(item.order_id, (0, 0))
+        totals[item.order_id] = (count + 1, total + item.quantity * item.product.price)
+        if len(batch) >= 500:
+            Order_items.objects.bulk_update(batch, ['unit_price', 'product_name', 'product_image'])
+            batch = []
+    if batch:
+        Order_items.objects.bulk_update(batch, ['unit_price', 'product_name', 'product_image'])
+    orders = list(Order.objects.filter(pk__in=totals))
+    for order in orders:
+        order.line_count, order.total = totals[order.pk]
+    Order.objects.bulk_update(orders, ['line_count', 'total'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0005_paymentevent'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='line_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='order_items',
+            name='product_image',
+            field=models.ImageField(blank=True, null=True, upload_to='product_images/'),
+        ),
+        migrations.AddField(
+            model_name='order_items',
+            name='product_name',
+            field=models.CharField(blank=True, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='order_items',
+            name='unit_price',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=8),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('is_ordered', True)), fields=['user', '-ordered_date', '-id'], name='cart_order_history_idx'),
+        ),
+        migrations.RunPython(backfill_snapshots, migrations.RunPython.noop),
+    ]
@@ -11,6 +11,12 @@ class Cart(models.Model):
     quantity=models.IntegerField(default=1)
     date_added=models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            # One row per product; cart/services.py relies on it for its atomic upsert
+            models.UniqueConstraint(fields=['user', 'product'], name='cart_unique_user_product'),
+        ]
+
     def __str__(self):
         return self.user.username
 
@@ -28,6 +34,17 @@ class Order(models.Model):
     amount=models.IntegerField(null=True)
     ordered_date=models.DateTimeField(default=timezone.now)
     delivery_status=models.BooleanField(default=False)
+    # Denormalized when the order is placed (cart/checkout.py), so order history never re-reads products
+    line_count=models.PositiveIntegerField(default=0)
+    total=models.DecimalField(max_digits=10, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            # Order history (cart/order_history.py): a user's placed orders, newest first
+            models.Index(fields=['user', '-ordered_date', '-id'], condition=models.Q(is_ordered=True),
+                         name='cart_order_history_idx'),
+        ]
+
     def __str__(self):
         return str(self.order_id)
 
@@ -35,6 +52,53 @@ class Order_items(models.Model):
     order=models.ForeignKey(Order, on_delete=models.CASCADE,related_name="items")
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity=models.IntegerField()
+    # Snapshot of the product at checkout; later price/name changes don't rewrite past orders
+    unit_price=models.DecimalField(max_digits=8, decimal_places=2, default=0)
+    product_name=models.CharField(max_length=200, blank=True)
+    product_image=models.ImageField(upload_to='product_images/', null=True, blank=True)
+
+    def subtotal(self):
+        return self.quantity*self.unit_price
+
+
+class StockReservation(models.Model):
+    """Stock held for one line of an unpaid online order until `expires_at`; see cart/reservations.py."""
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="reservations")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} for order {self.order_id}"
+
+
+class PaymentEvent(models.Model):
+    """A confirmed payment from the checkout callback or a Razorpay webhook, queued for cart/payment_inbox.py."""
+    PENDING = 'pending'
+    PROCESSED = 'processed'
+    FAILED = 'failed'
+    STATUS_CHOICES = ((PENDING, 'Pending'), (PROCESSED, 'Processed'), (FAILED, 'Failed'))
+
+    payment_id = models.CharField(max_length=50, unique=True)  # Gateway payment id; a retried callback is a no-op
+    gateway_order_id = models.CharField(max_length=50, db_index=True)  # Order.order_id
+    source = models.CharField(max_length=20)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)  # Pushed back after each failed attempt
+
+    class Meta:
+        indexes = [
+            # The worker's queue: pending events that are due, oldest first
+            models.Index(fields=['next_attempt_at', 'id'], condition=models.Q(status='pending'),
+                         name='cart_paymentevent_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.payment_id} ({self.status})"
 
 
 class Favorite(models.Model):
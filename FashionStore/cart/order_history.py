@@ -0,0 +1,33 @@
+"""
+Order history for OrderSummaryView.
+
+The page used to hand every placed order to the template, which then ran
+`order.items.all` per order and read each item's live product row for its
+name, price and image: 1 + orders + items queries, growing for the whole
+life of an account. Orders now carry their line count and total, and items
+carry a snapshot of the product taken at checkout (cart/checkout.py). A page
+of history therefore costs two queries, orders then their items, whatever
+its size. It is paged with the keyset CursorPaginator from shop/pagination.py
+over the cart_order_history_idx index.
+"""
+from django.conf import settings
+from django.db.models import Prefetch
+
+from cart.models import Order, Order_items
+from shop.pagination import CursorPaginator
+
+ORDERING = ('-ordered_date', '-id')
+
+
+def history_queryset(user):
+    items = Order_items.objects.only(
+        'id', 'order_id', 'quantity', 'unit_price', 'product_name', 'product_image'
+    ).order_by('id')
+    return Order.objects.filter(user=user, is_ordered=True).prefetch_related(Prefetch('items', queryset=items))
+
+
+def history_page(user, cursor=None, per_page=None):
+    """Returns a CursorPage of the user's placed orders, newest first, with their items prefetched."""
+    if per_page is None:
+        per_page = getattr(settings, 'ORDER_HISTORY_PAGE_SIZE', 10)
+    return CursorPaginator(history_queryset(user), per_page, ORDERING).page(cursor)
@@ -0,0 +1,104 @@
+"""
+Durable inbox for payment confirmations.
+
+paymentsuccessView used to complete the order inline. It flipped is_ordered,
+took the stock and cleared the cart while the shopper waited, with nothing
+to stop a retried callback from doing it all again. Now:
+
+* the browser callback and the Razorpay webhook only record() a PaymentEvent.
+  The unique payment_id turns a repeat of the same payment, from either
+  source, into a no-op;
+* `manage.py process_payment_events` drains the inbox in batches with
+  process_batch(). Each event completes its order in its own savepoint, so
+  one bad event does not hold up the rest of the batch. A failed event is
+  retried after PAYMENT_EVENT_RETRY_SECONDS, doubling with each failure,
+  until PAYMENT_EVENT_MAX_ATTEMPTS;
+* the shopper's browser polls PaymentStatusView until the order is paid.
+
+An order that is already paid is never completed twice: the order row is
+locked before is_ordered is checked, so two events for one order (callback and
+webhook, or a second payment) handled by different workers take turns, and the
+later one is just marked processed.
+"""
+import datetime
+import logging
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from cart import checkout
+from cart.models import Order, PaymentEvent
+
+logger = logging.getLogger(__name__)
+
+
+def record(payment_id, gateway_order_id, source, payload=None):
+    """Stores a payment confirmation once. Returns (event, created)."""
+    try:
+        with transaction.atomic():
+            event = PaymentEvent.objects.create(
+                payment_id=payment_id, gateway_order_id=gateway_order_id, source=source, payload=payload or {},
+            )
+            return event, True
+    except IntegrityError:
+        return PaymentEvent.objects.get(payment_id=payment_id), False
+
+
+def _complete(event):
+    # Another worker completing this order holds the lock until it commits; is_ordered is read after that
+    order = Order.objects.select_for_update().filter(order_id=event.gateway_order_id).first()
+    if order is None:
+        raise Order.DoesNotExist(f"No order with gateway id {event.gateway_order_id}")
+    if not order.is_ordered:
+        checkout.complete_online_payment(order)
+
+
+def retry_delay(attempts):
+    """How long to wait after an event's `attempts`-th failure."""
+    return datetime.timedelta(seconds=getattr(settings, 'PAYMENT_EVENT_RETRY_SECONDS', 30) * 2 ** (attempts - 1))
+
+
+def process_batch(batch_size=50, now=None):
+    """Handles up to `batch_size` pending events that are due. Returns how many were picked up."""
+    max_attempts = getattr(settings, 'PAYMENT_EVENT_MAX_ATTEMPTS', 5)
+    now = now or timezone.now()
+    with transaction.atomic():
+        # skip_locked lets several workers share the queue (on databases with row locks)
+        events = list(
+            PaymentEvent.objects.select_for_update(skip_locked=True)
+            .filter(status=PaymentEvent.PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        if not events:
+            return 0
+        for event in events:
+            event.attempts += 1
+            try:
+                with transaction.atomic():
+                    _complete(event)
+            except checkout.OutOfStock as e:
+                logger.error(f"Payment {event.payment_id} for order {event.gateway_order_id} "
+                             f"cannot be fulfilled ({e}); needs a refund")
+                event.status, event.error = PaymentEvent.FAILED, str(e)
+            except Exception as e:
+                logger.exception(f"Payment event {event.payment_id} failed (attempt {event.attempts})")
+                event.error = repr(e)
+                if event.attempts >= max_attempts:
+                    event.status = PaymentEvent.FAILED
+                else:
+                    event.next_attempt_at = now + retry_delay(event.attempts)
+            else:
+                event.status, event.error, event.processed_at = PaymentEvent.PROCESSED, '', now
+        PaymentEvent.objects.bulk_update(events, ['status', 'attempts', 'error', 'processed_at', 'next_attempt_at'])
+    return len(events)
+
+
+def order_status(order):
+    """'paid', 'failed' or 'pending', for the status page the browser polls."""
+    if order.is_ordered:
+        return 'paid'
+    events = PaymentEvent.objects.filter(gateway_order_id=order.order_id)
+    if events.filter(status=PaymentEvent.FAILED).exists() and not events.filter(status=PaymentEvent.PENDING).exists():
+        return 'failed'
+    return 'pending'
@@ -0,0 +1,198 @@
+"""
+Payment gateway client used by checkout.
+
+OrderFormView used to build a new razorpay.Client (and with it a new HTTP
+session and TLS handshake) on every checkout, and call it with no timeout.
+A slow gateway therefore pinned a gunicorn worker per shopper. All calls
+now go through one RazorpayGateway per process:
+
+* one requests.Session with a bounded connection pool, reused by every call;
+* connect/read timeouts on every request (PAYMENT_GATEWAY_TIMEOUT);
+* up to PAYMENT_GATEWAY_RETRIES retries with backoff. Reads are retried on
+  connection errors, timeouts and 5xx responses. Razorpay's Orders API has no
+  idempotency keys, so an order create is retried only when the connection
+  failed: after a read timeout or a 5xx the gateway may already have created
+  the order, and a retry could create a second one;
+* a CircuitBreaker. After PAYMENT_GATEWAY_BREAKER_THRESHOLD failures in a row
+  calls fail fast with GatewayUnavailable for
+  PAYMENT_GATEWAY_BREAKER_RESET_SECONDS, then a single trial call decides
+  whether to close it again.
+
+Point PAYMENT_GATEWAY_BASE_URL at `manage.py run_fake_gateway` (cart/fake_gateway.py)
+to exercise checkout offline.
+"""
+import random
+import threading
+import time
+
+import razorpay
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class PaymentGatewayError(Exception):
+    pass
+
+
+class GatewayUnavailable(PaymentGatewayError):
+    """The gateway is down, timing out or the circuit breaker is open; worth retrying later."""
+
+
+class PaymentRejected(PaymentGatewayError):
+    """The gateway refused the request itself (4xx); retrying will not help."""
+
+
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+
+    @property
+    def state(self):
+        return self._state
+
+    def allow(self):
+        """True if a call may go out now."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self._state = self.HALF_OPEN
+                self._trial_running = False
+            # Half-open: let exactly one trial call through
+            if self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning(f"Payment gateway circuit opened after {self._failures} failures")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class RazorpayGateway:
+    _TRANSIENT = (requests.RequestException, razorpay.errors.ServerError, razorpay.errors.GatewayError)
+    # Failures where the request cannot have been acted on (includes ConnectTimeout, not ReadTimeout)
+    _NOT_SENT = (requests.ConnectionError,)
+
+    def __init__(self, key_id, key_secret, base_url=None, timeout=(3.05, 10), retries=2,
+                 pool_size=10, breaker=None, backoff=0.2):
+        self.key_id = key_id
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.session = requests.Session()
+        # Retries are handled below (they must respect the breaker), not by urllib3
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        options = {'base_url': base_url} if base_url else {}
+        self.client = razorpay.Client(session=self.session, auth=(key_id, key_secret), **options)
+
+    def _call(self, method, *args, retry_on=_TRANSIENT):
+        last_error = None
+        for attempt in range(self.retries + 1):
+            if not self.breaker.allow():
+                raise GatewayUnavailable("Payment gateway circuit is open.") from last_error
+            try:
+                result = method(*args, timeout=self.timeout)
+            except razorpay.errors.BadRequestError as e:
+                # The gateway answered; it is healthy even though it said no
+                self.breaker.record_success()
+                raise PaymentRejected(str(e)) from e
+            except self._TRANSIENT as e:
+                self.breaker.record_failure()
+                last_error = e
+                logger.warning(f"Payment gateway call failed (attempt {attempt + 1}): {e!r}")
+                if not isinstance(e, retry_on):
+                    break
+                if attempt < self.retries:
+                    time.sleep(self.backoff * 2 ** attempt * (1 + random.random()))
+            else:
+                self.breaker.record_success()
+                return result
+        raise GatewayUnavailable("Payment gateway did not respond.") from last_error
+
+    def create_order(self, amount, currency='INR', receipt=None):
+        """
+        Creates a gateway order for `amount` in currency subunits (paise). Only retried when the
+        connection failed, so a slow gateway cannot end up with two orders for one checkout.
+        """
+        data = {'amount': amount, 'currency': currency}
+        if receipt:
+            data['receipt'] = receipt
+        return self._call(self.client.order.create, data, retry_on=self._NOT_SENT)
+
+    def fetch_order(self, order_id):
+        return self._call(self.client.order.fetch, order_id)
+
+    # Signature checks are local HMACs; they never touch the network or the breaker
+    def verify_payment(self, order_id, payment_id, signature):
+        """Checks the signature Razorpay's checkout posts back with a payment."""
+        try:
+            return self.client.utility.verify_payment_signature({
+                'razorpay_order_id': order_id,
+                'razorpay_payment_id': payment_id,
+                'razorpay_signature': signature,
+            })
+        except razorpay.errors.SignatureVerificationError:
+            return False
+
+    def verify_webhook(self, body, signature, secret):
+        if not secret or not signature:
+            return False
+        try:
+            return self.client.utility.verify_webhook_signature(body, signature, secret)
+        except razorpay.errors.SignatureVerificationError:
+            return False
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    """The process-wide gateway client, created on first use (i.e. after gunicorn forks)."""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = RazorpayGateway(
+                    settings.RAZORPAY_KEY_ID,
+                    settings.RAZORPAY_KEY_SECRET,
+                    base_url=settings.PAYMENT_GATEWAY_BASE_URL,
+                    timeout=(settings.PAYMENT_GATEWAY_CONNECT_TIMEOUT, settings.PAYMENT_GATEWAY_TIMEOUT),
+                    retries=settings.PAYMENT_GATEWAY_RETRIES,
+                    pool_size=settings.PAYMENT_GATEWAY_POOL_SIZE,
+                    breaker=CircuitBreaker(settings.PAYMENT_GATEWAY_BREAKER_THRESHOLD,
+                                           settings.PAYMENT_GATEWAY_BREAKER_RESET_SECONDS),
+                )
+    return _gateway
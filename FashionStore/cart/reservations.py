@@ -0,0 +1,108 @@
+"""
+Time-boxed stock reservations for ONLINE orders.
+
+An online order used to leave stock untouched until Razorpay called back,
+so any number of shoppers could start paying for the same last unit, and an
+abandoned payment gave nothing back explicitly. Starting an online checkout
+now *holds* the units instead:
+
+* Product.reserved counts the units held by unpaid orders, so
+  sellable stock is `stock - reserved` (Product.sellable_stock). Holding is one
+  conditional UPDATE per product (reserved + q <= stock), like taking stock.
+* A StockReservation row per product records the hold with its expiry.
+* On payment success cart/checkout.py claims the rows and converts the held
+  units into a sale. Holds that expired before the callback are taken from
+  free stock again.
+* release_expired() hands expired holds back in batches. It runs from
+  `manage.py release_expired_reservations` (cron), and for the products in
+  a cart just before they are held again.
+"""
+import datetime
+import logging
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from cart.models import StockReservation
+from shop import catalog_cache
+from shop.models import Product
+
+logger = logging.getLogger(__name__)
+
+
+def reservation_ttl():
+    return datetime.timedelta(seconds=getattr(settings, 'STOCK_RESERVATION_TTL_SECONDS', 900))
+
+
+def hold(order, quantities, now=None):
+    """
+    Reserves {product_id: quantity} for `order`. Returns None on success or
+    the id of the first product without enough sellable stock. In that case
+    the caller's transaction must roll back the holds already made.
+    """
+    now = now or timezone.now()
+    for product_id, quantity in sorted(quantities.items()):
+        held = Product.objects.filter(pk=product_id, stock__gte=F('reserved') + quantity).update(
+            reserved=F('reserved') + quantity
+        )
+        if not held:
+            return product_id
+    expires_at = now + reservation_ttl()
+    StockReservation.objects.bulk_create([
+        StockReservation(order=order, product_id=product_id, quantity=quantity, expires_at=expires_at)
+        for product_id, quantity in quantities.items()
+    ])
+    catalog_cache.bump_stock_versions_on_commit(quantities)
+    return None
+
+
+def claim(queryset, skip_locked=False):
+    """
+    Deletes the reservations in `queryset` and returns the {product_id: quantity}
+    they held. Product.reserved is left to the caller. Run inside a
+    transaction; the rows are locked first, so a payment callback and the
+    sweeper can never both claim the same hold.
+    """
+    rows = list(queryset.select_for_update(skip_locked=skip_locked).values_list('id', 'product_id', 'quantity'))
+    if not rows:
+        return {}
+    StockReservation.objects.filter(id__in=[row[0] for row in rows]).delete()
+    quantities = Counter()
+    for _, product_id, quantity in rows:
+        quantities[product_id] += quantity
+    return quantities
+
+
+def release(quantities):
+    """Returns held units to sellable stock; `quantities` as returned by claim()."""
+    for product_id, quantity in quantities.items():
+        released = Product.objects.filter(pk=product_id, reserved__gte=quantity).update(
+            reserved=F('reserved') - quantity
+        )
+        if not released:
+            logger.warning(f"Product {product_id} had fewer than {quantity} units reserved; resetting to 0")
+            Product.objects.filter(pk=product_id).update(reserved=0)
+    catalog_cache.bump_stock_versions_on_commit(quantities)
+
+
+def release_expired(batch_size=500, product_ids=None, now=None):
+    """Releases holds past their expiry, `batch_size` per transaction. Returns the number of units released."""
+    now = now or timezone.now()
+    expired = StockReservation.objects.filter(expires_at__lte=now)
+    if product_ids is not None:
+        expired = expired.filter(product_id__in=product_ids)
+    released = 0
+    while True:
+        with transaction.atomic():
+            # Rows another transaction is converting right now are skipped, not waited for
+            quantities = claim(expired.order_by('id')[:batch_size], skip_locked=True)
+            if not quantities:
+                break
+            release(quantities)
+        released += sum(quantities.values())
+    if released:
+        logger.info(f"Released {released} expired reserved units")
+    return released
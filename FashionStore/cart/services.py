@@ -0,0 +1,55 @@
+"""
+Cart mutations as single atomic statements.
+
+The cart views used to load the Cart row, change `quantity` in Python and
+save() it back. Two quick clicks could then lose an increment, or both miss
+the row and insert a duplicate (user, product) pair, after which
+Cart.objects.get() raised MultipleObjectsReturned. Every change below is a
+single UPDATE/DELETE with F() expressions, backed by the cart_unique_user_product
+constraint. The database serializes concurrent requests, so no
+read-modify-write window is left.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from cart.models import Cart
+from shop.models import Product
+
+
+def add_item(user, product_id, quantity=1):
+    """
+    Adds `quantity` of a product to the user's cart. Usually a single
+    UPDATE. The first add of a product INSERTs the row instead, and if
+    another request inserts it at the same moment, the constraint turns
+    this insert into an UPDATE.
+    Raises Product.DoesNotExist for an unknown product.
+    """
+    rows = Cart.objects.filter(user=user, product_id=product_id)
+    if rows.update(quantity=F('quantity') + quantity):
+        return
+    if not Product.objects.filter(pk=product_id).exists():
+        raise Product.DoesNotExist(f"Product {product_id} does not exist.")
+    try:
+        with transaction.atomic():
+            Cart.objects.create(user=user, product_id=product_id, quantity=quantity)
+    except IntegrityError:
+        # Lost the race to create the row; it exists now
+        rows.update(quantity=F('quantity') + quantity)
+
+
+def decrement_item(user, product_id):
+    """
+    Removes one unit, deleting the row when it reaches zero.
+    Returns True if the cart changed.
+    """
+    rows = Cart.objects.filter(user=user, product_id=product_id)
+    if rows.filter(quantity__gt=1).update(quantity=F('quantity') - 1):
+        return True
+    deleted, _ = rows.filter(quantity__lte=1).delete()
+    return bool(deleted)
+
+
+def remove_item(user, product_id):
+    """Deletes the product from the cart. Returns True if it was there."""
+    deleted, _ = Cart.objects.filter(user=user, product_id=product_id).delete()
+    return bool(deleted)
@@ -0,0 +1,20 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from cart.models import Favorite
+from cart import counters
+from shop import popularity
+
+
+# --- Favorite signals: keep product popularity and the header badge count current ---
+@receiver(post_save, sender=Favorite)
+def count_favorite(sender, instance, created, **kwargs):
+    if created:
+        popularity.record_favorite(instance.product_id, instance.added_at)
+        counters.adjust_favorites(instance.user_id, 1)
+
+
+@receiver(post_delete, sender=Favorite)
+def uncount_favorite(sender, instance, **kwargs):
+    popularity.remove_favorite(instance.product_id, instance.added_at)
+    counters.adjust_favorites(instance.user_id, -1)
@@ -1,3 +1,430 @@
-from django.test import TestCase
+import datetime
+import hashlib
+import hmac
+import tempfile
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.db import OperationalError, connection
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from cart import checkout, counters, order_history, payment_inbox, payments, reservations
+from cart.context_processors import cart_and_favorite_counts
+from cart.fake_gateway import make_server
+from cart import services as cart_service
+from cart.models import Cart, Favorite, Order, Order_items, PaymentEvent, StockReservation
+from shop import catalog_cache
+from shop.models import Category, CustomUser, Product
+
+
+def _make_product(name='Linen Shirt'):
+    category = Category.objects.create(name='Men')
+    return Product.objects.create(name=name, category=category, price=999, stock=10)
+
+
+class CartServiceTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='shopper', password='x')
+        self.product = _make_product()
+
+    def test_add_decrement_remove(self):
+        cart_service.add_item(self.user, self.product.pk)
+        cart_service.add_item(self.user, self.product.pk)
+        self.assertEqual(Cart.objects.get(user=self.user, product=self.product).quantity, 2)
+
+        self.assertTrue(cart_service.decrement_item(self.user, self.product.pk))
+        self.assertEqual(Cart.objects.get(user=self.user, product=self.product).quantity, 1)
+        self.assertTrue(cart_service.decrement_item(self.user, self.product.pk))
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+        self.assertFalse(cart_service.decrement_item(self.user, self.product.pk))
+
+        cart_service.add_item(self.user, self.product.pk, quantity=3)
+        self.assertTrue(cart_service.remove_item(self.user, self.product.pk))
+        self.assertFalse(cart_service.remove_item(self.user, self.product.pk))
+
+    def test_unknown_product(self):
+        with self.assertRaises(Product.DoesNotExist):
+            cart_service.add_item(self.user, self.product.pk + 1000)
+
+
+class BadgeCounterTests(TestCase):
+    def setUp(self):
+        cache.clear()  # Entries from earlier tests outlive their test database
+        self.user = CustomUser.objects.create_user(username='shopper', password='x')
+        self.client.force_login(self.user)
+        self.shirt = _make_product()
+        self.dress = Product.objects.create(name='Floral Dress', category=self.shirt.category, price=1499, stock=10)
+
+    def assertCounts(self, cart_quantity, favorites, rebuilt=False):
+        """The badge counts match the database; adjusted in place, or rebuilt by one query after a reset."""
+        self.assertEqual(counters._load_counts(self.user.pk), (cart_quantity, favorites))
+        with self.assertNumQueries(1 if rebuilt else 0):
+            self.assertEqual(counters.get_counts(self.user.pk), (cart_quantity, favorites))
+
+    def test_warm_render_costs_no_queries(self):
+        with self.assertNumQueries(1):  # One aggregate rebuilds both counters
+            self.assertEqual(counters.get_counts(self.user.pk), (0, 0))
+        request = RequestFactory().get('/')
+        request.user = self.user
+        with self.assertNumQueries(0):
+            self.assertEqual(cart_and_favorite_counts(request), {'cart_item_count': 0, 'favorite_item_count': 0})
+
+    def test_counts_follow_cart_and_favorite_changes(self):
+        counters.get_counts(self.user.pk)
+        self.client.get(reverse('cart:addtocart', args=[self.shirt.pk]))
+        self.client.get(reverse('cart:addtocart', args=[self.shirt.pk]))
+        self.client.get(reverse('cart:addtocart', args=[self.dress.pk]))
+        self.assertCounts(3, 0)
+        self.client.get(reverse('cart:addtocartminus', args=[self.shirt.pk]))
+        self.assertCounts(2, 0)
+        self.client.get(reverse('cart:addtocartdelete', args=[self.dress.pk]))
+        self.assertCounts(1, 0, rebuilt=True)
+
+        Favorite.objects.create(user=self.user, product=self.shirt)
+        favorite = Favorite.objects.create(user=self.user, product=self.dress)
+        self.assertCounts(1, 2)
+        favorite.delete()
+        self.assertCounts(1, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            checkout.checkout_cod(self.user, Order(address='1 Main St', phone=5550100, payment_method='COD'))
+        self.assertCounts(0, 1, rebuilt=True)
+
+    def test_file_cache_counters_are_rebuilt_instead_of_incremented(self):
+        # FileBasedCache.incr() is a get + set that can lose a concurrent adjustment
+        with tempfile.TemporaryDirectory() as location, override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}}):
+            counters.get_counts(self.user.pk)
+            self.client.get(reverse('cart:addtocart', args=[self.shirt.pk]))
+            self.assertCounts(1, 0, rebuilt=True)
+            Favorite.objects.create(user=self.user, product=self.shirt)
+            self.assertCounts(1, 1, rebuilt=True)
+
+
+class StockReservationTests(TestCase):
+    def setUp(self):
+        self.product = _make_product()
+        Product.objects.filter(pk=self.product.pk).update(stock=2)
+        self.users = [CustomUser.objects.create_user(username=f'shopper{n}', password='x') for n in range(3)]
+        for user in self.users:
+            Cart.objects.create(user=user, product=self.product, quantity=1)
+
+    def _start(self, user):
+        order = Order(address='1 Main St', phone=5550100, payment_method='ONLINE')
+        checkout.start_online_checkout(user, order)
+        return order
+
+    def test_holds_limit_sellable_stock(self):
+        first = self._start(self.users[0])
+        self._start(self.users[1])
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.reserved, self.product.sellable_stock), (2, 2, 0))
+        with self.assertRaises(checkout.OutOfStock):
+            self._start(self.users[2])
+
+        checkout.complete_online_payment(first)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.reserved), (1, 1))
+        self.assertFalse(first.reservations.exists())
+        self.assertFalse(Cart.objects.filter(user=self.users[0]).exists())
+
+    def test_expired_holds_are_released(self):
+        order = self._start(self.users[0])
+        self._start(self.users[1])
+        later = timezone.now() + reservations.reservation_ttl() + datetime.timedelta(seconds=1)
+        self.assertEqual(reservations.release_expired(batch_size=1, now=later), 2)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved, 0)
+        self.assertFalse(StockReservation.objects.exists())
+
+        # Paid after the hold lapsed: taken from free stock if there still is some
+        checkout.complete_online_payment(order)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.reserved), (1, 0))
+
+    def test_checkouts_only_invalidate_the_products_they_touch(self):
+        cache.clear()
+        other = Product.objects.create(name='Floral Dress', category=self.product.category, price=1499, stock=4)
+        detail_url = reverse('shop:productdetail', args=[self.product.pk])
+        self.assertContains(self.client.get(detail_url), "2 items available")
+        catalog_version = catalog_cache.get_version()
+        other_version = catalog_cache.get_version(catalog_cache.stock_namespace(other.pk))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order = self._start(self.users[0])
+        self.assertContains(self.client.get(detail_url), "1 items available")
+        with self.captureOnCommitCallbacks(execute=True):
+            checkout.complete_online_payment(order)
+        with self.captureOnCommitCallbacks(execute=True):
+            reservations.release(reservations.claim(self._start(self.users[1]).reservations.all()))
+        self.assertContains(self.client.get(detail_url), "1 items available")
+
+        self.assertEqual(catalog_cache.get_version(), catalog_version)
+        self.assertEqual(catalog_cache.get_version(catalog_cache.stock_namespace(other.pk)), other_version)
+
+
+class PaymentInboxTests(TestCase):
+    def setUp(self):
+        self.product = _make_product()
+        Product.objects.filter(pk=self.product.pk).update(stock=2)
+        self.user = CustomUser.objects.create_user(username='shopper', password='x')
+        Cart.objects.create(user=self.user, product=self.product, quantity=1)
+        self.order = Order(address='1 Main St', phone=5550100, payment_method='ONLINE')
+        checkout.start_online_checkout(self.user, self.order)
+        Order.objects.filter(pk=self.order.pk).update(order_id='order_test1')
+
+    def _callback(self, payment_id):
+        signature = hmac.new(settings.RAZORPAY_KEY_SECRET.encode(), f"order_test1|{payment_id}".encode(),
+                             hashlib.sha256).hexdigest()
+        return self.client.post(reverse('cart:paymentsuccess', args=[self.user.username]), {
+            'razorpay_order_id': 'order_test1', 'razorpay_payment_id': payment_id, 'razorpay_signature': signature,
+        })
+
+    def test_retried_callback_completes_the_order_once(self):
+        status_url = reverse('cart:paymentstatus', args=['order_test1']) + '?format=json'
+        self.assertRedirects(self._callback('pay_1'), reverse('cart:paymentstatus', args=['order_test1']),
+                             fetch_redirect_response=False)
+        self._callback('pay_1')
+        self.assertEqual(PaymentEvent.objects.count(), 1)
+        self.assertEqual(self.client.get(status_url).json(), {'status': 'pending'})
+
+        self.assertEqual(payment_inbox.process_batch(), 1)
+        self.assertEqual(self.client.get(status_url).json(), {'status': 'paid'})
+        # A second payment for an already paid order must not take stock again
+        payment_inbox.record('pay_2', 'order_test1', 'webhook')
+        self.assertEqual(payment_inbox.process_batch(), 1)
+        self.assertEqual(payment_inbox.process_batch(), 0)
+
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.reserved, self.product.units_sold), (1, 0, 1))
+        self.assertEqual(set(PaymentEvent.objects.values_list('status', flat=True)), {PaymentEvent.PROCESSED})
+
+    def test_two_events_for_one_order_complete_it_once(self):
+        payment_inbox.record('pay_1', 'order_test1', 'callback')
+        payment_inbox.record('pay_2', 'order_test1', 'webhook')
+        with mock.patch.object(Order.objects, 'select_for_update', wraps=Order.objects.select_for_update) as lock:
+            self.assertEqual(payment_inbox.process_batch(), 2)
+        self.assertEqual(lock.call_count, 2)  # The order is locked before each is_ordered check
+
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.reserved, self.product.units_sold), (1, 0, 1))
+        self.assertEqual(set(PaymentEvent.objects.values_list('status', flat=True)), {PaymentEvent.PROCESSED})
+
+    def test_failed_events_back_off(self):
+        payment_inbox.record('pay_1', 'order_unknown', 'webhook')
+        now = timezone.now()
+        self.assertEqual(payment_inbox.process_batch(now=now), 1)
+        self.assertEqual(payment_inbox.process_batch(now=now), 0)  # Not due again yet
+
+        event = PaymentEvent.objects.get()
+        self.assertEqual((event.status, event.attempts), (PaymentEvent.PENDING, 1))
+        self.assertEqual(event.next_attempt_at, now + payment_inbox.retry_delay(1))
+        later = event.next_attempt_at
+        self.assertEqual(payment_inbox.process_batch(now=later), 1)
+        event.refresh_from_db()
+        self.assertEqual(event.next_attempt_at - later, 2 * payment_inbox.retry_delay(1))
+
+    def test_bad_signature_is_not_queued(self):
+        response = self.client.post(reverse('cart:paymentsuccess', args=[self.user.username]), {
+            'razorpay_order_id': 'order_test1', 'razorpay_payment_id': 'pay_1', 'razorpay_signature': 'forged',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(PaymentEvent.objects.exists())
+
+
+class OrderHistoryTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='shopper', password='x')
+        category = Category.objects.create(name='Men')
+        self.products = [
+            Product.objects.create(name=f'Shirt {n}', category=category, price=100 * (n + 1), stock=50)
+            for n in range(3)
+        ]
+        for _ in range(5):
+            for product in self.products:
+                Cart.objects.create(user=self.user, product=product, quantity=2)
+            checkout.checkout_cod(self.user, Order(address='1 Main St', phone=5550100, payment_method='COD'))
+
+    def test_pages_cost_two_queries(self):
+        Product.objects.filter(pk=self.products[0].pk).update(price=999, name='Renamed')
+        with self.assertNumQueries(2):
+            page = order_history.history_page(self.user, per_page=3)
+            lines = [(item.product_name, item.unit_price, item.quantity) for order in page for item in order.items.all()]
+        self.assertEqual(len(page), 3)
+        self.assertEqual(len(lines), 9)
+        self.assertIn(('Shirt 0', 100, 2), lines)  # snapshot, not the live row
+        self.assertEqual((page.object_list[0].line_count, page.object_list[0].total), (3, 1200))
+
+        with self.assertNumQueries(2):
+            older = order_history.history_page(self.user, page.next_cursor, per_page=3)
+            [list(order.items.all()) for order in older]
+        self.assertEqual(len(older), 2)
+        self.assertFalse(older.has_next())
+        self.assertEqual(len({o.pk for o in page} | {o.pk for o in older}), 5)
+
+    def test_history_view(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('cart:ordersummery'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Shirt 2')
+
+
+class CartConcurrencyTests(TransactionTestCase):
+    """Hammers add_item() from several threads; no increment may be lost or duplicated."""
+    threads = 8
+    adds_per_thread = 25
+
+    def test_concurrent_adds(self):
+        user = CustomUser.objects.create_user(username='shopper', password='x')
+        product = _make_product()
+        start = threading.Barrier(self.threads)
+        errors = []
+
+        def worker():
+            try:
+                start.wait()
+                for _ in range(self.adds_per_thread):
+                    while True:
+                        try:
+                            cart_service.add_item(user, product.pk)
+                            break
+                        except OperationalError:
+                            # SQLite reports a busy/locked database instead of blocking; retry
+                            continue
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker) for _ in range(self.threads)]
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+
+        self.assertEqual(errors, [])
+        rows = Cart.objects.filter(user=user, product=product)
+        self.assertEqual(rows.count(), 1)
+        self.assertEqual(rows.get().quantity, self.threads * self.adds_per_thread)
+
+
+class CheckoutConcurrencyTests(TransactionTestCase):
+    """N shoppers race for the last unit; exactly one order may go through."""
+    shoppers = 8
+
+    def test_last_unit_sells_once(self):
+        product = _make_product()
+        Product.objects.filter(pk=product.pk).update(stock=1)
+        users = []
+        for n in range(self.shoppers):
+            user = CustomUser.objects.create_user(username=f'shopper{n}', password='x')
+            Cart.objects.create(user=user, product=product, quantity=1)
+            users.append(user)
+        start = threading.Barrier(self.shoppers)
+        outcomes = []
+
+        def worker(user):
+            try:
+                start.wait()
+                while True:
+                    order = Order(address='1 Main St', phone=5550100, payment_method='COD')
+                    try:
+                        checkout.checkout_cod(user, order)
+                        outcomes.append('ordered')
+                        break
+                    except checkout.OutOfStock:
+                        outcomes.append('sold out')
+                        break
+                    except OperationalError:
+                        continue  # SQLite busy/locked; the transaction rolled back, retry
+            except Exception as e:
+                outcomes.append(e)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker, args=(user,)) for user in users]
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+
+        self.assertEqual(sorted(map(str, outcomes)), ['ordered'] + ['sold out'] * (self.shoppers - 1))
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(Order_items.objects.count(), 1)
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 0)
+        self.assertEqual(product.units_sold, 1)
+        # The losers keep their carts
+        self.assertEqual(Cart.objects.count(), self.shoppers - 1)
+
+
+class PaymentGatewayTests(TestCase):
+    def setUp(self):
+        self.server = make_server(port=0)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        host, port = self.server.server_address[:2]
+        self.breaker = payments.CircuitBreaker(failure_threshold=3, reset_timeout=60)
+        self.gateway = payments.RazorpayGateway('key', 'secret', base_url=f"http://{host}:{port}",
+                                                timeout=(1, 0.5), retries=2, breaker=self.breaker, backoff=0)
+
+    def test_create_and_fetch_order(self):
+        order = self.gateway.create_order(49900, receipt='order-1')
+        self.assertEqual(order['amount'], 49900)
+        self.assertEqual(self.gateway.fetch_order(order['id'])['receipt'], 'order-1')
+
+    def test_rejected_request_is_not_retried(self):
+        with self.assertRaises(payments.PaymentRejected):
+            self.gateway.create_order(5)
+        self.assertEqual(self.server.state.requests, 1)
+        self.assertEqual(self.breaker.state, payments.CircuitBreaker.CLOSED)
+
+    def test_failures_are_retried_then_open_the_circuit(self):
+        self.server.state.error_rate = 1.0
+        with self.assertRaises(payments.GatewayUnavailable):
+            self.gateway.fetch_order('order_1')
+        self.assertEqual(self.server.state.requests, 3)  # first try + 2 retries
+        self.assertEqual(self.breaker.state, payments.CircuitBreaker.OPEN)
+
+        # Fails fast while open, without touching the gateway
+        with self.assertRaises(payments.GatewayUnavailable):
+            self.gateway.create_order(49900, receipt='order-2')
+        self.assertEqual(self.server.state.requests, 3)
+
+    def test_create_order_is_not_retried_once_sent(self):
+        # The gateway may have created the order before failing or timing out; a retry could duplicate it
+        self.server.state.error_rate = 1.0
+        with self.assertRaises(payments.GatewayUnavailable):
+            self.gateway.create_order(49900, receipt='order-3')
+        self.assertEqual(self.server.state.requests, 1)
+
+        self.server.state.error_rate = 0
+        self.server.state.hang_rate = 1.0
+        self.server.state.hang_seconds = 1
+        with self.assertRaises(payments.GatewayUnavailable):
+            self.gateway.create_order(49900, receipt='order-3')
+        self.assertEqual(self.server.state.requests, 2)
+        time.sleep(1)  # The hung request still completes on the gateway
+        self.assertEqual(len(self.server.state.orders), 1)
+
+    def test_create_order_is_retried_when_the_connection_fails(self):
+        self.server.shutdown()
+        self.server.server_close()
+        with self.assertRaises(payments.GatewayUnavailable) as raised:
+            self.gateway.create_order(49900, receipt='order-4')
+        self.assertIsInstance(raised.exception.__cause__, requests.ConnectionError)
+        self.assertEqual(self.breaker._failures, 3)  # first try + 2 retries
+
+    def test_timeout_counts_as_failure(self):
+        self.server.state.hang_rate = 1.0
+        self.server.state.hang_seconds = 2
+        self.gateway.retries = 0
+        with self.assertRaises(payments.GatewayUnavailable):
+            self.gateway.create_order(49900)
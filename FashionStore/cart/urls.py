@@ -26,6 +26,8 @@ urlpatterns = [
     path('addtocartdelete/<int:i>',views.AddtoCartdeleteView.as_view(),name="addtocartdelete"),
     path('orderform',views.OrderFormView.as_view(),name="orderform"),
     path('paymentsuccess/<i>', views.paymentsuccessView.as_view(), name="paymentsuccess"),
+    path('paymentstatus/<order_id>', views.PaymentStatusView.as_view(), name="paymentstatus"),
+    path('payments/webhook', views.PaymentWebhookView.as_view(), name="payment_webhook"),
 
     path('ordersummery/', views.OrderSummaryView.as_view(), name="ordersummery"),
 
@@ -1,26 +1,30 @@
 from django.contrib.auth import login
 from django.shortcuts import render,redirect,get_object_or_404
 from django.views import View
-from cart.models import Cart,Favorite, Order, Order_items
+from cart.models import Cart,Favorite, Order
 from shop.models import Product, CustomUser, Category
-import razorpay
+from cart import counters
+from cart import services as cart_service
+from cart import checkout, order_history, payment_inbox, payments
 from django.contrib import messages
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse
+from django.conf import settings
+import json
 from django.core.mail import send_mail
 from django.contrib.auth import authenticate, logout
 from django.db.models import Q, Count
 from django.views.generic import ListView
+import logging
+logger = logging.getLogger(__name__)
 
 class AddtoCartView(View):
     def get(self, request, i):
         u = request.user
-        p = Product.objects.get(id=i)
         try:
-            c = Cart.objects.get(user=u, product=p)
-            c.quantity += 1
-            c.save()
-        except Cart.DoesNotExist:
-            c = Cart.objects.create(user=u, product=p, quantity=1)
-            c.save()
+            cart_service.add_item(u, i)
+        except Product.DoesNotExist:
+            raise Http404("Product not found.")
+        counters.adjust_cart(u.pk, 1)
         return redirect('cart:cartview')
 
 class CartView(View):
@@ -36,37 +40,17 @@ class CartView(View):
 class AddtoCartMinusView(View):
     def get(self, request, i):
         u = request.user
-        p = Product.objects.get(id=i)
-        try:
-            c = Cart.objects.get(user=u, product=p)
-            if c.quantity > 1:
-                c.quantity -= 1
-                c.save()
-            else:
-                c.delete()
-        except Cart.DoesNotExist:
-            pass
+        if cart_service.decrement_item(u, i):
+            counters.adjust_cart(u.pk, -1)
         return redirect('cart:cartview')
 
 class AddtoCartdeleteView(View):
     def get(self, request, i):
         u = request.user
-        p = Product.objects.get(id=i)
-        try:
-            c = Cart.objects.get(user=u, product=p)
-            c.delete()
-        except Cart.DoesNotExist:
-            pass
+        if cart_service.remove_item(u, i):
+            counters.reset_cart(u.pk)
         return redirect('cart:cartview')
 
-def check_stock(c):
-    stock = True
-    for i in c:
-        if i.product.stock < i.quantity:
-            stock = False
-            break
-    return stock
-
 from cart.forms import OrderForm
 
 class OrderFormView(View):
@@ -75,52 +59,33 @@ class OrderFormView(View):
         form_instance = OrderForm(request.POST)
         if form_instance.is_valid():
             order_object = form_instance.save(commit=False)
-            order_object.user = u
-            order_object.save()
-
-            c = Cart.objects.filter(user=u)
-            stock_available = check_stock(c)
-            if stock_available:
-                for i in c:
-                    o = Order_items.objects.create(order=order_object, product=i.product, quantity=i.quantity)
-                    o.save()
-
-                total = 0
-                for i in c:
-                    total += i.quantity * i.product.price
-
-
+            try:
                 if order_object.payment_method == "ONLINE":
-                    client = razorpay.Client(auth=('rzp_test_oCeVyBXbBVFero', 'fx3Z2TYQfYCbSSY77AQ5C0QY'))
-
-                    response_payment = client.order.create(dict(amount=int(total * 100), currency='INR'))
-                    print(response_payment)
+                    total = checkout.start_online_checkout(u, order_object)
+                    gateway = payments.get_gateway()
+                    try:
+                        response_payment = gateway.create_order(int(total * 100), receipt=f"order-{order_object.pk}")
+                    except payments.PaymentGatewayError as e:
+                        logger.error(f"Could not create gateway order for order {order_object.pk}: {e!r}")
+                        checkout.cancel_online_checkout(order_object)
+                        messages.error(request, "Online payment is unavailable right now. Please try again shortly or choose COD.")
+                        return render(request, 'payment.html')
 
                     order_id = response_payment['id']
                     order_object.order_id=order_id
-                    order_object.is_ordered = False
-                    order_object.save()
-                    return render(request, 'payment.html', {'payment': response_payment, 'name': u.username})
+                    order_object.save(update_fields=['order_id'])
+                    return render(request, 'payment.html', {'payment': response_payment, 'name': u.username,
+                                                            'key_id': gateway.key_id})
 
                 elif order_object.payment_method == "COD":
-                    order_object.is_ordered = True
-                    order_object.amount = total
-                    order_object.save()
-                    items = Order_items.objects.filter(order=order_object)
-                    for i in items:
-                        i.product.stock -= i.quantity
-                        i.product.save()
-
-                    c = Cart.objects.filter(user=u)
-                    c.delete()
+                    checkout.checkout_cod(u, order_object)
                     messages.success(request, "Order placed successfully!")
                     return redirect('shop:home')
 
-                else:
-                    pass
-
-
-            else:
+            except checkout.EmptyCart:
+                messages.error(request, "Your cart is empty.")
+                return redirect('cart:cartview')
+            except checkout.OutOfStock:
                 messages.error(request, "Some items in your cart are currently out of stock or quantity exceeds available stock.")
                 return render(request, 'payment.html')
 
@@ -128,11 +93,8 @@ class OrderFormView(View):
         form_instance = OrderForm()
         u = request.user
 
-        cart_items = Cart.objects.filter(user=u)
-
-        total = 0
-        for item in cart_items:
-            total += item.quantity * item.product.price
+        cart_items = checkout.cart_lines(u)
+        total = checkout.cart_total(cart_items)
 
         return render(request, 'orderform.html', {'form': form_instance, 'cart': cart_items, 'total': total})
 
@@ -147,28 +109,58 @@ class paymentsuccessView(View):
         login(request,user)
 
         response = request.POST
-        print(response)
+        order_id = response.get('razorpay_order_id', '')
+        payment_id = response.get('razorpay_payment_id', '')
+        if not payments.get_gateway().verify_payment(order_id, payment_id, response.get('razorpay_signature', '')):
+            logger.warning(f"Rejected payment callback with a bad signature for order {order_id}")
+            messages.error(request, "We could not verify your payment. Please contact support if you were charged.")
+            return render(request, 'payment.html')
+
+        # Only queue the confirmation; the payment worker completes the order
+        payment_inbox.record(payment_id, order_id, 'callback', {
+            'razorpay_order_id': order_id, 'razorpay_payment_id': payment_id,
+        })
+        return redirect('cart:paymentstatus', order_id=order_id)
+
+
+class PaymentStatusView(View):
+    """Page the shopper waits on after paying; polls itself with ?format=json until the order is paid."""
+    def get(self, request, order_id):
+        order = get_object_or_404(Order, order_id=order_id, user=request.user.pk)
+        status = payment_inbox.order_status(order)
+        if request.GET.get('format') == 'json':
+            return JsonResponse({'status': status})
+        if status == 'paid':
+            messages.success(request, "Payment successful! Your order has been placed.")
+            return render(request, 'payment_success.html')
+        if status == 'failed':
+            messages.error(request, "Sorry, an item in your order sold out before the payment completed. Our support team will contact you about your payment.")
+            return render(request, 'payment.html')
+        return render(request, 'payment_status.html', {'order': order})
 
-        o = Order.objects.get(order_id=response['razorpay_order_id'])
-        o.is_ordered = True
-        o.save()
 
-        items = Order_items.objects.filter(order=o)
-        for i in items:
-            i.product.stock -= i.quantity
-            i.product.save()
-
-        c = Cart.objects.filter(user=user)
-        c.delete()
-
-        messages.success(request, "Payment successful! Your order has been placed.")
-        return render(request,'payment_success.html')
+@method_decorator(csrf_exempt,name='dispatch')
+class PaymentWebhookView(View):
+    """Razorpay webhook (payment.captured / order.paid); feeds the same inbox as the browser callback."""
+    def post(self, request):
+        body = request.body.decode('utf-8')
+        if not payments.get_gateway().verify_webhook(body, request.headers.get('X-Razorpay-Signature'),
+                                                     settings.RAZORPAY_WEBHOOK_SECRET):
+            return HttpResponseForbidden()
+        try:
+            event = json.loads(body)
+            payment = event['payload']['payment']['entity']
+        except (ValueError, KeyError, TypeError):
+            return HttpResponse(status=400)
+        if event.get('event') in ('payment.captured', 'order.paid') and payment.get('order_id'):
+            payment_inbox.record(payment['id'], payment['order_id'], 'webhook', event)
+        return HttpResponse(status=200)
 
 class OrderSummaryView(View):
     def get(self, request):
         u=request.user
-        orders=Order.objects.filter(user=u,is_ordered=True)
-        return render(request,template_name='ordersummery.html',context={'orders':orders})
+        page_obj = order_history.history_page(u, request.GET.get('cursor'))
+        return render(request,template_name='ordersummery.html',context={'orders':page_obj,'page_obj':page_obj})
 
 
 class FavoriteListView(View):
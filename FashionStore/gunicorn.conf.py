@@ -0,0 +1,31 @@
+"""
+gunicorn settings (Procfile: `gunicorn FashionStore.wsgi -c gunicorn.conf.py`).
+
+With WARMUP_ON_BOOT=True the app is imported once in the master (preload_app)
+and ShopConfig.warm_up() loads the chatbot and catalog caches there before any
+worker is forked, so workers start warm and share those pages copy-on-write
+(see shop/warmup.py). Recycled workers (max_requests) fork from the same warm master.
+
+The streaming chatbot endpoint (CHATBOT_STREAMING) needs the ASGI app:
+    gunicorn FashionStore.asgi -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = max_requests // 10
+accesslog = '-'
+errorlog = '-'
+
+preload_app = os.environ.get('WARMUP_ON_BOOT', 'False').lower() == 'true'
+
+
+def when_ready(server):
+    # Runs in the master once the listeners are open and before the first worker is spawned
+    if not preload_app:
+        return
+    from django.apps import apps
+
+    server.log.info("Warming up the shop app before forking workers")
+    apps.get_app_config('shop').warm_up()
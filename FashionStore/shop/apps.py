@@ -4,3 +4,17 @@ from django.apps import AppConfig
 class ShopConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'shop'
+
+    def ready(self):
+        # Connect the catalog signal handlers (facet index maintenance)
+        from . import signals  # noqa: F401
+
+    def warm_up(self):
+        """
+        Preload hook (WARMUP_ON_BOOT): loads the chatbot and hot catalog caches.
+        Called by gunicorn.conf.py in the master process, after the app is loaded
+        and before workers fork, not from ready(): the database is not meant to be
+        queried during app initialization.
+        """
+        from . import warmup
+        warmup.warm_up()
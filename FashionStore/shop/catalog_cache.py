@@ -0,0 +1,98 @@
+"""
+Cache-aside helpers for catalog reads (categories, products, listing pages).
+
+Every entry is stored under the current *catalog version*, a counter kept in
+the cache itself. The Category/SubCategory/Product signals in shop/signals.py
+bump it after each committed change, which orphans every older entry at once:
+readers never see a price or stock figure from before the change, and nothing
+has to track which keys a product appears in. Orphaned entries simply expire.
+
+Entries live in a namespace with its own counter: CATALOG for anything that
+shows products, NAVIGATION for the category menu, which only Category and
+SubCategory changes affect. Stock moves on every checkout (holds, releases,
+sales), so it has one small namespace per product instead, stock_namespace():
+the product detail page is keyed by both versions, and a sale only orphans the
+pages of the products it sold rather than the whole catalog. Sales and
+favorites also move Product.popularity, which only the sort_by=popularity
+listing pages depend on; their cache key carries the POPULARITY version.
+
+The backend is whatever settings.CACHES['default'] points at (file, Redis or
+locmem; see CACHE_BACKEND in settings.py). Every web process must see the same
+version counter, so settings.py defaults to the file backend and refuses
+locmem when gunicorn runs more than one worker.
+
+A bump writes a fresh random token with cache.set() rather than calling
+cache.incr(): FileBasedCache.incr() is a read followed by a write, so two
+workers bumping together could both write the same value, and each write
+would also reset the counter's timeout. Any new token orphans the old
+entries, so concurrent bumps need no coordination.
+"""
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+CATALOG = 'catalog'
+NAVIGATION = 'nav'  # Category/SubCategory only; product changes leave the menu alone
+POPULARITY = 'popularity'  # Product.popularity; bumped by shop/popularity.py and checkout
+
+
+def stock_namespace(product_id):
+    """Per-product namespace for reads showing its stock (bumped by holds, releases and sales)."""
+    return f"stock:{product_id}"
+
+
+def _version_key(namespace):
+    return f"{namespace}:version"
+
+
+def _new_version():
+    # Random rather than counted, so a version that was evicted can never come
+    # back at a value whose (stale) entries are still cached.
+    return uuid.uuid4().hex
+
+
+def get_version(namespace=CATALOG):
+    version = cache.get(_version_key(namespace))
+    if version is None:
+        cache.add(_version_key(namespace), _new_version(), None)
+        version = cache.get(_version_key(namespace))
+    return version
+
+
+def bump_version(namespace=CATALOG):
+    version = _new_version()
+    cache.set(_version_key(namespace), version, None)
+    return version
+
+
+def bump_version_on_commit(namespace=CATALOG):
+    """Bumps the version once the current transaction commits (immediately outside one)."""
+    transaction.on_commit(lambda: bump_version(namespace))
+
+
+def bump_stock_versions_on_commit(product_ids):
+    """Bumps the stock version of each product once the current transaction commits."""
+    product_ids = list(product_ids)
+    transaction.on_commit(lambda: [bump_version(stock_namespace(product_id)) for product_id in product_ids])
+
+
+def make_key(name, *parts, namespace=CATALOG):
+    if not parts:
+        return f"{namespace}:{name}"
+    digest = hashlib.md5(repr(parts).encode('utf-8')).hexdigest()
+    return f"{namespace}:{name}:{digest}"
+
+
+def get_or_set(name, builder, *parts, timeout=None, namespace=CATALOG, version=None):
+    """
+    Returns the cached value for (name, *parts) under the current version of
+    `namespace`, calling `builder()` and storing its result on a miss.
+    """
+    if timeout is None:
+        timeout = getattr(settings, 'CATALOG_CACHE_TIMEOUT', 600)
+    if version is None:
+        version = get_version(namespace)
+    return cache.get_or_set(make_key(name, *parts, namespace=namespace), builder, timeout, version=version)
@@ -0,0 +1,467 @@
+"""
+The Fashion Bot: intent classification, slot extraction and the product lookup
+behind ChatbotView.
+
+Kept out of shop/views.py so that importing the URLconf (every manage.py
+command, migration, test run and web worker) does not import spaCy, thinc,
+scipy and scikit-learn. This module and its helpers only import those
+libraries when the bot is first loaded (see chatbot_nlp.load_nlp and
+chatbot_model.load_model); `manage.py benchmark_imports` guards that.
+"""
+import json
+import random
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.urls import reverse, NoReverseMatch # Import NoReverseMatch
+
+from .models import Product
+from . import catalog_cache, chatbot_cache, chatbot_nlp, chatbot_registry, chatbot_sessions
+from .chatbot_index import chatbot_index
+from .chatbot_slots import extract_slots
+from .chatbot_vocab import PRODUCT_TYPE_KEYWORDS
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+# --- GLOBAL VARIABLES FOR LAZY LOADING ---
+# The spaCy pipeline is None until the chatbot is first accessed in a worker process.
+# The intent model lives in shop/chatbot_registry.py, which hot-reloads it.
+_lazy_fashion_loaded = False
+_lazy_fashion_nlp = None
+
+
+def _load_nlp():
+    global _lazy_fashion_loaded, _lazy_fashion_nlp
+
+    # Checked with a flag rather than `nlp is None`: without the spaCy model installed
+    # that stayed None and everything was reloaded on every message.
+    if not _lazy_fashion_loaded:  # Only load if not already loaded in this worker
+        logger.info("INFO: Starting lazy load of SpaCy model.")
+        # Only the components slot extraction needs; see CHATBOT_NLP_MODE in shop/chatbot_nlp.py
+        try:
+            _lazy_fashion_nlp = chatbot_nlp.load_nlp()
+            logger.info(f"spaCy pipeline {_lazy_fashion_nlp.pipe_names} loaded successfully for Fashion Bot (lazy).")
+        except Exception as e:
+            logger.error(f"An unexpected error occurred during lazy load of spaCy model: {e}", exc_info=True)
+            _lazy_fashion_nlp = None
+        _lazy_fashion_loaded = True
+    return _lazy_fashion_nlp
+
+
+def _load_fashion_bot_resources():
+    """
+    Returns (nlp, intents, vectorizer, clf): the spaCy pipeline, loaded once per worker process,
+    and the current version of the intent classifier from the model registry. The classifier
+    comes prebuilt from `manage.py build_chatbot_model` (see shop/chatbot_model.py) and is
+    reloaded in the background when the intents file changes (see shop/chatbot_registry.py).
+    """
+    model = chatbot_registry.registry.get()
+    return _load_nlp(), model.intents, model.vectorizer, model.clf
+
+
+# --- Your existing get_safe_reverse_url function (modified for FashionStore URLs) ---
+def get_safe_reverse_url(url_name, *args, **kwargs):
+    """
+    Safely attempts to reverse a URL name.
+    Returns '#' if NoReverseMatch error occurs to prevent 500 errors.
+    """
+    try:
+        return reverse(url_name, args=args, kwargs=kwargs)
+    except NoReverseMatch:
+        logger.error(f"NoReverseMatch error: URL name '{url_name}' not found in urls.py. Returning '#' as fallback.")
+        return "#"
+
+
+def _build_chatbot_product_queryset(main_category_preference, product_item_type, color, size, user_message_lower):
+    """
+    Builds the product queryset for a product_search_query message from the extracted slots.
+    Chat replies only use it for the free-text fallback (no slot extracted); slot lookups are
+    answered by shop/chatbot_index.py, which tests check against this queryset.
+    Kept separate from _get_chatbot_response_logic so its query plan can be checked in tests.
+    """
+    products_query = Product.objects.filter(available=True).alias(
+        color_lower=Lower('color'), size_lower=Lower('size'))
+    combined_filters = Q()
+
+    if main_category_preference:
+        if main_category_preference == "women_clothing":
+            combined_filters &= Q(gender='W')
+        elif main_category_preference == "men_clothing":
+            combined_filters &= Q(gender='M')
+        elif main_category_preference == "kid_clothing":
+            combined_filters &= Q(gender='K')
+        elif main_category_preference == "shoes":
+            combined_filters &= (
+                Q(category__name__icontains="shoe") | Q(subcategory__name__icontains="shoe") |
+                Q(category__name__icontains="footwear") | Q(subcategory__name__icontains="footwear") |
+                Q(gender='M', category__name__icontains="shoe") | Q(gender='W', category__name__icontains="shoe") |
+                Q(gender='U', category__name__icontains="shoe")
+            )
+        elif main_category_preference == "bags":
+            category_or_name_q = (
+                Q(category__name__icontains="bag") | Q(subcategory__name__icontains="bag") |
+                Q(name__icontains="bag") | Q(description__icontains="bag") |
+                Q(category__name__icontains="backpack") | Q(subcategory__name__icontains="backpack") |
+                Q(name__icontains="backpack") | Q(description__icontains="backpack") |
+                Q(category__name__icontains="purse") | Q(subcategory__name__icontains="purse") |
+                Q(name__icontains="purse") | Q(description__icontains="purse") |
+                Q(category__name__icontains="luggage") | Q(subcategory__name__icontains="luggage")
+            )
+            combined_filters &= category_or_name_q
+            combined_filters &= (
+                Q(gender='U') | Q(gender='M', category__name__icontains="bag") | Q(gender='W', category__name__icontains="bag") |
+                Q(category__name__icontains="bag")
+            )
+            combined_filters &= (
+                ~Q(category__name__icontains="accessories") & ~Q(subcategory__name__icontains="accessories") &
+                ~Q(category__name__icontains="jewelry") & ~Q(subcategory__name__icontains="jewelry") &
+                ~Q(category__name__icontains="jewellery") & ~Q(subcategory__name__icontains="jewellery") &
+                ~Q(name__icontains="ring") & ~Q(description__icontains="ring") &
+                ~Q(name__icontains="necklace") & ~Q(description__icontains="necklace")
+            )
+            combined_filters &= (
+                ~Q(category__name__icontains="clothing") & ~Q(subcategory__name__icontains="clothing") &
+                ~Q(category__name__icontains="wear") & ~Q(subcategory__name__icontains="wear") &
+                ~Q(category__name__icontains="shoe") & ~Q(subcategory__name__icontains="shoe") & # Corrected here
+                ~Q(category__name__icontains="footwear") & ~Q(subcategory__name__icontains="footwear") # Corrected here
+            )
+
+        elif main_category_preference == "accessories":
+            combined_filters &= (
+                Q(category__name__icontains="accessories") |
+                Q(subcategory__name__icontains="accessories") |
+                Q(category__name__icontains="jewelry") |
+                Q(subcategory__name__icontains="jewelry") |
+                Q(category__name__icontains="jewellery") |
+                Q(subcategory__name__icontains="jewellery") |
+                Q(category__name__icontains="watches") |
+                Q(subcategory__name__icontains="watches") |
+                Q(category__name__icontains="ring") |
+                Q(subcategory__name__icontains="ring") |
+                Q(category__name__icontains="earring") |
+                Q(subcategory__name__icontains="earring") |
+                Q(category__name__icontains="necklace") |
+                Q(subcategory__name__icontains="necklace") |
+                Q(category__name__icontains="bracelet") |
+                Q(gender='U')
+            )
+            combined_filters &= (
+                ~Q(Q(name__icontains="saree") | Q(description__icontains="saree")) &
+                ~Q(Q(name__icontains="dress") | Q(description__icontains="dress")) &
+                ~Q(Q(name__icontains="shirt") | Q(description__icontains="shirt")) &
+                ~Q(Q(name__icontains="pant") | Q(description__icontains="pant")) &
+                ~Q(Q(name__icontains="jeans") | Q(description__icontains="jeans")) &
+                ~Q(Q(name__icontains="trouser") | Q(description__icontains="trouser")) &
+                ~Q(Q(category__name__icontains="clothing") | Q(subcategory__name__icontains="clothing")) &
+                ~Q(Q(category__name__icontains="wear") | Q(subcategory__name__icontains="wear")) &
+                ~Q(Q(category__name__icontains="shoe") | Q(subcategory__name__icontains="shoe") | Q(category__name__icontains="footwear") | Q(subcategory__name__icontains="footwear"))
+            )
+
+    if product_item_type:
+        item_type_q = (
+                Q(name__icontains=product_item_type) |
+                Q(description__icontains=product_item_type) |
+                Q(category__name__icontains=product_item_type) |
+                Q(subcategory__name__icontains=product_item_type)
+        )
+        if combined_filters:
+            combined_filters &= item_type_q
+        else:
+            combined_filters = item_type_q
+
+    if color:
+        color_q = Q(color_lower=color.lower())
+        if combined_filters:
+            combined_filters &= color_q
+        else:
+            combined_filters = color_q
+
+    if size:
+        size_q = Q(size_lower=size.lower())
+        if combined_filters:
+            combined_filters &= size_q # Corrected this from color_q to size_q
+        else:
+            combined_filters = size_q
+
+    if not combined_filters and user_message_lower:
+         combined_filters = (
+                Q(name__icontains=user_message_lower) |
+                Q(description__icontains=user_message_lower) |
+                Q(category__name__icontains=user_message_lower) |
+                Q(subcategory__name__icontains=user_message_lower)
+        )
+    elif not combined_filters:
+        products_queryset = Product.objects.none()
+
+    if combined_filters:
+        products_queryset = products_query.filter(combined_filters).distinct()
+    else:
+        products_queryset = Product.objects.none()
+    return products_queryset
+
+
+def confidence_threshold():
+    """Minimum LinearSVC decision score for the best intent; below it the message is 'fallback'."""
+    return getattr(settings, 'CHATBOT_CONFIDENCE_THRESHOLD', -0.5)
+
+
+def _class_scores(clf, features):
+    """LinearSVC decision scores as one column per intent (clf.classes_), for a feature matrix."""
+    scores = clf.decision_function(features)
+    if scores.ndim == 1:
+        # Two intents: a single score per message, positive for classes_[1]
+        scores = scores.reshape(-1, 1) * (-1, 1)
+    return scores
+
+
+def _decision_scores(vectorizer, clf, messages):
+    """Decision scores of every intent for a list of normalized messages, in one sparse-matrix call."""
+    return _class_scores(clf, vectorizer.transform(messages))
+
+
+def _tags_for_scores(clf, scores, threshold):
+    best = scores.argmax(axis=1)
+    return [clf.classes_[index] if scores[row, index] > threshold else "fallback" for row, index in enumerate(best)]
+
+
+def _keyword_intent(user_message_lower):
+    if any(kw in user_message_lower for kw in ["hi", "hello", "hey"]):
+        return "greeting"
+    elif any(kw in user_message_lower for kw in ["bye", "goodbye", "see you"]):
+        return "goodbye"
+    elif any(kw in user_message_lower for kw in ["show me", "find product", "looking for"]):
+        return "product_search_query"
+    return "fallback"
+
+
+def _classify_intent(intents, vectorizer, clf, user_message_lower):
+    """Returns the intent tag for a message (TF-IDF + LinearSVC, or keywords without a model)."""
+    if clf and vectorizer and intents: # Ensure components are loaded
+        scores = _decision_scores(vectorizer, clf, [user_message_lower])
+        predicted_tag = _tags_for_scores(clf, scores, confidence_threshold())[0]
+        logger.debug(f"Fashion Bot DEBUG: Highest Confidence Score: {scores[0].max():.2f}")
+        logger.debug(f"Predicted intent after threshold: {predicted_tag} for message: '{user_message_lower}'")
+        return predicted_tag
+
+    logger.warning("WARNING: Chatbot model not loaded/trained. Falling back to simple keyword matching.")
+    return _keyword_intent(user_message_lower)
+
+
+def classify_messages(messages, threshold=None):
+    """
+    Batch API: intent tags for a list of raw messages, vectorized and scored in one call
+    (used by `manage.py evaluate_chatbot` and the chatbot/batch/ endpoint). Bypasses the caches.
+    """
+    model = chatbot_registry.registry.get()
+    intents, vectorizer, clf = model.intents, model.vectorizer, model.clf
+    normalized = [chatbot_cache.normalize_message(message) for message in messages]
+    if not normalized:
+        return []
+    if not (clf and vectorizer and intents):
+        return [_keyword_intent(message) for message in normalized]
+    if threshold is None:
+        threshold = confidence_threshold()
+    return _tags_for_scores(clf, _decision_scores(vectorizer, clf, normalized), threshold)
+
+
+def _extract_product_slots(nlp, user_message_lower):
+    """
+    Returns (main_category_preference, product_item_type, color, size) for a product search message.
+    The keyword matcher (shop/chatbot_slots.py) fills every slot in one pass; spaCy lemmas are
+    only consulted for an item type the matcher did not find.
+    """
+    main_category_preference, product_item_type, color, size = extract_slots(user_message_lower)
+
+    if product_item_type is None and nlp:
+        for token in nlp(user_message_lower):
+            if token.lemma_ in PRODUCT_TYPE_KEYWORDS:
+                product_item_type = PRODUCT_TYPE_KEYWORDS[token.lemma_]
+                break
+
+    logger.debug(
+        f"Extracted: Main Category: {main_category_preference}, Item Type: {product_item_type}, Color: {color}, Size: {size}")
+    return main_category_preference, product_item_type, color, size
+
+
+def _fallback_product_rows(user_message_lower):
+    """No slot to look up: free-text match of the whole message through the ORM (a lazy id/name/price queryset)."""
+    products_queryset = _build_chatbot_product_queryset(None, None, None, None, user_message_lower)
+    logger.debug(f"Fashion Bot DEBUG: Final Django Query for '{user_message_lower}': {products_queryset.query}")
+    return products_queryset.values_list('id', 'name', 'price')[:3]
+
+
+def _describe_slots(slots):
+    main_category_preference, product_item_type, color, size = slots
+    specific_query_parts = []
+    if main_category_preference: specific_query_parts.append(main_category_preference.replace("_clothing", ""))
+    if product_item_type: specific_query_parts.append(product_item_type)
+    if color: specific_query_parts.append(color)
+    if size: specific_query_parts.append(size)
+    return ' '.join(specific_query_parts)
+
+
+def _render_product_reply(slots, products):
+    """Renders the reply for the (id, name, price) rows found for `slots`."""
+    if products:
+        response_message = "Here are a few items we found for you:<br>"
+        for product_id, name, price in products:
+            product_url = get_safe_reverse_url('shop:productdetail', pk=product_id)
+            response_message += f"- <a href='{product_url}' target='_parent'>{name}</a> (₹{price})<br>"
+        products_list_url = get_safe_reverse_url('shop:product_list')
+        response_message += f"<br>You can find more on our <a href='{products_list_url}' target='_parent'>Products page</a>."
+        return response_message
+    else:
+        description = _describe_slots(slots)
+        if description:
+            message = f"Sorry, I couldn't find any {description} at the moment. Please try a different term or browse our <a href='{get_safe_reverse_url('shop:product_list')}' target='_parent'>Products page</a>."
+        else:
+            message = "I couldn't find any products matching your request. What specific product or type of product are you looking for? For example, 'Show me dresses' or 'Do you have bags?'"
+        return message
+
+
+def _product_search_response(slots, user_message_lower):
+    """Runs the product lookup for the extracted slots and renders the reply."""
+    products = chatbot_index.lookup(*slots)
+    if products is None:
+        products = list(_fallback_product_rows(user_message_lower))
+    return _render_product_reply(slots, products)
+
+
+async def _aproduct_search_response(slots, user_message_lower):
+    """_product_search_response for async views: the ORM fallback runs as an async query."""
+    products = await sync_to_async(chatbot_index.lookup)(*slots)  # May have to (re)build the index from the database
+    if products is None:
+        products = [row async for row in _fallback_product_rows(user_message_lower)]
+    return _render_product_reply(slots, products)
+
+
+def _product_reply_key(slots, user_message_lower):
+    # Without any slot the lookup searches for the message text itself, so it is part of the key
+    return slots, None if any(slots) else user_message_lower, catalog_cache.get_version()
+
+
+def _intent_response(intents, predicted_tag):
+    for intent in (intents if intents else []): # Ensure intents is iterable
+        if intent['tag'] == predicted_tag:
+            return random.choice(intent['responses'])
+
+    return "I'm sorry, I couldn't find a suitable response. Please try again or rephrase your question."
+
+
+def _analyze_message(model, nlp, user_message_lower):
+    """
+    Returns (intent tag, product slots or None) for a normalized message, from analysis_cache when possible.
+    Entries are keyed by the model digest, so a reloaded model never answers from the old one's results.
+    """
+    def analyze():
+        predicted_tag = _classify_intent(model.intents, model.vectorizer, model.clf, user_message_lower)
+        slots = None
+        if predicted_tag == "product_search_query":
+            slots = _extract_product_slots(nlp, user_message_lower)
+        return predicted_tag, slots
+
+    return chatbot_cache.analysis_cache.get_or_set((model.digest, user_message_lower), analyze)
+
+
+def _conversation_slots(state, predicted_tag, slots, user_message_lower):
+    """
+    The slots to search for in a conversation whose last product search is `state`
+    (see chatbot_sessions.load), or None if this message is not a product search.
+    """
+    if state is None:
+        return slots
+    if slots is None:
+        if predicted_tag not in chatbot_sessions.FOLLOW_UP_TAGS:
+            return None
+        # "in red", "size m": too short to be classified as a search, but they name a slot
+        slots = extract_slots(user_message_lower)
+        if not any(slots):
+            return None
+    return chatbot_sessions.merge_slots(state[0], slots)
+
+
+def _conversation_product_search(conversation_id, state, slots, user_message_lower):
+    """
+    Looks up `slots` for a conversation, remembers the search and renders the reply.
+    A refinement of the previous search only filters its stored result ids.
+    """
+    version = catalog_cache.get_version()
+    candidate_ids = None
+    if state is not None:
+        previous, previous_version, previous_ids = state
+        if previous_ids is not None and previous_version == version and chatbot_sessions.is_refinement(previous, slots):
+            candidate_ids = previous_ids
+    ids = chatbot_index.matching_ids(*slots, candidate_ids=candidate_ids)
+    if ids is None:
+        return _product_search_response(slots, user_message_lower)  # No slot at all: nothing to remember
+    chatbot_sessions.save(conversation_id, slots, version, ids)
+    return _render_product_reply(slots, chatbot_index.rows(ids))
+
+
+# --- Modified _get_chatbot_response_logic to use lazy-loaded components ---
+def _get_chatbot_response_logic(user_message_str, conversation_id=None):
+    # One snapshot of the model for the whole message, even if a reload swaps it meanwhile
+    model = chatbot_registry.registry.get()
+    intents = model.intents
+
+    user_message_lower = chatbot_cache.normalize_message(user_message_str)
+    predicted_tag, slots = _analyze_message(model, _load_nlp(), user_message_lower)
+
+    if conversation_id:
+        state = chatbot_sessions.load(conversation_id)
+        slots = _conversation_slots(state, predicted_tag, slots, user_message_lower)
+        if slots is not None:
+            return _conversation_product_search(conversation_id, state, slots, user_message_lower)
+    elif slots is not None:
+        return chatbot_cache.product_cache.get_or_set(
+            _product_reply_key(slots, user_message_lower), lambda: _product_search_response(slots, user_message_lower))
+
+    return _intent_response(intents, predicted_tag)
+
+
+def _sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_chatbot_events(user_message_str, conversation_id=None):
+    """
+    Server-sent events for one message, for ChatbotStreamView under ASGI. The reply
+    event goes out as soon as the message is classified; for product searches a
+    products event follows once the lookup returns, without holding a worker thread
+    while the async ORM query runs. Ends with a done event.
+    """
+    # Loading the model/pipeline can take seconds in a cold worker; keep it off the event loop
+    model = await sync_to_async(chatbot_registry.registry.get)()
+    nlp = await sync_to_async(_load_nlp)()
+    user_message_lower = chatbot_cache.normalize_message(user_message_str)
+    # Pure CPU work (TF-IDF, SVM, slot matching): any executor thread will do
+    predicted_tag, slots = await sync_to_async(_analyze_message, thread_sensitive=False)(
+        model, nlp, user_message_lower)
+    state = None
+    if conversation_id:
+        state = chatbot_sessions.load(conversation_id)
+        slots = _conversation_slots(state, predicted_tag, slots, user_message_lower)
+
+    if slots is None:
+        yield _sse_event('reply', {'intent': predicted_tag, 'response': _intent_response(model.intents, predicted_tag)})
+    else:
+        description = _describe_slots(slots)
+        searching = f"Looking for {description}..." if description else "Let me look that up for you..."
+        yield _sse_event('reply', {'intent': predicted_tag, 'response': searching})
+
+        if conversation_id:
+            response = await sync_to_async(_conversation_product_search)(
+                conversation_id, state, slots, user_message_lower)
+        else:
+            key = await sync_to_async(_product_reply_key)(slots, user_message_lower)
+            response = chatbot_cache.product_cache.get(key)
+            if response is None:
+                response = await _aproduct_search_response(slots, user_message_lower)
+                chatbot_cache.product_cache.set(key, response)
+        yield _sse_event('products', {'response': response})
+    yield _sse_event('done', {})
@@ -0,0 +1,91 @@
+"""
+Per-process LRU + TTL caches for the Fashion Bot.
+
+Chat traffic is dominated by a handful of repeated phrases ("hi", "show me red
+dresses", "track my order"), yet every message went through TF-IDF, the SVM,
+the spaCy pipeline and, for product searches, a multi-join product query.
+shop/chatbot.py now keeps two bounded caches keyed on the normalized message:
+
+* analysis_cache - (model digest, message) -> (intent tag, extracted slots).
+                   Entries of a replaced model simply age out.
+* product_cache  - (slots, catalog version) -> product search reply. The catalog
+                   version (shop/catalog_cache.py) is bumped by every catalog
+                   change, so a reply never outlives the products it lists.
+
+Entries expire after CHATBOT_CACHE_TTL seconds; the least recently used entry
+is evicted once a cache holds CHATBOT_CACHE_SIZE entries. Hit/miss counters are
+served by the superuser-only chatbot/stats/ endpoint.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+_MISSING = object()
+
+
+def normalize_message(message):
+    """Case- and whitespace-insensitive cache key for a chat message."""
+    return ' '.join(message.lower().split())
+
+
+class LRUCache:
+    def __init__(self, name, maxsize, ttl):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, value), least recently used first
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_set(self, key, builder):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            # Built outside the lock: two threads may build the same entry, which is harmless
+            value = builder()
+            self.set(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries), 'maxsize': self.maxsize, 'ttl': self.ttl,
+                'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+analysis_cache = LRUCache('analysis', getattr(settings, 'CHATBOT_CACHE_SIZE', 1024),
+                          getattr(settings, 'CHATBOT_CACHE_TTL', 600))
+product_cache = LRUCache('products', getattr(settings, 'CHATBOT_CACHE_SIZE', 1024),
+                         getattr(settings, 'CHATBOT_CACHE_TTL', 600))
+
+
+def stats():
+    return {cache.name: cache.stats() for cache in (analysis_cache, product_cache)}
@@ -0,0 +1,204 @@
+"""
+In-process attribute index for the Fashion Bot's product searches.
+
+_build_chatbot_product_queryset turns the extracted slots into large Q trees:
+"bags" alone is some thirty icontains terms over name, description and the
+category/subcategory names, with negations and a DISTINCT, i.e. a full scan
+of the joined catalog per chat message. The slots can only take a handful of
+values (shop/chatbot_vocab.py), so this module evaluates those same rules once
+per product instead and keeps a posting list (a set of product ids) per
+(slot, value):
+
+* group - main category group (shoes, bags, accessories, women/men/kid clothing)
+* item  - item types whose name appears in the product's text
+* color - lower-cased Product.color
+* size  - lower-cased Product.size
+
+A lookup is an intersection of at most four sets, and the (id, name, price) of
+every indexed product is kept alongside, so a chatbot reply needs no query at
+all. Like shop/facets.py the index is built with one values_list() query
+(plus two small ones for the category and subcategory names), maintained by
+the signals in shop/signals.py once each save commits, and rebuilt after
+CHATBOT_INDEX_REFRESH_SECONDS so that workers which missed a signal converge.
+Re-indexing a saved product takes its category names from the index, so it
+costs no query.
+Messages without any slot still go through the ORM free-text lookup.
+"""
+import threading
+import time
+from decimal import Decimal
+
+from django.conf import settings
+
+from .chatbot_vocab import ITEM_TYPES
+
+DIMENSIONS = ('group', 'item', 'color', 'size')
+
+_GENDER_GROUPS = {'W': 'women_clothing', 'M': 'men_clothing', 'K': 'kid_clothing'}
+_APPAREL_WORDS = ('clothing', 'wear', 'shoe', 'footwear')
+_JEWELRY_WORDS = ('accessories', 'jewelry', 'jewellery')
+
+
+def _has(texts, *words):
+    return any(word in text for text in texts for word in words)
+
+
+def category_groups(gender, name, description, category_name, subcategory_name):
+    """
+    Main category groups a product belongs to. Mirrors the per-group filters of
+    _build_chatbot_product_queryset (icontains is a case-insensitive substring test).
+    """
+    text = (name, description)
+    categories = (category_name, subcategory_name)
+    groups = set()
+    if gender in _GENDER_GROUPS:
+        groups.add(_GENDER_GROUPS[gender])
+    if _has(categories, 'shoe', 'footwear'):
+        groups.add('shoes')
+    if ((_has(categories + text, 'bag', 'backpack', 'purse') or _has(categories, 'luggage'))
+            and (gender == 'U' or 'bag' in category_name)
+            and not _has(categories, *_JEWELRY_WORDS) and not _has(text, 'ring', 'necklace')
+            and not _has(categories, *_APPAREL_WORDS)):
+        groups.add('bags')
+    if ((_has(categories, *_JEWELRY_WORDS, 'watches', 'ring', 'earring', 'necklace') or 'bracelet' in category_name
+            or gender == 'U')
+            and not _has(text, 'saree', 'dress', 'shirt', 'pant', 'jeans', 'trouser')
+            and not _has(categories, *_APPAREL_WORDS)):
+        groups.add('accessories')
+    return groups
+
+
+def product_tags(gender, name, description, category_name, subcategory_name, color, size):
+    """Builds the (dimension, value) pairs a product is indexed under."""
+    name, description = (name or '').lower(), (description or '').lower()
+    category_name, subcategory_name = (category_name or '').lower(), (subcategory_name or '').lower()
+    tags = [('group', group) for group in category_groups(gender, name, description, category_name, subcategory_name)]
+    texts = (name, description, category_name, subcategory_name)
+    tags.extend(('item', item_type) for item_type in ITEM_TYPES if _has(texts, item_type))
+    if color:
+        tags.append(('color', color.lower()))
+    if size:
+        tags.append(('size', size.lower()))
+    return tags
+
+
+def _price(value):
+    return Decimal(str(value)).quantize(Decimal('0.01'))
+
+
+class ChatbotProductIndex:
+    """Posting lists of available product ids keyed by (dimension, value)."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._products = {}  # product id -> (name, price)
+        self._tags = {}  # product id -> list of (dimension, value)
+        self._postings = {}
+        self._category_names = {}  # category id -> name
+        self._subcategory_names = {}  # subcategory id -> name
+        self._built_at = None
+
+    # --- Maintenance ---
+    def build(self):
+        from .models import Category, Product, SubCategory
+
+        category_names = dict(Category.objects.values_list('id', 'name'))
+        subcategory_names = dict(SubCategory.objects.values_list('id', 'name'))
+        rows = Product.objects.filter(available=True).values_list(
+            'id', 'name', 'price', 'gender', 'description', 'category__name', 'subcategory__name', 'color', 'size')
+        products = {}
+        tags = {}
+        postings = {}
+        for pk, name, price, gender, description, category_name, subcategory_name, color, size in rows:
+            products[pk] = (name, _price(price))
+            tags[pk] = product_tags(gender, name, description, category_name, subcategory_name, color, size)
+            for tag in tags[pk]:
+                postings.setdefault(tag, set()).add(pk)
+
+        with self._lock:
+            self._products = products
+            self._tags = tags
+            self._postings = postings
+            self._category_names = category_names
+            self._subcategory_names = subcategory_names
+            self._built_at = time.monotonic()
+
+    def invalidate(self):
+        with self._lock:
+            self._built_at = None
+
+    def _ensure_fresh(self):
+        refresh_after = getattr(settings, 'CHATBOT_INDEX_REFRESH_SECONDS', 300)
+        built_at = self._built_at
+        if built_at is None or (refresh_after and time.monotonic() - built_at > refresh_after):
+            self.build()
+
+    def _unlink(self, product_id):
+        self._products.pop(product_id, None)
+        for tag in self._tags.pop(product_id, ()):
+            ids = self._postings.get(tag)
+            if ids is not None:
+                ids.discard(product_id)
+                if not ids:
+                    del self._postings[tag]
+
+    def update_product(self, product):
+        """Re-indexes one product after it was saved."""
+        with self._lock:
+            if self._built_at is None:
+                return  # Not built yet in this worker; the first lookup will load it
+            self._unlink(product.pk)
+            if not product.available:
+                return
+            category_name = self._category_names.get(product.category_id)
+            subcategory_name = self._subcategory_names.get(product.subcategory_id)
+            if category_name is None or (product.subcategory_id and subcategory_name is None):
+                self._built_at = None  # A category this worker has not seen yet; rebuild on the next lookup
+                return
+            self._products[product.pk] = (product.name, _price(product.price))
+            self._tags[product.pk] = product_tags(product.gender, product.name, product.description,
+                                                  category_name, subcategory_name, product.color, product.size)
+            for tag in self._tags[product.pk]:
+                self._postings.setdefault(tag, set()).add(product.pk)
+
+    def remove_product(self, product_id):
+        with self._lock:
+            self._unlink(product_id)
+
+    # --- Queries ---
+    def matching_ids(self, main_category=None, item_type=None, color=None, size=None, candidate_ids=None):
+        """
+        Ids of available products matching every given slot, or None if no slot is given.
+        `candidate_ids` (e.g. the previous results of a conversation) restricts the search further.
+        """
+        restricting = [
+            (dimension, value.lower() if dimension in ('color', 'size') else value)
+            for dimension, value in zip(DIMENSIONS, (main_category, item_type, color, size))
+            if value
+        ]
+        if not restricting:
+            return None
+        with self._lock:
+            self._ensure_fresh()
+            postings = [self._postings.get(tag, set()) for tag in restricting]
+            postings.sort(key=len)  # Intersect smallest posting lists first
+            if candidate_ids is not None:
+                return {pk for pk in candidate_ids if all(pk in ids for ids in postings)}
+            return set(postings[0]).intersection(*postings[1:])
+
+    def rows(self, ids, limit=3):
+        """[(id, name, price)] of the first `limit` of `ids` (by id) that are still indexed."""
+        with self._lock:
+            return [(pk, *self._products[pk]) for pk in sorted(ids) if pk in self._products][:limit]
+
+    def lookup(self, main_category=None, item_type=None, color=None, size=None, limit=3):
+        """
+        Returns [(id, name, price)] of the first `limit` matching products by id,
+        or None if no slot is given (the caller falls back to a text search).
+        """
+        ids = self.matching_ids(main_category, item_type, color, size)
+        if ids is None:
+            return None
+        return self.rows(ids, limit)
+
+chatbot_index = ChatbotProductIndex()
@@ -0,0 +1,148 @@
+"""
+Prebuilt intent classifier for the Fashion Bot.
+
+Every worker used to parse chatbot_intents.json and fit a TfidfVectorizer and
+LinearSVC on its first chatbot request. That request stalled for seconds, and
+each worker burned its own CPU on the same fit. `manage.py build_chatbot_model`
+now trains once, at deploy time, and writes an artifact named after a digest
+of the intents file and the scikit-learn version. At runtime load_model()
+only loads that artifact. It is stored uncompressed, so joblib memory-maps
+its numpy arrays (idf weights, SVM coefficients) read-only instead of copying
+them into every worker.
+
+If the artifact is missing or was built from a different intents file
+(stale), load_model() trains in-process as before and tries to write the
+artifact for the next worker.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+from django.conf import settings
+
+import logging
+logger = logging.getLogger(__name__)
+
+ARTIFACT_FORMAT = 1  # Bump when the artifact layout changes
+
+
+def intents_path():
+    return getattr(settings, 'CHATBOT_INTENTS_PATH',
+                   os.path.join(settings.BASE_DIR, 'shop', 'chatbot_intents.json'))
+
+
+def artifact_dir():
+    return getattr(settings, 'CHATBOT_ARTIFACT_DIR', os.path.join(settings.BASE_DIR, '.cache', 'chatbot'))
+
+
+def model_digest(raw_intents):
+    """Identifies a model: the intents file bytes plus everything that changes how they are fitted/pickled."""
+    import sklearn
+
+    digest = hashlib.sha256(raw_intents)
+    digest.update(f"format={ARTIFACT_FORMAT};sklearn={sklearn.__version__}".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def artifact_path(digest):
+    return os.path.join(artifact_dir(), f"intents-{digest[:16]}.joblib")
+
+
+def train(intents):
+    """Fits the TF-IDF + LinearSVC intent classifier. Returns (vectorizer, clf), or (None, None) without patterns."""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.svm import LinearSVC
+
+    sentences = []
+    labels = []
+    for intent in intents:
+        for pattern in intent['patterns']:
+            sentences.append(pattern.lower())
+            labels.append(intent['tag'])
+    if not sentences:
+        return None, None
+    vectorizer = TfidfVectorizer()
+    clf = LinearSVC()
+    clf.fit(vectorizer.fit_transform(sentences), labels)
+    return vectorizer, clf
+
+
+def _read_intents(path):
+    with open(path, 'rb') as f:
+        raw = f.read()
+    return raw, json.loads(raw.decode('utf-8'))
+
+
+def write_artifact(digest, intents, vectorizer, clf):
+    """Writes the artifact atomically (readers never see a partial file) and returns its path."""
+    import joblib
+
+    path = artifact_path(digest)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    payload = {'format': ARTIFACT_FORMAT, 'digest': digest, 'intents': intents,
+               'vectorizer': vectorizer, 'clf': clf}
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    os.close(fd)
+    try:
+        joblib.dump(payload, tmp_path)  # Uncompressed, so load(mmap_mode='r') can map the arrays
+        os.chmod(tmp_path, 0o644)  # mkstemp creates it owner-only
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return path
+
+
+def build_artifact(path=None, prune=True):
+    """Trains from the intents file and writes the artifact. Returns (artifact path, digest)."""
+    raw, intents = _read_intents(path or intents_path())
+    digest = model_digest(raw)
+    vectorizer, clf = train(intents)
+    written = write_artifact(digest, intents, vectorizer, clf)
+    if prune:
+        for name in os.listdir(artifact_dir()):
+            if name.startswith('intents-') and name.endswith('.joblib') and os.path.join(artifact_dir(), name) != written:
+                os.unlink(os.path.join(artifact_dir(), name))
+    return written, digest
+
+
+def load_artifact(digest):
+    """Returns the artifact payload for `digest`, or None if it is missing or unusable."""
+    import joblib
+
+    path = artifact_path(digest)
+    if not os.path.exists(path):
+        return None
+    try:
+        payload = joblib.load(path, mmap_mode='r')
+    except Exception as e:
+        logger.warning(f"Could not load chatbot artifact {path}: {e}")
+        return None
+    if payload.get('format') != ARTIFACT_FORMAT or payload.get('digest') != digest:
+        return None
+    return payload
+
+
+def load_model(path=None):
+    """
+    Returns (intents, vectorizer, clf, digest) for the current intents file: from the
+    prebuilt artifact when there is one, otherwise trained here (and written out).
+    """
+    raw, intents = _read_intents(path or intents_path())
+    digest = model_digest(raw)
+    payload = load_artifact(digest)
+    if payload is not None:
+        logger.info(f"Fashion Bot model loaded from artifact {digest[:16]}")
+        return payload['intents'], payload['vectorizer'], payload['clf'], digest
+
+    logger.warning("No current chatbot artifact; training in-process (run `manage.py build_chatbot_model` at deploy)")
+    started = time.perf_counter()
+    vectorizer, clf = train(intents)
+    logger.info(f"Fashion Bot intent model trained in {time.perf_counter() - started:.2f}s")
+    try:
+        write_artifact(digest, intents, vectorizer, clf)
+    except OSError as e:
+        logger.warning(f"Could not write chatbot artifact: {e}")
+    return intents, vectorizer, clf, digest
@@ -0,0 +1,90 @@
+"""
+spaCy pipeline for Fashion Bot slot extraction.
+
+The bot used to load en_core_web_sm with every component enabled, including
+the dependency parser and NER. Slot extraction only reads token.lemma_, as a
+fallback for item types the keyword matcher in shop/chatbot_slots.py did not
+find. settings.CHATBOT_NLP_MODE picks how much of the pipeline to load:
+
+* 'full'  - en_core_web_sm as it ships (the old behaviour).
+* 'lean'  - en_core_web_sm without parser/ner/senter. Lemmas still come from
+            tok2vec + tagger + attribute_ruler + lemmatizer.
+* 'blank' - spacy.blank('en') (tokenizer only) plus fashion_lemmatizer, a
+            lookup/suffix lemmatizer below. It needs no model package and
+            takes a fraction of the memory.
+
+If the model package is not installed, 'full' and 'lean' fall back to 'blank'
+instead of switching product search off. Compare the modes with
+`manage.py benchmark_chatbot_nlp`.
+
+spaCy itself is only imported by load_nlp(), so importing this module is cheap.
+"""
+from django.conf import settings
+
+import logging
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = 'en_core_web_sm'
+MODES = ('full', 'lean', 'blank')
+LEAN_EXCLUDE = ['parser', 'ner', 'senter']
+
+# Irregular forms the suffix rules below would get wrong
+_LEMMA_LOOKUP = {
+    'men': 'man', 'women': 'woman', 'children': 'child', 'feet': 'foot',
+    'jeans': 'jeans', 'shorts': 'shorts', 'leggings': 'leggings', 'trousers': 'trousers', 'pants': 'pant',
+    'glasses': 'glasses', 'dress': 'dress', 'is': 'be', 'are': 'be', 'was': 'be', 'were': 'be', 'has': 'have',
+}
+
+
+def _lookup_lemma(text):
+    lemma = _LEMMA_LOOKUP.get(text)
+    if lemma is not None:
+        return lemma
+    if len(text) > 4 and text.endswith(('ches', 'shes', 'sses', 'xes', 'zes')):
+        return text[:-2]
+    if len(text) > 3 and text.endswith('ies'):
+        return text[:-3] + 'y'
+    if len(text) > 3 and text.endswith('s') and not text.endswith(('ss', 'us', 'is')):
+        return text[:-1]
+    return text
+
+
+def fashion_lemmatizer(doc):
+    for token in doc:
+        token.lemma_ = _lookup_lemma(token.lower_)
+    return doc
+
+
+def _register_components():
+    from spacy.language import Language
+
+    if not Language.has_factory('fashion_lemmatizer'):
+        Language.component('fashion_lemmatizer', func=fashion_lemmatizer)
+
+
+def configured_mode():
+    mode = getattr(settings, 'CHATBOT_NLP_MODE', 'lean')
+    if mode not in MODES:
+        logger.warning(f"Unknown CHATBOT_NLP_MODE {mode!r}; using 'lean'")
+        mode = 'lean'
+    return mode
+
+
+def load_nlp(mode=None):
+    """Returns the spaCy pipeline for `mode` (default: settings.CHATBOT_NLP_MODE)."""
+    import spacy
+
+    mode = mode or configured_mode()
+    if mode == 'blank':
+        _register_components()
+        nlp = spacy.blank('en')
+        nlp.add_pipe('fashion_lemmatizer')
+        return nlp
+    try:
+        if mode == 'lean':
+            return spacy.load(MODEL_NAME, exclude=LEAN_EXCLUDE)
+        return spacy.load(MODEL_NAME)
+    except OSError:
+        logger.error(f"spaCy model '{MODEL_NAME}' not found (run 'python -m spacy download {MODEL_NAME}'); "
+                     f"using the blank tokenizer pipeline instead.")
+        return load_nlp('blank')
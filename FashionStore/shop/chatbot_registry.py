@@ -0,0 +1,160 @@
+"""
+Versioned, hot-reloadable Fashion Bot intent model.
+
+The intent classifier used to be loaded once into module globals, so an edit to
+chatbot_intents.json (or a freshly built artifact) only took effect after every
+worker was restarted. ModelRegistry instead holds the current model as one
+immutable ModelVersion (intents, vectorizer, clf plus the digest it was built
+from) and replaces it with a single reference assignment:
+
+* get() returns the current version. A request takes one snapshot and uses it
+  throughout, so a swap never mixes the old intents with the new classifier,
+  and in-flight requests finish on the model they started with.
+* At most every CHATBOT_RELOAD_CHECK_SECONDS, get() stats the intents file and
+  the artifact. Only when one of them changed is the file hashed; a new digest
+  (or a rewritten artifact) starts one background thread that loads or trains
+  the new model with chatbot_model.load_model() and then swaps it in. Requests
+  never wait for it; they keep being answered by the old version meanwhile.
+* A reload that fails (say, the JSON is half-saved) keeps the old model and is
+  retried on the next change.
+
+Retraining runs in the worker's own thread and so still competes for the GIL;
+run `manage.py build_chatbot_model` after editing the intents so that workers
+only have to memory-map the new artifact.
+"""
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+
+from . import chatbot_model
+
+import logging
+logger = logging.getLogger(__name__)
+
+ModelVersion = namedtuple('ModelVersion', 'digest intents vectorizer clf loaded_at')
+
+EMPTY_MODEL = ModelVersion(None, [], None, None, 0.0)
+
+
+def _stat(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._current = None
+        self._load_lock = threading.Lock()  # Held by the (single) loader: first load or a reload thread
+        self._flag_lock = threading.Lock()
+        self._reloading = False
+        self._checked_at = 0.0
+        self._intents_stat = None
+        self._artifact_stat = None
+
+    # --- Loading ---
+    def _load(self):
+        """Loads the model for the intents file as it is now; raises on a missing/invalid file."""
+        intents_stat = _stat(chatbot_model.intents_path())
+        intents, vectorizer, clf, digest = chatbot_model.load_model()
+        if clf is None:
+            logger.warning("WARNING: No training sentences found for Fashion Bot intents. Intent recognition will not work.")
+        self._intents_stat = intents_stat
+        self._artifact_stat = _stat(chatbot_model.artifact_path(digest))
+        return ModelVersion(digest, intents, vectorizer, clf, time.time())
+
+    def _swap(self, version):
+        self._current = version  # One reference assignment: readers see the old or the new version, never a mix
+        logger.info(f"Fashion Bot model {version.digest and version.digest[:16]} active "
+                    f"({len(version.intents)} intents).")
+
+    def _initial_load(self):
+        with self._load_lock:
+            if self._current is not None:
+                return
+            try:
+                version = self._load()
+            except FileNotFoundError:
+                logger.error(f"ERROR: {chatbot_model.intents_path()} not found. Bot intent recognition will be limited.")
+                version = EMPTY_MODEL
+            except json.JSONDecodeError as e:
+                logger.error(f"ERROR: Could not decode JSON from {chatbot_model.intents_path()}. "
+                             f"Check file format. Error: {e}")
+                version = EMPTY_MODEL
+            except Exception as e:
+                logger.error(f"ERROR: An unexpected error occurred during Fashion Bot model loading/training: {e}",
+                             exc_info=True)
+                version = EMPTY_MODEL
+            self._checked_at = time.monotonic()
+            self._swap(version)
+
+    def _reload(self):
+        try:
+            with self._load_lock:
+                started = time.perf_counter()
+                version = self._load()
+                self._swap(version)
+                logger.info(f"Fashion Bot model reloaded in the background in {time.perf_counter() - started:.2f}s")
+        except Exception as e:
+            logger.error(f"Fashion Bot model reload failed; keeping the current model: {e}", exc_info=True)
+        finally:
+            self._reloading = False
+
+    def reload_in_background(self):
+        """Starts a reload thread unless one is already running. Returns the thread, or None."""
+        with self._flag_lock:
+            if self._reloading:
+                return None
+            self._reloading = True
+        thread = threading.Thread(target=self._reload, name='chatbot-model-reload', daemon=True)
+        thread.start()
+        return thread
+
+    # --- Change detection ---
+    def _changed(self):
+        current = self._current
+        intents_stat = _stat(chatbot_model.intents_path())
+        if intents_stat != self._intents_stat:
+            self._intents_stat = intents_stat
+            if intents_stat is None:
+                return False  # Deleted (or mid-replace); keep serving the current model
+            try:
+                with open(chatbot_model.intents_path(), 'rb') as f:
+                    if chatbot_model.model_digest(f.read()) != current.digest:
+                        return True
+            except OSError:
+                return False
+        if current.digest is not None:
+            artifact_stat = _stat(chatbot_model.artifact_path(current.digest))
+            if artifact_stat is not None and artifact_stat != self._artifact_stat:
+                return True  # Rebuilt (e.g. by `manage.py build_chatbot_model`); load the shared, mmapped copy
+        return False
+
+    def check_for_changes(self, force=False):
+        """Starts a background reload if the intents file or artifact changed. Returns the thread, or None."""
+        interval = getattr(settings, 'CHATBOT_RELOAD_CHECK_SECONDS', 10)
+        now = time.monotonic()
+        if self._current is None or self._reloading or not (force or (interval and now - self._checked_at >= interval)):
+            return None
+        self._checked_at = now
+        if self._changed():
+            logger.info("Fashion Bot intents or artifact changed; reloading in the background")
+            return self.reload_in_background()
+        return None
+
+    def get(self):
+        """The current ModelVersion, loading it synchronously on the very first call."""
+        if self._current is None:
+            self._initial_load()
+        else:
+            self.check_for_changes()
+        return self._current
+
+
+registry = ModelRegistry()
@@ -0,0 +1,110 @@
+"""
+Multi-turn state of Fashion Bot conversations.
+
+Every chat message used to be handled on its own: "show me dresses", then
+"in red", then "size M" re-ran the whole pipeline, and the second and third
+messages lost the earlier slots (or were not even recognised as product
+searches). The chat widget now sends a conversation id, and for each
+conversation this module remembers the last product search:
+
+* its four slots, packed into one small int (mixed-radix index of each slot's
+  value in shop/chatbot_vocab.py, 0 meaning "not set"), and
+* the ids of every product it matched, as an array('I') (4 bytes per id),
+  stored only while there are at most CHATBOT_SESSION_MAX_RESULT_IDS of them,
+  together with the catalog version they were computed at.
+
+Entries live in the shared Django cache (see CACHE_BACKEND in settings.py),
+so each message of a conversation may be handled by any worker. Every search
+re-stores its entry, which expires CHATBOT_SESSION_TTL seconds after the last
+one; a conversation whose entry is gone simply starts a fresh search.
+A follow-up that only adds or repeats slots is a refinement: it is answered by
+filtering the stored candidate ids instead of searching the whole catalog.
+A follow-up naming another item type or category group starts a new search.
+"""
+import hashlib
+from array import array
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .chatbot_vocab import CATEGORY_GROUPS, COLORS, ITEM_TYPES, SIZE_MAPPING
+
+SLOT_VALUES = (
+    (None,) + CATEGORY_GROUPS,
+    (None,) + ITEM_TYPES,
+    (None,) + COLORS,
+    (None,) + tuple(sorted(set(SIZE_MAPPING.values()))),
+)
+_SLOT_INDEXES = tuple({value: index for index, value in enumerate(values)} for values in SLOT_VALUES)
+NO_SLOTS = (None, None, None, None)
+# Intents a short follow-up ("in red", "size m") may be classified as; if it names a slot it refines the search
+FOLLOW_UP_TAGS = ('fallback', 'product_search_query', 'size_guide', 'check_stock')
+
+
+def pack_slots(slots):
+    packed = 0
+    for values, indexes, value in reversed(tuple(zip(SLOT_VALUES, _SLOT_INDEXES, slots))):
+        packed = packed * len(values) + indexes.get(value, 0)
+    return packed
+
+
+def unpack_slots(packed):
+    slots = []
+    for values in SLOT_VALUES:
+        packed, index = divmod(packed, len(values))
+        slots.append(values[index])
+    return tuple(slots)
+
+
+def is_new_search(previous, slots):
+    """
+    True if `slots` names a category group or item type the previous search did not have, while that
+    search had one: "dresses" then "bags" looks for bags, not bag-dresses. Colors and sizes only refine.
+    """
+    if not any(previous[:2]):
+        return False
+    return any(new is not None and new != old for new, old in zip(slots[:2], previous[:2]))
+
+
+def merge_slots(previous, slots):
+    """The slots to search for: this turn's, with the gaps filled from the previous search unless it starts over."""
+    if is_new_search(previous, slots):
+        return slots
+    return tuple(new if new is not None else old for new, old in zip(slots, previous))
+
+
+def is_refinement(previous, merged):
+    """True if every slot of the previous search is kept, so its results are a superset of the new ones."""
+    return any(previous) and all(old is None or old == new for old, new in zip(previous, merged))
+
+
+def conversation_key(value):
+    """The conversation id sent by the chat widget, or None; bounded so a client cannot grow the store's keys."""
+    if not isinstance(value, str) or not value.strip():
+        return None
+    return value.strip()[:64]
+
+
+def _cache_key(conversation_id):
+    # Hashed: the id comes from the client and may hold characters some cache backends reject
+    return f"chatbot:session:{hashlib.md5(conversation_id.encode('utf-8')).hexdigest()}"
+
+
+def load(conversation_id):
+    """Returns (slots, catalog version, candidate ids or None) of the conversation's last search, or None."""
+    state = cache.get(_cache_key(conversation_id))
+    if state is None:
+        return None
+    packed, version, ids = state
+    return unpack_slots(packed), version, ids
+
+
+def _compact_ids(ids):
+    if len(ids) > getattr(settings, 'CHATBOT_SESSION_MAX_RESULT_IDS', 500):
+        return None  # Too many to be worth keeping; the next turn searches the index again
+    return array('I' if not ids or max(ids) < 2 ** 32 else 'Q', sorted(ids))
+
+
+def save(conversation_id, slots, version, ids):
+    cache.set(_cache_key(conversation_id), (pack_slots(slots), version, _compact_ids(ids)),
+              getattr(settings, 'CHATBOT_SESSION_TTL', 1800))
@@ -0,0 +1,142 @@
+"""
+Single-pass slot extraction for Fashion Bot product searches.
+
+_extract_product_slots used to scan the message once per category keyword
+(`any(keyword in message ...)` for every group) and then walk the spaCy doc
+three more times for the item type, color and size. Matching per token also
+meant multi-word sizes such as "extra large" could never match, and the
+substring scans let "men" fire inside "women" or "recommend".
+
+SlotMatcher compiles every phrase of shop/chatbot_vocab.py into one
+Aho-Corasick automaton, built once per process, and finds all of them in a
+single pass over the message. A hit only counts on whole words (a plural or
+possessive ending is allowed, so "necklaces", "gowns" and "women's" match);
+hyphens are read as spaces, so "x-large" and "t-shirt" match either way.
+Slots are then picked the way the old code picked them:
+
+* group      - the first group in CATEGORY_KEYWORDS order with any hit
+* item type  - the leftmost hit (longest at that position)
+* color/size - the leftmost hit (longest at that position)
+
+`manage.py benchmark_chatbot_slots` compares it with the old extraction.
+"""
+from collections import deque
+
+from .chatbot_vocab import CATEGORY_KEYWORDS, COLORS, PRODUCT_TYPE_KEYWORDS, SIZE_MAPPING
+
+# Endings a keyword may carry and still count as a whole word: plurals and possessives
+_WORD_SUFFIXES = ('es', 's', "'s", "'")
+
+
+def _normalize(text):
+    return text.lower().replace('-', ' ')
+
+
+def _is_word_char(char):
+    # The apostrophe belongs to the word, so the "s" of "women's" is not size S
+    return char.isalnum() or char == "'"
+
+
+class AhoCorasick:
+    """Multi-pattern string matcher: finds every occurrence of every pattern in one pass."""
+
+    def __init__(self, patterns):
+        # patterns: {pattern string: payload}
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]  # state -> [(pattern length, payload)]
+        for pattern, payload in patterns.items():
+            state = 0
+            for char in pattern:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                    self._goto[state][char] = next_state
+                state = next_state
+            self._output[state].append((len(pattern), payload))
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def finditer(self, text):
+        """Yields (start, end, payload) for every pattern occurrence, in order of their end."""
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for end, char in enumerate(text, 1):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length, payload in output[state]:
+                yield end - length, end, payload
+
+
+class SlotMatcher:
+    def __init__(self):
+        patterns = {}
+        for priority, (group, keywords) in enumerate(CATEGORY_KEYWORDS):
+            for keyword in keywords:
+                patterns.setdefault(_normalize(keyword), []).append(('group', group, priority))
+        for keyword, item_type in PRODUCT_TYPE_KEYWORDS.items():
+            patterns.setdefault(_normalize(keyword), []).append(('item', item_type, 0))
+        for color in COLORS:
+            patterns.setdefault(_normalize(color), []).append(('color', color, 0))
+        for phrase, size in SIZE_MAPPING.items():
+            patterns.setdefault(_normalize(phrase), []).append(('size', size, 0))
+        self._automaton = AhoCorasick(patterns)
+
+    def _word_end(self, text, end):
+        """End of the word a hit ends in, or None if the hit stops mid-word."""
+        if end == len(text) or not _is_word_char(text[end]):
+            return end
+        for suffix in _WORD_SUFFIXES:
+            stop = end + len(suffix)
+            if text.startswith(suffix, end) and (stop == len(text) or not _is_word_char(text[stop])):
+                return stop
+        return None
+
+    def extract(self, message):
+        """Returns (main_category_preference, product_item_type, color, size); unmatched slots are None."""
+        text = _normalize(message)
+        group = None
+        best = {}  # slot -> (start, -length, value): leftmost, then longest
+        for start, end, entries in self._automaton.finditer(text):
+            if start and _is_word_char(text[start - 1]):
+                continue
+            if self._word_end(text, end) is None:
+                continue
+            for slot, value, priority in entries:
+                if slot == 'group':
+                    if group is None or priority < group[0]:
+                        group = (priority, value)
+                    continue
+                candidate = (start, start - end, value)
+                if slot not in best or candidate < best[slot]:
+                    best[slot] = candidate
+        return (
+            group[1] if group else None,
+            best['item'][2] if 'item' in best else None,
+            best['color'][2] if 'color' in best else None,
+            best['size'][2] if 'size' in best else None,
+        )
+
+
+_matcher = None
+
+
+def extract_slots(message):
+    """extract() of the process-wide SlotMatcher, compiled on first use."""
+    global _matcher
+    if _matcher is None:
+        _matcher = SlotMatcher()
+    return _matcher.extract(message)
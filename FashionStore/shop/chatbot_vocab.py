@@ -0,0 +1,46 @@
+"""
+Keyword vocabularies of the Fashion Bot's product search slots.
+
+Shared by the slot extraction in shop/chatbot.py and the product attribute
+index in shop/chatbot_index.py, so both agree on the values a slot can take.
+"""
+
+# Main category group -> message keywords. Checked in this order; the first group with a hit wins.
+CATEGORY_KEYWORDS = (
+    ("shoes", ("shoes", "shoe", "footwear")),
+    ("bags", ("bags", "bag", "backpacks", "purse")),
+    ("accessories", ("accessories", "accessory", "jewellery", "jewelry", "watches", "earrings", "necklace", "ring",
+                     "bracelet")),
+    ("women_clothing", ("women's wear", "womens wear", "ladies wear", "women", "ladies", "female")),
+    ("men_clothing", ("men's wear", "mens wear", "gent's wear", "gents wear", "men", "gents", "male")),
+    ("kid_clothing", ("kid's wear", "kids wear", "children's wear", "kids", "children", "boys", "girls")),
+)
+CATEGORY_GROUPS = tuple(group for group, _ in CATEGORY_KEYWORDS)
+
+# Message word (or its lemma) -> product item type
+PRODUCT_TYPE_KEYWORDS = {
+    "dresses": "dress", "dress": "dress", "gown": "dress",
+    "t-shirts": "t-shirt", "tshirt": "t-shirt", "tee": "t-shirt",
+    "pants": "pant", "jeans": "jeans", "trouser": "pant",
+    "shirts": "shirt", "shirt": "shirt",
+    "top": "top", "tops": "top",
+    "jackets": "jacket", "jacket": "jacket", "coat": "jacket",
+    "skirts": "skirt", "skirt": "skirt",
+    "saree": "saree", "sarees": "saree", "sari": "saree",
+    "hoodie": "hoodie", "sweatshirt": "sweatshirt",
+    "shorts": "shorts", "leggings": "leggings", "trousers": "trousers",
+}
+ITEM_TYPES = tuple(sorted(set(PRODUCT_TYPE_KEYWORDS.values())))
+
+COLORS = ("red", "blue", "green", "black", "white", "pink", "yellow", "orange", "purple", "brown", "grey",
+          "silver", "gold")
+
+# Message size word/phrase -> Product.size value
+SIZE_MAPPING = {
+    "xs": "XS", "extra small": "XS",
+    "s": "S", "small": "S",
+    "m": "M", "medium": "M",
+    "l": "L", "large": "L",
+    "xl": "XL", "x-large": "XL", "extra large": "XL",
+    "xxl": "XXL", "xx-large": "XXL",
+}
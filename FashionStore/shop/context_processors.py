@@ -1,4 +1,44 @@
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from shop import catalog_cache
 from shop.models import Category
+
+# Per-process copy of the navigation menu: (version, tree, html).
+# The shared cache holds the same data for other workers; both are keyed by
+# the NAVIGATION version, which only Category/SubCategory signals bump.
+_nav_menu = (None, None, None)
+
+
+def _build_nav_tree():
+    categories = Category.objects.prefetch_related('subcategories').order_by('id')
+    return [
+        {
+            'id': category.id,
+            'name': category.name,
+            'image_url': category.image.url if category.image else None,
+            'subcategories': [{'id': sub.id, 'name': sub.name} for sub in category.subcategories.all()],
+        }
+        for category in categories
+    ]
+
+
+def get_nav_menu():
+    """Returns (tree, html) for the category menu, building it at most once per version."""
+    global _nav_menu
+    version = catalog_cache.get_version(catalog_cache.NAVIGATION)
+    if _nav_menu[0] != version:
+        tree = catalog_cache.get_or_set('tree', _build_nav_tree, namespace=catalog_cache.NAVIGATION, version=version)
+        html = catalog_cache.get_or_set(
+            'html', lambda: render_to_string('category_nav.html', {'nav_categories': tree}),
+            namespace=catalog_cache.NAVIGATION, version=version)
+        _nav_menu = (version, tree, html)
+    return _nav_menu[1], mark_safe(_nav_menu[2])
+
+
 def links(request):
-    c=Category.objects.all()
-    return {'cat':c}
\ No newline at end of file
+    # Callables, so pages that never show the menu don't even look it up
+    return {
+        'cat': lambda: get_nav_menu()[0],
+        'nav_menu_html': lambda: get_nav_menu()[1],
+    }
\ No newline at end of file
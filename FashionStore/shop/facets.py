@@ -0,0 +1,178 @@
+"""
+In-process facet index for the product listing sidebar.
+
+ProductListView used to run a category Count() annotation, two DISTINCT scans
+for colors/sizes and a COUNT(*) over the whole catalog on every page view.
+This module keeps a posting list (a set of product ids) per facet value for
+every available product instead, so the sidebar counts are read straight from
+memory. The index is built once per worker with a single values_list() query,
+kept current by the Product save/delete signals in shop/signals.py, and
+rebuilt after FACET_INDEX_REFRESH_SECONDS so that workers which did not see a
+signal (gunicorn runs several processes) converge again.
+"""
+import threading
+import time
+from decimal import Decimal
+
+from django.conf import settings
+
+# Facet dimensions, in the order the attributes are stored per product.
+DIMENSIONS = ('category', 'subcategory', 'gender', 'color', 'size', 'price_range')
+
+# Same buckets as the "Filter by price" radios in products.html
+PRICE_BUCKETS = (
+    (500, 1000),
+    (1001, 2000),
+    (2001, 3000),
+    (3001, 4000),
+    (4001, 5000),
+)
+
+
+def price_bucket(price):
+    """Returns the 'min-max' price_range key for a price, or None if no bucket matches."""
+    if price is None:
+        return None
+    price = Decimal(price)
+    for low, high in PRICE_BUCKETS:
+        if low <= price <= high:
+            return f"{low}-{high}"
+    return None
+
+
+def _normalize(value):
+    # color/size are filtered with __iexact, so facet keys are case-insensitive
+    if value is None:
+        return None
+    value = str(value).strip().lower()
+    return value or None
+
+
+def product_facets(category_id, subcategory_id, gender, color, size, price):
+    """Builds the per-product attribute tuple, ordered like DIMENSIONS."""
+    return (
+        category_id,
+        subcategory_id,
+        gender,
+        _normalize(color),
+        _normalize(size),
+        price_bucket(price),
+    )
+
+
+class FacetIndex:
+    """
+    Posting lists of available product ids keyed by (dimension, value).
+
+    Counts for a dimension are computed against all *other* active filters,
+    so selecting "Red" still shows how many products every other color has.
+    With no other filters active a count is just len() of a posting list.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._attributes = {}  # product id -> tuple ordered like DIMENSIONS
+        self._postings = {dimension: {} for dimension in DIMENSIONS}
+        self._built_at = None
+
+    # --- Maintenance ---
+    def build(self):
+        from .models import Product
+
+        rows = Product.objects.filter(available=True).values_list(
+            'id', 'category_id', 'subcategory_id', 'gender', 'color', 'size', 'price'
+        )
+        attributes = {row[0]: product_facets(*row[1:]) for row in rows}
+        postings = {dimension: {} for dimension in DIMENSIONS}
+        for product_id, values in attributes.items():
+            for dimension, value in zip(DIMENSIONS, values):
+                if value is not None:
+                    postings[dimension].setdefault(value, set()).add(product_id)
+
+        with self._lock:
+            self._attributes = attributes
+            self._postings = postings
+            self._built_at = time.monotonic()
+
+    def invalidate(self):
+        with self._lock:
+            self._built_at = None
+
+    def _ensure_fresh(self):
+        refresh_after = getattr(settings, 'FACET_INDEX_REFRESH_SECONDS', 300)
+        built_at = self._built_at
+        if built_at is None or (refresh_after and time.monotonic() - built_at > refresh_after):
+            self.build()
+
+    def _unlink(self, product_id):
+        old = self._attributes.pop(product_id, None)
+        if old is None:
+            return
+        for dimension, value in zip(DIMENSIONS, old):
+            if value is None:
+                continue
+            ids = self._postings[dimension].get(value)
+            if ids is not None:
+                ids.discard(product_id)
+                if not ids:
+                    del self._postings[dimension][value]
+
+    def update_product(self, product):
+        """Re-indexes one product after it was saved."""
+        with self._lock:
+            if self._built_at is None:
+                return  # Not built yet in this worker; the first read will load it
+            self._unlink(product.pk)
+            if not product.available:
+                return
+            values = product_facets(product.category_id, product.subcategory_id, product.gender,
+                                    product.color, product.size, product.price)
+            self._attributes[product.pk] = values
+            for dimension, value in zip(DIMENSIONS, values):
+                if value is not None:
+                    self._postings[dimension].setdefault(value, set()).add(product.pk)
+
+    def remove_product(self, product_id):
+        with self._lock:
+            self._unlink(product_id)
+
+    # --- Queries ---
+    def _matching(self, filters, exclude=None, candidate_ids=None):
+        """
+        Returns the set of ids matching every filter except `exclude`,
+        or None when nothing restricts the result (i.e. the whole index).
+        """
+        result = None if candidate_ids is None else set(candidate_ids)
+        restricting = [
+            (dimension, _normalize(value) if dimension in ('color', 'size') else value)
+            for dimension, value in filters.items()
+            if dimension != exclude and value not in (None, '')
+        ]
+        # Intersect smallest posting lists first
+        restricting.sort(key=lambda item: len(self._postings[item[0]].get(item[1], ())))
+        for dimension, value in restricting:
+            ids = self._postings[dimension].get(value, set())
+            result = set(ids) if result is None else result & ids
+            if not result:
+                return set()
+        return result
+
+    def counts(self, dimension, filters=None, candidate_ids=None):
+        """Returns {value: count} for one dimension under the other active filters."""
+        with self._lock:
+            self._ensure_fresh()
+            matching = self._matching(filters or {}, exclude=dimension, candidate_ids=candidate_ids)
+            postings = self._postings[dimension]
+            if matching is None:
+                return {value: len(ids) for value, ids in postings.items()}
+            return {value: len(ids & matching) for value, ids in postings.items() if not ids.isdisjoint(matching)}
+
+    def total(self, filters=None, exclude=None, candidate_ids=None):
+        """Number of products matching the filters, optionally ignoring one dimension."""
+        with self._lock:
+            self._ensure_fresh()
+            matching = self._matching(filters or {}, exclude=exclude, candidate_ids=candidate_ids)
+            return len(self._attributes) if matching is None else len(matching)
+
+
+facet_index = FacetIndex()
@@ -0,0 +1,91 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+SAMPLE_MESSAGES = [
+    "show me red dresses",
+    "do you have black shoes in size m",
+    "looking for a blue denim jacket for men",
+    "i want extra large white t-shirts",
+    "find me a leather bag",
+    "show me kids wear",
+    "any gold necklaces or earrings",
+    "women's sarees in green",
+]
+
+
+def _rss_kb():
+    """Current resident set size in KB (Linux), falling back to the peak RSS elsewhere."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class Command(BaseCommand):
+    help = ("Compares the CHATBOT_NLP_MODE pipelines (full, lean, blank): load time, resident memory and "
+            "per-message latency. Each mode is measured in a fresh process.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', nargs='+', default=['full', 'lean', 'blank'])
+        parser.add_argument('--repeat', type=int, default=200, help="Passes over the sample messages.")
+        parser.add_argument('--child', help="Internal: measure one mode in this process and print JSON.")
+
+    def handle(self, *args, **options):
+        if options['child']:
+            self.stdout.write(json.dumps(self._measure(options['child'], options['repeat'])))
+            return
+
+        self.stdout.write(f"{'mode':<7} {'pipes':<52} {'load ms':>8} {'RSS MB':>7} {'p50 us':>7} {'p95 us':>7}")
+        for mode in options['modes']:
+            result = subprocess.run(
+                [sys.executable, sys.argv[0], 'benchmark_chatbot_nlp', '--child', mode, '--repeat', str(options['repeat'])],
+                capture_output=True, text=True,
+            )
+            if result.returncode != 0:
+                self.stderr.write(f"{mode}: failed\n{result.stderr[-2000:]}")
+                continue
+            r = json.loads(result.stdout.strip().splitlines()[-1])
+            pipes = ','.join(r['pipes']) or '(tokenizer only)'
+            if r['fell_back']:
+                pipes = f"model missing -> {pipes}"
+            self.stdout.write(f"{mode:<7} {pipes:<52} {r['load_ms']:>8.0f} {r['rss_mb']:>7.1f} "
+                              f"{r['p50_us']:>7.0f} {r['p95_us']:>7.0f}")
+
+    def _measure(self, mode, repeat):
+        import spacy  # Imported before the baseline so the library itself is not counted as model memory
+
+        from shop import chatbot_nlp
+
+        rss_before = _rss_kb()
+        started = time.perf_counter()
+        nlp = chatbot_nlp.load_nlp(mode)
+        load_ms = (time.perf_counter() - started) * 1000
+        rss_mb = (_rss_kb() - rss_before) / 1024
+
+        for message in SAMPLE_MESSAGES:  # Warm-up
+            nlp(message)
+        timings = []
+        for _ in range(repeat):
+            for message in SAMPLE_MESSAGES:
+                t = time.perf_counter()
+                doc = nlp(message)
+                [(token.text, token.lemma_) for token in doc]
+                timings.append((time.perf_counter() - t) * 1e6)
+        timings.sort()
+        return {
+            'mode': mode,
+            'pipes': nlp.pipe_names,
+            'fell_back': mode != 'blank' and not spacy.util.is_package(chatbot_nlp.MODEL_NAME),
+            'load_ms': load_ms,
+            'rss_mb': rss_mb,
+            'p50_us': statistics.median(timings),
+            'p95_us': timings[int(len(timings) * 0.95) - 1],
+        }
@@ -0,0 +1,85 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop import chatbot_nlp
+from shop.chatbot_slots import SlotMatcher
+from shop.chatbot_vocab import CATEGORY_KEYWORDS, COLORS, PRODUCT_TYPE_KEYWORDS, SIZE_MAPPING
+
+from .benchmark_chatbot_nlp import SAMPLE_MESSAGES
+
+
+def legacy_extract(nlp, message):
+    """The extraction _extract_product_slots did before shop/chatbot_slots.py: substring scans plus token loops."""
+    doc = nlp(message)
+    main_category = product_item_type = color = size = None
+    for group, keywords in CATEGORY_KEYWORDS:
+        if any(keyword in message for keyword in keywords):
+            main_category = group
+            break
+    for token in doc:
+        if token.text in PRODUCT_TYPE_KEYWORDS:
+            product_item_type = PRODUCT_TYPE_KEYWORDS[token.text]
+            break
+        elif token.lemma_ in PRODUCT_TYPE_KEYWORDS:
+            product_item_type = PRODUCT_TYPE_KEYWORDS[token.lemma_]
+            break
+    for token in doc:
+        if token.text in COLORS:
+            color = token.text
+            break
+    for token in doc:
+        normalized_token = token.text.lower().replace('-', ' ')
+        if normalized_token in SIZE_MAPPING:
+            size = SIZE_MAPPING[normalized_token]
+            break
+    return main_category, product_item_type, color, size
+
+
+class Command(BaseCommand):
+    help = ("Microbenchmark of chatbot slot extraction: the old substring scans + spaCy token loops "
+            "against the single-pass keyword matcher. Also lists messages where the two disagree.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=500, help="Passes over the sample messages.")
+        parser.add_argument('--messages', help="File with one message per line (default: built-in samples).")
+
+    def _time(self, extract, messages, repeat):
+        for message in messages:  # Warm-up
+            extract(message)
+        timings = []
+        for _ in range(repeat):
+            for message in messages:
+                started = time.perf_counter()
+                extract(message)
+                timings.append((time.perf_counter() - started) * 1e6)
+        timings.sort()
+        return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+    def handle(self, *args, **options):
+        if options['messages']:
+            with open(options['messages'], encoding='utf-8') as f:
+                messages = [line.strip().lower() for line in f if line.strip()]
+        else:
+            messages = [message.lower() for message in SAMPLE_MESSAGES]
+
+        nlp = chatbot_nlp.load_nlp()
+        started = time.perf_counter()
+        matcher = SlotMatcher()
+        build_ms = (time.perf_counter() - started) * 1000
+
+        self.stdout.write(f"{len(messages)} messages x {options['repeat']}; matcher compiled in {build_ms:.2f} ms "
+                          f"(spaCy pipeline: {','.join(nlp.pipe_names) or 'tokenizer only'})")
+        self.stdout.write(f"{'extractor':<10} {'p50 us':>8} {'p95 us':>8}")
+        for label, extract in (('legacy', lambda message: legacy_extract(nlp, message)),
+                               ('matcher', matcher.extract)):
+            p50, p95 = self._time(extract, messages, options['repeat'])
+            self.stdout.write(f"{label:<10} {p50:>8.1f} {p95:>8.1f}")
+
+        differences = [(message, legacy_extract(nlp, message), matcher.extract(message)) for message in messages]
+        differences = [row for row in differences if row[1] != row[2]]
+        if differences:
+            self.stdout.write(f"\n{len(differences)} message(s) extracted differently (legacy -> matcher):")
+            for message, legacy, new in differences:
+                self.stdout.write(f"  {message!r}: {legacy} -> {new}")
@@ -0,0 +1,78 @@
+import os
+import re
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Libraries only the chatbot needs; loading the URLconf must not import any of them
+HEAVY_MODULES = ('spacy', 'thinc', 'sklearn', 'scipy', 'joblib')
+
+# Loads the URLconf the way a web worker does, then prints its resident memory
+PROBE = """
+import os, django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+try:
+    with open('/proc/self/statm') as f:
+        rss_kb = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+except (OSError, ValueError):
+    import resource
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(rss_kb)
+"""
+
+# "import time: self [us] | cumulative | imported package"
+_IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def parse_importtime(stderr):
+    """Parses `python -X importtime` output into (module, self_us, cumulative_us, depth) rows."""
+    rows = []
+    for line in stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            rows.append((module, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return rows
+
+
+class Command(BaseCommand):
+    help = ("Loads the URLconf in a fresh interpreter under `python -X importtime` and reports import time "
+            "and resident memory. Fails if a chatbot-only library (spaCy, scikit-learn, ...) is imported or a "
+            "budget is exceeded.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=15, help="Top-level imports to list, slowest first.")
+        parser.add_argument('--max-ms', type=float, help="Fail if total import time exceeds this.")
+        parser.add_argument('--max-rss-mb', type=float, help="Fail if worker RSS after loading the URLconf exceeds this.")
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'FashionStore.settings'))
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', PROBE],
+                                capture_output=True, text=True, env=env, cwd=settings.BASE_DIR)
+        if result.returncode != 0:
+            raise CommandError(f"Loading the URLconf failed:\n{result.stderr[-2000:]}")
+
+        rows = parse_importtime(result.stderr)
+        top_level = sorted((row for row in rows if row[3] == 0), key=lambda row: -row[2])
+        total_ms = sum(row[2] for row in top_level) / 1000
+        rss_mb = int(result.stdout.strip().splitlines()[-1]) / 1024
+
+        self.stdout.write(f"{'cumulative ms':>13}  module")
+        for module, _, cumulative_us, _ in top_level[:options['top']]:
+            self.stdout.write(f"{cumulative_us / 1000:>13.1f}  {module}")
+        self.stdout.write(f"\n{len(rows)} modules imported in {total_ms:.0f} ms; worker RSS {rss_mb:.1f} MB")
+
+        problems = []
+        heavy = sorted({row[0] for row in rows if row[0].split('.')[0] in HEAVY_MODULES})
+        if heavy:
+            problems.append(f"URLconf imports chatbot-only libraries: {', '.join(heavy[:10])}")
+        if options['max_ms'] is not None and total_ms > options['max_ms']:
+            problems.append(f"import time {total_ms:.0f} ms exceeds {options['max_ms']:.0f} ms")
+        if options['max_rss_mb'] is not None and rss_mb > options['max_rss_mb']:
+            problems.append(f"RSS {rss_mb:.1f} MB exceeds {options['max_rss_mb']:.1f} MB")
+        if problems:
+            raise CommandError('; '.join(problems))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from shop.chatbot_model import build_artifact
+
+
+class Command(BaseCommand):
+    help = ("Trains the Fashion Bot intent classifier from chatbot_intents.json and writes the artifact "
+            "workers load at runtime. Run it as part of the deploy/build step.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--intents', help="Intents file (defaults to settings.CHATBOT_INTENTS_PATH).")
+        parser.add_argument('--keep-old', action='store_true', help="Keep artifacts built from other intents files.")
+
+    def handle(self, *args, **options):
+        path, digest = build_artifact(options['intents'], prune=not options['keep_old'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote chatbot model {digest[:16]} to {path}"))
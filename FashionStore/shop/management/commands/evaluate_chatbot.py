@@ -0,0 +1,142 @@
+import csv
+import json
+import math
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop import chatbot, chatbot_cache, chatbot_model
+from shop.chatbot_slots import extract_slots
+
+STAGES = ('vectorize', 'classify', 'slots', 'spacy', 'product query')
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    return sorted_values[max(math.ceil(fraction * len(sorted_values)) - 1, 0)]
+
+
+def read_messages(path):
+    """
+    Reads (message, expected tag or None) pairs from a .jsonl file ({"message": ..., "tag": ...}),
+    a .csv file with a `message` and optional `tag` column, or a text file with one message per line.
+    """
+    with open(path, encoding='utf-8', newline='') as f:
+        if path.endswith('.jsonl'):
+            rows = [json.loads(line) for line in f if line.strip()]
+            return [(row['message'], row.get('tag')) for row in rows]
+        if path.endswith('.csv'):
+            return [(row['message'], row.get('tag') or None) for row in csv.DictReader(f)]
+        return [(line.strip(), None) for line in f if line.strip()]
+
+
+class Command(BaseCommand):
+    help = ("Replays chat messages through the Fashion Bot offline: classifies them in batches, reports accuracy "
+            "and a confusion matrix against expected tags (per --threshold), and p50/p95/p99 latency per stage. "
+            "Without --input the intent patterns themselves are replayed.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--input', help=".jsonl / .csv / .txt file of logged messages (see read_messages).")
+        parser.add_argument('--threshold', type=float, nargs='+',
+                            help="Confidence thresholds to evaluate (default: CHATBOT_CONFIDENCE_THRESHOLD).")
+        parser.add_argument('--batch-size', type=int, default=1024)
+        parser.add_argument('--skip-products', action='store_true', help="Do not run the product lookup stage.")
+        parser.add_argument('--confusion-csv', help="Write the full confusion matrix of the first threshold here.")
+        parser.add_argument('--top', type=int, default=15, help="Most frequent confusions to print.")
+
+    def handle(self, *args, **options):
+        if options['input']:
+            samples = read_messages(options['input'])
+        else:
+            with open(chatbot_model.intents_path(), encoding='utf-8') as f:
+                samples = [(pattern, intent['tag']) for intent in json.load(f) for pattern in intent['patterns']]
+        if not samples:
+            raise CommandError("No messages to evaluate.")
+
+        nlp, intents, vectorizer, clf = chatbot._load_fashion_bot_resources()
+        if not (clf and vectorizer and intents):
+            raise CommandError("The intent model could not be loaded; see the log.")
+        thresholds = options['threshold'] or [chatbot.confidence_threshold()]
+        messages = [chatbot_cache.normalize_message(message) for message, _ in samples]
+        expected = [tag for _, tag in samples]
+        timings = {stage: [] for stage in STAGES}
+
+        # Vectorize and score whole batches: one sparse-matrix call each
+        score_batches = []
+        batch_size = options['batch_size']
+        for start in range(0, len(messages), batch_size):
+            batch = messages[start:start + batch_size]
+            started = time.perf_counter()
+            features = vectorizer.transform(batch)
+            vectorized = time.perf_counter()
+            score_batches.append(chatbot._class_scores(clf, features))
+            timings['vectorize'].append((vectorized - started) * 1000)
+            timings['classify'].append((time.perf_counter() - vectorized) * 1000)
+
+        predictions = {threshold: [] for threshold in thresholds}
+        for scores in score_batches:
+            for threshold in thresholds:
+                predictions[threshold].extend(chatbot._tags_for_scores(clf, scores, threshold))
+
+        # Per-message stages of product searches, as predicted at the first threshold
+        for message, tag in zip(messages, predictions[thresholds[0]]):
+            if tag != "product_search_query":
+                continue
+            started = time.perf_counter()
+            slots = extract_slots(message)
+            timings['slots'].append((time.perf_counter() - started) * 1000)
+            if nlp:
+                started = time.perf_counter()
+                nlp(message)
+                timings['spacy'].append((time.perf_counter() - started) * 1000)
+            if not options['skip_products']:
+                started = time.perf_counter()
+                chatbot._product_search_response(slots, message)
+                timings['product query'].append((time.perf_counter() - started) * 1000)
+
+        self.report_latency(timings, len(messages), batch_size)
+        labelled = [i for i, tag in enumerate(expected) if tag]
+        if not labelled:
+            counts = Counter(predictions[thresholds[0]])
+            self.stdout.write("\nNo expected tags in the input; predicted intents:")
+            for tag, count in counts.most_common():
+                self.stdout.write(f"  {count:>7}  {tag}")
+            return
+        for threshold in thresholds:
+            self.report_accuracy(threshold, [expected[i] for i in labelled],
+                                 [predictions[threshold][i] for i in labelled], options)
+
+    def report_latency(self, timings, message_count, batch_size):
+        self.stdout.write(f"{message_count} messages, batches of up to {batch_size}\n")
+        self.stdout.write(f"{'stage (ms)':<26} {'samples':>8} {'p50':>9} {'p95':>9} {'p99':>9}")
+        for stage in STAGES:
+            values = sorted(timings[stage])
+            label = f"{stage} per batch" if stage in ('vectorize', 'classify') else f"{stage} per message"
+            if not values:
+                self.stdout.write(f"{label:<26} {0:>8}")
+                continue
+            self.stdout.write(f"{label:<26} {len(values):>8} {percentile(values, 0.50):>9.3f} "
+                              f"{percentile(values, 0.95):>9.3f} {percentile(values, 0.99):>9.3f}")
+
+    def report_accuracy(self, threshold, expected, predicted, options):
+        correct = sum(1 for want, got in zip(expected, predicted) if want == got)
+        fallback = sum(1 for got in predicted if got == "fallback")
+        self.stdout.write(f"\nthreshold {threshold:+.2f}: accuracy {correct / len(expected):.2%} "
+                          f"({correct}/{len(expected)}), {fallback} answered with fallback")
+
+        confusion = Counter(zip(expected, predicted))
+        mistakes = [(count, want, got) for (want, got), count in confusion.items() if want != got]
+        for count, want, got in sorted(mistakes, reverse=True)[:options['top']]:
+            self.stdout.write(f"  {count:>7}  {want} -> {got}")
+
+        if options['confusion_csv'] and threshold == (options['threshold'] or [threshold])[0]:
+            labels = sorted(set(expected) | set(predicted))
+            with open(options['confusion_csv'], 'w', encoding='utf-8', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['expected \\ predicted', *labels])
+                for want in labels:
+                    writer.writerow([want, *(confusion.get((want, got), 0) for got in labels)])
+            self.stdout.write(f"  confusion matrix written to {options['confusion_csv']}")
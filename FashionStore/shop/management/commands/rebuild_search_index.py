@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from shop.models import Product
+from shop.search import get_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the product full-text search index from the Product table."
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        backend.rebuild()
+        count = Product.objects.filter(available=True).count()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt the '{backend.name}' search index for {count} products."))
+        if backend.name == 'memory':
+            self.stdout.write(
+                "The in-process index lives in each web worker; running workers rebuild it "
+                "after SEARCH_INDEX_REFRESH_SECONDS."
+            )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from shop.popularity import recompute_all
+
+
+class Command(BaseCommand):
+    help = "Recomputes product units_sold, favorites_count and time-decayed popularity from orders and favorites."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Rows per bulk UPDATE.")
+
+    def handle(self, *args, **options):
+        count = recompute_all(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Recomputed popularity for {count} products."))
@@ -0,0 +1,58 @@
+from django.db import migrations
+
+# Frozen copies of shop.search.FTS_TABLE and fts5_available(), so later edits
+# to that module cannot change what this migration does.
+FTS_TABLE = 'shop_product_fts'
+
+
+def _fts5_available(connection):
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        if cursor.fetchone()[0]:
+            return True
+        try:
+            cursor.execute("CREATE VIRTUAL TABLE temp.shop_fts5_probe USING fts5(x)")
+            cursor.execute("DROP TABLE temp.shop_fts5_probe")
+            return True
+        except Exception:
+            return False
+
+
+def create_fts_table(apps, schema_editor):
+    # Only SQLite builds with FTS5 get the virtual table; other databases
+    # fall back to the in-process index in shop/search.py.
+    connection = schema_editor.connection
+    if connection.alias != 'default' or not _fts5_available(connection):
+        return
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+        f"USING fts5(name, description, category, subcategory, tokenize='porter unicode61')"
+    )
+    Product = apps.get_model('shop', 'Product')
+    rows = Product.objects.filter(available=True).values_list(
+        'id', 'name', 'description', 'category__name', 'subcategory__name'
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {FTS_TABLE} (rowid, name, description, category, subcategory) VALUES (%s, %s, %s, %s, %s)",
+            [(pk, name, description or '', category or '', subcategory or '')
+             for pk, name, description, category, subcategory in rows],
+        )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0006_product_gender'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
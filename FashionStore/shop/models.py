@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import Q
+from django.db.models.functions import Lower
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
@@ -14,6 +16,16 @@ class SubCategory(models.Model):
     def __str__(self):
         return self.name
 
+class ProductQuerySet(models.QuerySet):
+    # Case-insensitive color/size matches written as lower(col) = value so the
+    # functional indexes below can serve them (__iexact compiles to LIKE/UPPER()).
+    def filter_color(self, color):
+        return self.alias(color_lower=Lower('color')).filter(color_lower=color.lower())
+
+    def filter_size(self, size):
+        return self.alias(size_lower=Lower('size')).filter(size_lower=size.lower())
+
+
 class Product(models.Model):
     GENDER_CHOICES = (
         ('M', 'Men'),
@@ -36,10 +48,40 @@ class Product(models.Model):
     color = models.CharField(max_length=50, blank=True, null=True)  # e.g., "Red", "Blue", "Black"
     size = models.CharField(max_length=50, blank=True, null=True)  # e.g., "S", "M", "L", "XL"
 
+    # Denormalized popularity counters, maintained by shop/popularity.py
+    units_sold = models.PositiveIntegerField(default=0, editable=False)
+    favorites_count = models.PositiveIntegerField(default=0, editable=False)
+    popularity = models.FloatField(default=0, editable=False,
+                                   help_text="Time-decayed sales/favorites score used by sort_by=popularity.")
+
+    # Units held by unpaid online orders (cart/reservations.py); not sellable until released
+    reserved = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        # Access paths of ProductListView and the chatbot product lookup;
+        # shop/tests.py checks their query plans for full table scans.
+        # Listing/chatbot queries always filter available=True, which Django renders as a bare
+        # boolean column on SQLite; a partial index on that condition is what the planner can use.
+        indexes = [
+            models.Index(fields=['-created', '-id'], condition=Q(available=True), name='shop_product_latest_idx'),
+            models.Index(fields=['price', 'id'], condition=Q(available=True), name='shop_product_price_idx'),
+            models.Index(fields=['-popularity', '-id'], condition=Q(available=True),
+                         name='shop_product_popularity_idx'),
+            models.Index(fields=['gender'], condition=Q(available=True), name='shop_product_gender_idx'),
+            # color/size are matched case-insensitively through Lower(), see ProductQuerySet
+            models.Index(Lower('color'), name='shop_product_color_lower_idx'),
+            models.Index(Lower('size'), name='shop_product_size_lower_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    @property
+    def sellable_stock(self):
+        return max(self.stock - self.reserved, 0)
+
 from django.contrib.auth.models import AbstractUser
 from random import randint
 class CustomUser(AbstractUser):
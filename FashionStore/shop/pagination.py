@@ -0,0 +1,180 @@
+"""
+Keyset (cursor) pagination for the product listing.
+
+Django's Paginator uses OFFSET, so page N reads and throws away N * per_page
+rows, and it runs a COUNT(*) of the filtered queryset for every page. The
+CursorPaginator instead remembers the sort key of the last row it returned
+and asks for the rows after it:
+
+    WHERE (price > last_price) OR (price = last_price AND id > last_id)
+    ORDER BY price, id LIMIT per_page + 1
+
+so every page costs the same as the first one. The position is handed to
+the browser as an opaque, signed `cursor` token. The total is optional and
+comes from a caller-supplied callable (the facet index for the listing)
+rather than a COUNT(*).
+
+CachedPaginator is the regular OFFSET paginator with its count and page rows
+read through the catalog cache; the listing uses it when cursor mode is off.
+"""
+import datetime
+
+from django.core import signing
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import Http404
+from django.utils.functional import cached_property
+
+from . import catalog_cache
+
+CURSOR_SALT = 'shop.pagination.cursor'
+
+
+class _CursorEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        # Keep microseconds: DjangoJSONEncoder rounds datetimes to milliseconds,
+        # which would skip or repeat rows sharing a `created` second.
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class _CursorSerializer(signing.JSONSerializer):
+    # Datetimes and Decimals (created/price) serialize as strings; the ORM parses them back
+    def dumps(self, obj):
+        return _CursorEncoder(separators=(',', ':')).encode(obj).encode('latin-1')
+
+
+def encode_cursor(ordering, values, direction):
+    payload = {'o': list(ordering), 'v': values, 'd': direction}
+    return signing.dumps(payload, salt=CURSOR_SALT, compress=True, serializer=_CursorSerializer)
+
+
+def decode_cursor(token, ordering):
+    """Returns (values, direction) or raises Http404 for a tampered/foreign token."""
+    try:
+        payload = signing.loads(token, salt=CURSOR_SALT, serializer=_CursorSerializer)
+    except signing.BadSignature:
+        raise Http404("Invalid cursor.")
+    if payload.get('o') != list(ordering) or payload.get('d') not in ('next', 'prev'):
+        raise Http404("Cursor does not match the current sort order.")
+    return payload['v'], payload['d']
+
+
+def _after(ordering, values, reverse=False):
+    """
+    Builds the keyset condition for rows strictly after `values` in `ordering`
+    (or before them when reverse=True), e.g. for ('-price', '-id'):
+    price < v0 OR (price = v0 AND id < v1).
+    """
+    condition = Q()
+    equal_so_far = Q()
+    for field, value in zip(ordering, values):
+        descending = field.startswith('-')
+        name = field.lstrip('-')
+        lookup = 'lt' if descending != reverse else 'gt'
+        condition |= equal_so_far & Q(**{f"{name}__{lookup}": value})
+        equal_so_far &= Q(**{name: value})
+    return condition
+
+
+class CursorPage:
+    def __init__(self, object_list, paginator, has_next, has_previous, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+
+class CursorPaginator:
+    """
+    Paginates `queryset` by `ordering`, which must end in a unique field
+    (the listing always uses `id` as the tiebreaker).
+    """
+
+    def __init__(self, queryset, per_page, ordering, count=None):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self._count = count
+
+    @property
+    def count(self):
+        """Total number of rows if the caller supplied a (cached) counter, else None."""
+        if callable(self._count):
+            self._count = self._count()
+        return self._count
+
+    def _key(self, obj):
+        return [getattr(obj, field.lstrip('-')) for field in self.ordering]
+
+    def _cursor(self, obj, direction):
+        return encode_cursor(self.ordering, self._key(obj), direction)
+
+    def page(self, token=None):
+        if not token:
+            values, direction = None, 'next'
+        else:
+            values, direction = decode_cursor(token, self.ordering)
+
+        if direction == 'next':
+            queryset = self.queryset.order_by(*self.ordering)
+            if values is not None:
+                queryset = queryset.filter(_after(self.ordering, values))
+        else:
+            reversed_ordering = [f[1:] if f.startswith('-') else f"-{f}" for f in self.ordering]
+            queryset = self.queryset.order_by(*reversed_ordering).filter(
+                _after(self.ordering, values, reverse=True)
+            )
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if direction == 'next':
+            has_next, has_previous = has_more, values is not None
+        else:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+
+        next_cursor = self._cursor(rows[-1], 'next') if rows and has_next else None
+        previous_cursor = self._cursor(rows[0], 'prev') if rows and has_previous else None
+        return CursorPage(rows, self, has_next, has_previous, next_cursor, previous_cursor)
+
+
+class CachedPaginator(Paginator):
+    """
+    Offset paginator whose COUNT(*) and page rows are served through the
+    catalog cache (shop/catalog_cache.py) under `cache_key`, so repeat views
+    of a listing page skip both queries until the catalog changes.
+    """
+
+    def __init__(self, object_list, per_page, cache_key, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.cache_key = cache_key
+
+    @cached_property
+    def count(self):
+        return catalog_cache.get_or_set('product_list_count', lambda: Paginator.count.func(self), self.cache_key)
+
+    def _get_page(self, object_list, number, paginator):
+        rows = catalog_cache.get_or_set('product_list_page', lambda: list(object_list), self.cache_key, number)
+        return super()._get_page(rows, number, paginator)
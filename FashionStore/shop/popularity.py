@@ -0,0 +1,96 @@
+"""
+Denormalized product popularity for sort_by=popularity.
+
+Each sale and favorite adds weight * 2 ** (t / half_life) to Product.popularity,
+where t is the time since a fixed epoch. Because every score is measured
+against the same epoch, comparing them gives the same order as comparing the
+time-decayed scores "as of now", so the value never has to be decayed in place:
+it can be bumped with a single F() UPDATE and sorted through a plain index.
+`manage.py recompute_popularity` rebuilds the counters from orders/favorites.
+
+None of these writes go through Product.save(), so each one bumps the
+catalog_cache.POPULARITY version itself once it commits; that orphans the
+cached popularity-sorted listing pages and nothing else.
+"""
+import datetime
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from . import catalog_cache
+from .models import Product
+
+POPULARITY_EPOCH = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+
+SALE_WEIGHT = 1.0       # per unit sold
+FAVORITE_WEIGHT = 0.5   # per favorite
+
+
+def decay_boost(when=None):
+    """Multiplier for an event at `when`; doubles every POPULARITY_HALF_LIFE_DAYS."""
+    when = when or timezone.now()
+    half_life = getattr(settings, 'POPULARITY_HALF_LIFE_DAYS', 30) * 86400
+    return 2 ** ((when - POPULARITY_EPOCH).total_seconds() / half_life)
+
+
+def sale_updates(quantity, boost):
+    """update() kwargs counting `quantity` sold units, for callers that fold them into their own UPDATE."""
+    return {
+        'units_sold': F('units_sold') + quantity,
+        'popularity': F('popularity') + quantity * SALE_WEIGHT * boost,
+    }
+
+
+def record_sales(quantities, when=None):
+    """Adds sold units; `quantities` is an iterable of (product_id, quantity)."""
+    boost = decay_boost(when)
+    for product_id, quantity in quantities:
+        Product.objects.filter(pk=product_id).update(**sale_updates(quantity, boost))
+    catalog_cache.bump_version_on_commit(catalog_cache.POPULARITY)
+
+
+def record_order_sales(order):
+    """Counts every line of a completed order towards product popularity."""
+    record_sales(order.items.values_list('product_id', 'quantity'))
+
+
+def record_favorite(product_id, when=None):
+    Product.objects.filter(pk=product_id).update(
+        favorites_count=F('favorites_count') + 1,
+        popularity=F('popularity') + FAVORITE_WEIGHT * decay_boost(when),
+    )
+    catalog_cache.bump_version_on_commit(catalog_cache.POPULARITY)
+
+
+def remove_favorite(product_id, added_at):
+    # Take back exactly what record_favorite() added when the favorite was created
+    Product.objects.filter(pk=product_id, favorites_count__gt=0).update(
+        favorites_count=F('favorites_count') - 1,
+        popularity=F('popularity') - FAVORITE_WEIGHT * decay_boost(added_at),
+    )
+    catalog_cache.bump_version_on_commit(catalog_cache.POPULARITY)
+
+
+def recompute_all(batch_size=500):
+    """Rebuilds units_sold/favorites_count/popularity for every product from scratch."""
+    from cart.models import Favorite, Order_items
+
+    totals = {}
+    sold = Order_items.objects.filter(order__is_ordered=True).values_list(
+        'product_id', 'quantity', 'order__ordered_date'
+    )
+    for product_id, quantity, ordered_date in sold.iterator():
+        units, favorites, score = totals.get(product_id, (0, 0, 0.0))
+        totals[product_id] = (units + quantity, favorites, score + quantity * SALE_WEIGHT * decay_boost(ordered_date))
+    for product_id, added_at in Favorite.objects.values_list('product_id', 'added_at').iterator():
+        units, favorites, score = totals.get(product_id, (0, 0, 0.0))
+        totals[product_id] = (units, favorites + 1, score + FAVORITE_WEIGHT * decay_boost(added_at))
+
+    updated = []
+    for product in Product.objects.only('id', 'units_sold', 'favorites_count', 'popularity').iterator():
+        product.units_sold, product.favorites_count, product.popularity = totals.get(product.id, (0, 0, 0.0))
+        updated.append(product)
+    Product.objects.bulk_update(updated, ['units_sold', 'favorites_count', 'popularity'], batch_size=batch_size)
+    catalog_cache.bump_version_on_commit(catalog_cache.POPULARITY)
+    return len(updated)
@@ -0,0 +1,287 @@
+"""
+Product search backends for the `q` parameter of ProductListView.
+
+The listing used to OR four `icontains` lookups across a join and then call
+distinct(), i.e. a LIKE '%x%' scan of the whole catalog per search with no
+ranking. Searches now go through an inverted index over product name,
+description, category and subcategory, ranked with BM25:
+
+* FTS5Backend   - an SQLite FTS5 virtual table (created by migration 0007),
+                  used when the default database is SQLite with FTS5 compiled in.
+* MemoryBackend - an in-process inverted index, used on any other database.
+
+Both are kept current by the Product/Category/SubCategory signals in
+shop/signals.py and can be rebuilt with `manage.py rebuild_search_index`.
+"""
+import bisect
+import math
+import re
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+
+import logging
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'shop_product_fts'
+
+# Per-field weights: a hit in the product name matters more than one in the description
+FIELD_WEIGHTS = {'name': 10.0, 'description': 1.0, 'category': 5.0, 'subcategory': 5.0}
+FIELDS = tuple(FIELD_WEIGHTS)
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text):
+    return [_stem(token) for token in _TOKEN_RE.findall((text or '').lower())]
+
+
+def _stem(token):
+    # Minimal plural folding so "dresses" finds "dress" (FTS5 uses the porter tokenizer)
+    if len(token) > 4 and token.endswith(('ches', 'shes', 'sses', 'xes', 'zes')):
+        return token[:-2]
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        return token[:-1]
+    return token
+
+
+def fts5_available():
+    """True when the default database is SQLite and was built with FTS5."""
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        if cursor.fetchone()[0]:
+            return True
+        # Some builds ship FTS5 without advertising it as a compile option
+        try:
+            cursor.execute("CREATE VIRTUAL TABLE temp.shop_fts5_probe USING fts5(x)")
+            cursor.execute("DROP TABLE temp.shop_fts5_probe")
+            return True
+        except Exception:
+            return False
+
+
+def _document_rows(queryset):
+    """Yields (id, name, description, category, subcategory) for available products."""
+    return queryset.filter(available=True).values_list(
+        'id', 'name', 'description', 'category__name', 'subcategory__name'
+    ).iterator()
+
+
+class FTS5Backend:
+    name = 'fts5'
+
+    def _match_expression(self, query):
+        # Quote every term so user input can never be parsed as FTS5 syntax,
+        # and prefix-match it so partial words keep working like icontains did.
+        terms = _TOKEN_RE.findall(query.lower())
+        return ' '.join(f'"{term}"*' for term in terms)
+
+    def search(self, query, limit):
+        expression = self._match_expression(query)
+        if not expression:
+            return []
+        weights = ', '.join(str(FIELD_WEIGHTS[field]) for field in FIELDS)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+                f"ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT %s",
+                [expression, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def index_products(self, queryset):
+        ids = list(queryset.values_list('id', flat=True))
+        rows = list(_document_rows(queryset))
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(pk,) for pk in ids])
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, name, description, category, subcategory) "
+                f"VALUES (%s, %s, %s, %s, %s)",
+                [(pk, name, description or '', category or '', subcategory or '')
+                 for pk, name, description, category, subcategory in rows],
+            )
+
+    def remove_product(self, product_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [product_id])
+
+    def rebuild(self):
+        from .models import Product
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        self.index_products(Product.objects.all())
+
+
+class MemoryBackend:
+    """
+    In-process inverted index with field-weighted BM25 scoring.
+
+    Postings map term -> {product id: weighted term frequency}. A sorted term
+    list is kept alongside so query terms can be prefix-expanded with bisect.
+    """
+    name = 'memory'
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = {}
+        self._doc_terms = {}  # product id -> Counter of weighted term frequencies
+        self._doc_lengths = {}
+        self._total_length = 0.0
+        self._sorted_terms = []
+        self._terms_dirty = False
+        self._built_at = None
+
+    def _document(self, name, description, category, subcategory):
+        terms = Counter()
+        for field, text in zip(FIELDS, (name, description, category, subcategory)):
+            for token in tokenize(text):
+                terms[token] += FIELD_WEIGHTS[field]
+        return terms
+
+    def _add(self, product_id, terms):
+        self._doc_terms[product_id] = terms
+        length = sum(terms.values())
+        self._doc_lengths[product_id] = length
+        self._total_length += length
+        for term, frequency in terms.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                self._terms_dirty = True
+            postings[product_id] = frequency
+
+    def _discard(self, product_id):
+        terms = self._doc_terms.pop(product_id, None)
+        if terms is None:
+            return
+        self._total_length -= self._doc_lengths.pop(product_id)
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(product_id, None)
+                if not postings:
+                    del self._postings[term]
+                    self._terms_dirty = True
+
+    def _ensure_fresh(self):
+        refresh_after = getattr(settings, 'SEARCH_INDEX_REFRESH_SECONDS', 300)
+        built_at = self._built_at
+        if built_at is None or (refresh_after and time.monotonic() - built_at > refresh_after):
+            self.rebuild()
+
+    def _expand(self, token):
+        """All indexed terms starting with `token`."""
+        if self._terms_dirty:
+            self._sorted_terms = sorted(self._postings)
+            self._terms_dirty = False
+        start = bisect.bisect_left(self._sorted_terms, token)
+        expanded = []
+        for term in self._sorted_terms[start:]:
+            if not term.startswith(token):
+                break
+            expanded.append(term)
+        return expanded
+
+    def search(self, query, limit):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        with self._lock:
+            self._ensure_fresh()
+            doc_count = len(self._doc_terms)
+            if not doc_count:
+                return []
+            average_length = self._total_length / doc_count
+            scores = None
+            # Every query token must match (as a prefix), like FTS5's implicit AND
+            for token in tokens:
+                token_scores = {}
+                for term in self._expand(token):
+                    postings = self._postings[term]
+                    idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for product_id, frequency in postings.items():
+                        norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[product_id] / average_length)
+                        score = idf * frequency * (self.k1 + 1) / (frequency + norm)
+                        if score > token_scores.get(product_id, 0):
+                            token_scores[product_id] = score
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {pk: scores[pk] + s for pk, s in token_scores.items() if pk in scores}
+                if not scores:
+                    return []
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+        return [product_id for product_id, _ in ranked[:limit]]
+
+    def index_products(self, queryset):
+        with self._lock:
+            if self._built_at is None:
+                return  # Not built yet in this worker; the first search will load it
+            ids = list(queryset.values_list('id', flat=True))
+            for product_id in ids:
+                self._discard(product_id)
+            for pk, name, description, category, subcategory in _document_rows(queryset):
+                self._add(pk, self._document(name, description, category, subcategory))
+
+    def remove_product(self, product_id):
+        with self._lock:
+            self._discard(product_id)
+
+    def rebuild(self):
+        from .models import Product
+
+        with self._lock:
+            self._postings = {}
+            self._doc_terms = {}
+            self._doc_lengths = {}
+            self._total_length = 0.0
+            self._terms_dirty = True
+            for pk, name, description, category, subcategory in _document_rows(Product.objects.all()):
+                self._add(pk, self._document(name, description, category, subcategory))
+            self._built_at = time.monotonic()
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Returns the configured backend (SEARCH_BACKEND = 'auto', 'fts5' or 'memory')."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                choice = getattr(settings, 'SEARCH_BACKEND', 'auto')
+                if choice == 'fts5' or (choice == 'auto' and fts5_available()):
+                    _backend = FTS5Backend()
+                else:
+                    _backend = MemoryBackend()
+                logger.info(f"Product search backend: {_backend.name}")
+    return _backend
+
+
+def search_product_ids(query, limit=None):
+    """Returns product ids matching `query`, best match first."""
+    if limit is None:
+        limit = getattr(settings, 'SEARCH_RESULT_LIMIT', 500)
+    return get_backend().search(query, limit)
+
+
+def index_products(queryset):
+    get_backend().index_products(queryset)
+
+
+def remove_product(product_id):
+    get_backend().remove_product(product_id)
+
+
+def rebuild_index():
+    get_backend().rebuild()
@@ -0,0 +1,83 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from . import catalog_cache, search
+from .chatbot_index import chatbot_index
+from .facets import facet_index
+from .models import Category, SubCategory, Product
+
+
+# --- Product signals: keep the listing facet index and search index current ---
+@receiver(post_save, sender=Product)
+def index_product_facets(sender, instance, **kwargs):
+    facet_index.update_product(instance)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product_facets(sender, instance, **kwargs):
+    facet_index.remove_product(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+def index_product_search(sender, instance, **kwargs):
+    search.index_products(Product.objects.filter(pk=instance.pk))
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product_search(sender, instance, **kwargs):
+    search.remove_product(instance.pk)
+
+
+# --- Chatbot product attribute index (shop/chatbot_index.py) ---
+# Applied on commit, so a rolled-back save never reaches chat replies
+@receiver(post_save, sender=Product)
+def index_product_chatbot_attributes(sender, instance, **kwargs):
+    transaction.on_commit(lambda: chatbot_index.update_product(instance))
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product_chatbot_attributes(sender, instance, **kwargs):
+    product_id = instance.pk  # Cleared on the instance once the delete finishes
+    transaction.on_commit(lambda: chatbot_index.remove_product(product_id))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=SubCategory)
+@receiver(post_delete, sender=SubCategory)
+def rebuild_chatbot_index(sender, **kwargs):
+    # Category names feed several products' tags; rebuild on the next lookup
+    chatbot_index.invalidate()
+
+
+# --- Category/SubCategory names are part of every product's search document ---
+@receiver(post_save, sender=Category)
+def reindex_category_products(sender, instance, created, **kwargs):
+    if not created:
+        search.index_products(Product.objects.filter(category=instance))
+
+
+@receiver(post_save, sender=SubCategory)
+def reindex_subcategory_products(sender, instance, created, **kwargs):
+    if not created:
+        search.index_products(Product.objects.filter(subcategory=instance))
+
+
+# --- Any catalog change orphans every cached catalog read (shop/catalog_cache.py) ---
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=SubCategory)
+@receiver(post_delete, sender=SubCategory)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def bump_catalog_cache_version(sender, **kwargs):
+    catalog_cache.bump_version_on_commit()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=SubCategory)
+@receiver(post_delete, sender=SubCategory)
+def bump_navigation_cache_version(sender, **kwargs):
+    catalog_cache.bump_version_on_commit(catalog_cache.NAVIGATION)
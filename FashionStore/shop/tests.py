@@ -1,3 +1,1014 @@
-from django.test import TestCase
+import datetime
+import importlib.util
+import json
+import math
+import os
+import re
+import tempfile
+import unittest
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.http import Http404
+from django.db.models import Count
+from django.db.models.functions import Lower
+from django.test import TestCase, RequestFactory, override_settings
+from django.utils import timezone
+
+from shop import catalog_cache, chatbot, chatbot_model, chatbot_nlp, chatbot_sessions, context_processors, popularity, warmup
+from shop.chatbot_cache import LRUCache, normalize_message
+from shop.models import Category, SubCategory, Product, CustomUser
+from shop.pagination import CursorPaginator
+from shop.chatbot import _build_chatbot_product_queryset
+from shop.chatbot_index import ChatbotProductIndex
+from shop.facets import facet_index
+from shop.search import FTS5Backend, MemoryBackend, fts5_available
+from shop.chatbot_registry import EMPTY_MODEL, ModelRegistry
+from shop.chatbot_slots import extract_slots
+from shop.management.commands.evaluate_chatbot import percentile
+from shop.chatbot_vocab import CATEGORY_GROUPS, ITEM_TYPES
+from shop.views import ProductListView
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', "EXPLAIN QUERY PLAN output is SQLite specific")
+class CatalogQueryPlanTests(TestCase):
+    """
+    Runs EXPLAIN QUERY PLAN on the querysets built by ProductListView and the
+    chatbot product lookup, and fails when one of them falls back to a full
+    scan of shop_product (i.e. an index from Product.Meta.indexes stopped matching).
+    Only SEARCH steps pass: walking a whole index (SCAN ... USING [COVERING] INDEX)
+    counts as a full scan unless the test names that index in `allowed_scan`.
+    """
+    FULL_SCAN = re.compile(r'\bSCAN shop_product\b')
+    INDEX_SCAN = re.compile(r'\bSCAN shop_product USING (?:COVERING )?INDEX (\w+)$')
+
+    @classmethod
+    def setUpTestData(cls):
+        women = Category.objects.create(name="Womens Wear")
+        bags = Category.objects.create(name="Bags")
+        dresses = SubCategory.objects.create(category=women, name="Dresses")
+        for i in range(20):
+            Product.objects.create(
+                name=f"Floral Dress {i}", description="Cotton summer dress", price=500 + i * 100,
+                category=women, subcategory=dresses, gender='W', stock=5,
+                color="Red" if i % 2 else "Blue", size="M" if i % 3 else "XL",
+            )
+            Product.objects.create(
+                name=f"Crossbody Bag {i}", description="Faux leather bag", price=900 + i * 50,
+                category=bags, gender='U', stock=5, color="Black", available=bool(i % 4),
+            )
+
+    def query_plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertNoFullScan(self, queryset, sorted_by_index=False, allowed_scan=None):
+        plan = self.query_plan(queryset)
+        full_scans = [
+            step for step in plan if self.FULL_SCAN.search(step)
+            and not (allowed_scan and (match := self.INDEX_SCAN.search(step)) and match[1] == allowed_scan)
+        ]
+        self.assertFalse(full_scans, f"Full table scan in query plan: {plan}")
+        if sorted_by_index:
+            self.assertNotIn('USE TEMP B-TREE FOR ORDER BY', plan, f"Listing order not served by an index: {plan}")
+
+    def listing_queryset(self, url, **kwargs):
+        view = ProductListView()
+        view.setup(RequestFactory().get(url), **kwargs)
+        return view.get_queryset()[:view.paginate_by]
+
+    def test_listing_sort_orders_use_an_index(self):
+        # Unfiltered listings walk their sort index in order; LIMIT stops the walk after one page
+        cases = [
+            ('', 'shop_product_latest_idx'),
+            ('latest', 'shop_product_latest_idx'),
+            ('popularity', 'shop_product_popularity_idx'),
+            ('price_asc', 'shop_product_price_idx'),
+            ('price_desc', 'shop_product_price_idx'),
+        ]
+        for sort_by, index in cases:
+            with self.subTest(sort_by=sort_by):
+                self.assertNoFullScan(self.listing_queryset(f"/products/?sort_by={sort_by}"),
+                                      sorted_by_index=True, allowed_scan=index)
+
+    def test_listing_filters_use_an_index(self):
+        category = Category.objects.get(name="Womens Wear")
+        subcategory = SubCategory.objects.get(name="Dresses")
+        cases = [
+            ("/products/?color=red", {}),
+            ("/products/?size=xl&sort_by=price_asc", {}),
+            ("/products/?price_range=500-1000", {}),
+            ("/products/?price_range=1001-2000&sort_by=price_desc", {}),
+            ("/products/", {'category_id': category.id}),
+            ("/products/", {'subcategory_id': subcategory.id}),
+            ("/products/?q=dress", {}),
+        ]
+        for url, kwargs in cases:
+            with self.subTest(url=url, kwargs=kwargs):
+                self.assertNoFullScan(self.listing_queryset(url, **kwargs))
+
+    def test_chatbot_product_lookups_use_an_index(self):
+        # Shoes, bags and accessories match category/subcategory names with icontains, which no
+        # index serves, so they scan every available product. Chat replies answer those slots
+        # from shop/chatbot_index.py; the queryset is only the free-text fallback.
+        icontains_scan = 'shop_product_gender_idx'
+        cases = [
+            ("women_clothing", None, None, None, None),
+            ("men_clothing", None, None, None, None),
+            ("kid_clothing", "dress", None, None, None),
+            (None, None, "red", None, None),
+            (None, None, None, "M", None),
+            (None, "dress", "red", "M", None),
+            ("shoes", None, None, None, icontains_scan),
+            ("bags", None, None, None, icontains_scan),
+            ("accessories", None, None, None, icontains_scan),
+        ]
+        for main_category, item_type, color, size, allowed_scan in cases:
+            with self.subTest(main_category=main_category, item_type=item_type, color=color, size=size):
+                queryset = _build_chatbot_product_queryset(main_category, item_type, color, size, "show me")
+                self.assertNoFullScan(queryset[:3], allowed_scan=allowed_scan)
+
+
+class FacetIndexTests(TestCase):
+    """The sidebar counts must equal what the equivalent ORM Count() annotations return."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.women = Category.objects.create(name="Womens Wear")
+        cls.bags = Category.objects.create(name="Bags")
+        cls.dresses = SubCategory.objects.create(category=cls.women, name="Dresses")
+        for i in range(12):
+            Product.objects.create(
+                name=f"Dress {i}", description="Dress", price=600 + i * 300, category=cls.women,
+                subcategory=cls.dresses if i % 2 else None, gender='W', stock=5,
+                color=("Red", "red", "Blue")[i % 3], size=("M", "L")[i % 2],
+            )
+            Product.objects.create(name=f"Bag {i}", description="Bag", price=900 + i * 100, category=cls.bags,
+                                   gender='U', stock=5, color="Black", available=bool(i % 4))
+
+    def setUp(self):
+        facet_index.invalidate()
+
+    def orm_products(self, category=None, color=None, size=None, price_range=None, candidate_ids=None):
+        queryset = Product.objects.filter(available=True)
+        if category:
+            queryset = queryset.filter(category_id=category)
+        if color:
+            queryset = queryset.filter_color(color)
+        if size:
+            queryset = queryset.filter_size(size)
+        if price_range:
+            low, high = map(int, price_range.split('-'))
+            queryset = queryset.filter(price__gte=low, price__lte=high)
+        if candidate_ids is not None:
+            queryset = queryset.filter(id__in=candidate_ids)
+        return queryset
+
+    def test_counts_and_totals_match_the_orm(self):
+        dress_ids = list(Product.objects.filter(name__startswith="Dress").values_list('id', flat=True))[:7]
+        cases = [
+            ({}, None),
+            ({'color': 'RED'}, None),
+            ({'category': self.women.id, 'size': 'm'}, None),
+            ({'price_range': '1001-2000', 'color': 'red'}, None),
+            ({'size': 'L'}, dress_ids),
+            ({'category': self.bags.id}, dress_ids),
+        ]
+        for filters, candidate_ids in cases:
+            with self.subTest(filters=filters, candidate_ids=candidate_ids):
+                self.assertEqual(facet_index.total(filters, candidate_ids=candidate_ids),
+                                 self.orm_products(**filters, candidate_ids=candidate_ids).count())
+
+                others = {key: value for key, value in filters.items() if key != 'color'}
+                expected = {
+                    row['color_key']: row['count']
+                    for row in self.orm_products(**others, candidate_ids=candidate_ids)
+                    .annotate(color_key=Lower('color')).values('color_key').annotate(count=Count('id'))
+                }
+                self.assertEqual(facet_index.counts('color', filters, candidate_ids), expected)
+
+                others = {key: value for key, value in filters.items() if key != 'category'}
+                expected = dict(self.orm_products(**others, candidate_ids=candidate_ids)
+                                .values_list('category_id').annotate(count=Count('id')))
+                self.assertEqual(facet_index.counts('category', filters, candidate_ids), expected)
+
+    def test_saved_and_deleted_products_update_the_index(self):
+        self.assertEqual(facet_index.counts('color').get('green'), None)
+        dress = Product.objects.get(name="Dress 0")
+        dress.color = "Green"
+        dress.save()
+        self.assertEqual(facet_index.counts('color')['green'], 1)
+        self.assertEqual(facet_index.total({'color': 'red'}), self.orm_products(color='red').count())
+
+        total = facet_index.total()
+        Product.objects.get(name="Bag 1").delete()
+        self.assertEqual(facet_index.total(), total - 1)
+        dress.available = False
+        dress.save()
+        self.assertNotIn('green', facet_index.counts('color'))
+        self.assertEqual(facet_index.total(), self.orm_products().count())
+
+
+class ProductSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        women = Category.objects.create(name="Womens Wear")
+        bags = Category.objects.create(name="Bags")
+        dresses = SubCategory.objects.create(category=women, name="Dresses")
+        products = [
+            ("Floral Dress", "Cotton summer dress", women, dresses),
+            ("Linen Shirt", "Pairs well with a floral skirt", women, None),
+            ("Cotton Kurta", "Everyday cotton wear", women, None),
+            ("Leather Tote", "Roomy bag for work", bags, None),
+            ("Party Dresses Set", "Two sequinned dresses", women, dresses),
+        ]
+        for name, description, category, subcategory in products:
+            Product.objects.create(name=name, description=description, price=999, category=category,
+                                   subcategory=subcategory, gender='W', stock=5)
+        Product.objects.create(name="Old Floral Dress", description="Dress", price=500, category=women,
+                               gender='W', stock=0, available=False)
+
+    def backends(self):
+        memory = MemoryBackend()
+        memory.rebuild()
+        backends = [memory]
+        if fts5_available():
+            fts5 = FTS5Backend()
+            fts5.rebuild()
+            backends.append(fts5)
+        return backends
+
+    def ids(self, *names):
+        return set(Product.objects.filter(name__in=names).values_list('id', flat=True))
+
+    def test_name_hits_rank_above_description_hits(self):
+        floral_dress, linen_shirt = Product.objects.get(name="Floral Dress"), Product.objects.get(name="Linen Shirt")
+        for backend in self.backends():
+            with self.subTest(backend=backend.name):
+                self.assertEqual(backend.search("floral", 10), [floral_dress.id, linen_shirt.id])
+
+    def test_prefixes_and_plurals_match(self):
+        cases = [
+            ("flor", ("Floral Dress", "Linen Shirt")),
+            ("dresses", ("Floral Dress", "Party Dresses Set")),
+            ("cott dress", ("Floral Dress",)),
+            ("tote", ("Leather Tote",)),
+            ("nothing like this", ()),
+        ]
+        for backend in self.backends():
+            for query, names in cases:
+                with self.subTest(backend=backend.name, query=query):
+                    self.assertEqual(set(backend.search(query, 10)), self.ids(*names))
+
+    def test_backends_agree(self):
+        backends = self.backends()
+        if len(backends) < 2:
+            self.skipTest("SQLite was built without FTS5")
+        memory, fts5 = backends
+        for query in ("dress", "cotton", "flo", "bag", "women", "party dress", "summer cotton dress"):
+            with self.subTest(query=query):
+                self.assertEqual(set(memory.search(query, 10)), set(fts5.search(query, 10)))
+
+    def test_query_syntax_is_not_interpreted(self):
+        for backend in self.backends():
+            for query in ('"', 'dress"', "dress AND", "OR", "NOT dress", "dress*", "(dress", "name:dress",
+                          "dress -shirt", "^dress", "d'ress", "'; DROP TABLE shop_product; --", "***", ""):
+                with self.subTest(backend=backend.name, query=query):
+                    self.assertIsInstance(backend.search(query, 10), list)
+
+    def test_index_follows_saves_and_deletes(self):
+        from shop import search
+        memory = MemoryBackend()
+        memory.rebuild()
+        with mock.patch.object(search, '_backend', memory):
+            tote = Product.objects.get(name="Leather Tote")
+            tote.name = "Canvas Tote"
+            tote.save()
+            self.assertEqual(memory.search("canvas", 10), [tote.id])
+            self.assertEqual(memory.search("leather", 10), [])
+            Product.objects.get(name="Cotton Kurta").delete()
+            self.assertEqual(memory.search("kurta", 10), [])
+            Category.objects.filter(name="Bags").update(name="Luggage")
+            Category.objects.get(name="Luggage").save()
+            self.assertEqual(memory.search("luggage", 10), [tote.id])
+
+    def test_listing_says_when_matches_were_cut_off(self):
+        dresses = ("Floral Dress", "Party Dresses Set")
+        with override_settings(SEARCH_RESULT_LIMIT=1):
+            response = self.client.get('/products/?q=dress')
+        self.assertTrue(response.context['search_truncated'])
+        self.assertEqual(len(response.context['products']), 1)
+        self.assertContains(response, 'Showing the 1 best matches for "dress"')
+
+        with override_settings(SEARCH_RESULT_LIMIT=len(dresses)):
+            response = self.client.get('/products/?q=dresses')
+        self.assertFalse(response.context['search_truncated'])
+        self.assertEqual({product.name for product in response.context['products']}, set(dresses))
+
+    def test_rebuild_command(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from shop import search
+
+        backends = self.backends()
+        Product.objects.filter(name="Leather Tote").update(name="Suede Tote")  # Skips the signals
+        for backend in backends:
+            with self.subTest(backend=backend.name), mock.patch.object(search, '_backend', backend):
+                self.assertEqual(search.search_product_ids("suede"), [])
+                out = StringIO()
+                call_command('rebuild_search_index', stdout=out)
+                self.assertIn(f"Rebuilt the '{backend.name}' search index for 5 products", out.getvalue())
+                self.assertEqual(search.search_product_ids("suede"), list(self.ids("Suede Tote")))
+
+
+class CursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        women = Category.objects.create(name="Womens Wear")
+        for i in range(11):
+            # Three prices only, so most pages end in the middle of a run of equal sort keys
+            Product.objects.create(name=f"Dress {i}", description="Cotton dress", price=(999, 1499, 1999)[i % 3],
+                                   category=women, gender='W', stock=5)
+        Product.objects.create(name="Linen Shirt", description="Shirt", price=999, category=women, gender='W', stock=5)
+
+    def walk(self, paginator):
+        pages = [paginator.page()]
+        while pages[-1].has_next():
+            pages.append(paginator.page(pages[-1].next_cursor))
+        return pages
+
+    def test_next_and_previous_round_trip(self):
+        for ordering in (('price', 'id'), ('-price', '-id'), ('-created', '-id')):
+            with self.subTest(ordering=ordering):
+                paginator = CursorPaginator(Product.objects.all(), 3, ordering)
+                pages = self.walk(paginator)
+                expected = list(Product.objects.order_by(*ordering))
+                self.assertEqual([product for page in pages for product in page], expected)
+                self.assertFalse(pages[0].has_previous())
+
+                for page in reversed(pages[1:]):
+                    previous = paginator.page(page.previous_cursor)
+                    index = pages.index(page) - 1
+                    self.assertEqual(list(previous), list(pages[index]))
+                    self.assertEqual(previous.has_previous(), index > 0)
+
+    def test_ties_on_the_sort_key_are_broken_by_id(self):
+        pages = self.walk(CursorPaginator(Product.objects.all(), 2, ('price', 'id')))
+        ids = [product.id for page in pages for product in page]
+        self.assertEqual(len(ids), len(set(ids)))
+        cheapest = [product.id for page in pages for product in page if product.price == 999]
+        self.assertEqual(cheapest, sorted(cheapest))
+        self.assertEqual(len(ids), Product.objects.count())
+
+    def test_bad_cursors_are_not_found(self):
+        paginator = CursorPaginator(Product.objects.all(), 3, ('price', 'id'))
+        token = paginator.page().next_cursor
+        other_order = CursorPaginator(Product.objects.all(), 3, ('-created', '-id')).page().next_cursor
+        for cursor in ('garbage', 'a:b:c', token[:-2] + ('AA' if token[-2:] != 'AA' else 'BB'), other_order):
+            with self.subTest(cursor=cursor), self.assertRaises(Http404):
+                paginator.page(cursor)
+
+    @override_settings(PRODUCT_LIST_CURSOR_PAGINATION=True)
+    def test_listing(self):
+        cache.clear()
+        facet_index.invalidate()
+        response = self.client.get('/products/?sort_by=price_asc')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['paginator'].count, 12)
+        next_cursor = response.context['page_obj'].next_cursor
+        self.assertEqual(self.client.get('/products/', {'sort_by': 'price_asc', 'cursor': next_cursor}).status_code, 200)
+        self.assertEqual(self.client.get('/products/?sort_by=price_asc&cursor=not-a-cursor').status_code, 404)
+
+        with mock.patch('shop.views.search_product_ids', return_value=list(
+                Product.objects.filter(name__startswith="Dress").values_list('id', flat=True)[:4])):
+            response = self.client.get('/products/?q=dress&sort_by=price_desc')
+        self.assertEqual(response.context['paginator'].count, 4)
+
+
+class PopularityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        women = Category.objects.create(name="Womens Wear")
+        cls.dress, cls.shirt, cls.bag = [
+            Product.objects.create(name=name, description=name, price=999, category=women, gender='W', stock=50)
+            for name in ("Floral Dress", "Linen Shirt", "Tote Bag")
+        ]
+        cls.user = CustomUser.objects.create_user(username='shopper', password='x')
+
+    def scores(self):
+        return {pk: (units, favorites, score) for pk, units, favorites, score in
+                Product.objects.values_list('id', 'units_sold', 'favorites_count', 'popularity')}
+
+    def test_favorite_and_unfavorite_net_to_zero(self):
+        from cart.models import Favorite
+
+        favorite = Favorite.objects.create(user=self.user, product=self.dress)
+        self.dress.refresh_from_db()
+        self.assertEqual(self.dress.favorites_count, 1)
+        self.assertGreater(self.dress.popularity, 0)
+        favorite.delete()
+        self.dress.refresh_from_db()
+        self.assertEqual(self.dress.favorites_count, 0)
+        self.assertAlmostEqual(self.dress.popularity, 0, delta=1e-6 * popularity.decay_boost())
+
+    def test_recent_sale_outranks_older_one(self):
+        now = timezone.now()
+        popularity.record_sales([(self.dress.pk, 2)], when=now - datetime.timedelta(days=60))
+        popularity.record_sales([(self.shirt.pk, 1)], when=now)
+        popularity.record_sales([(self.bag.pk, 1)], when=now - datetime.timedelta(days=1))
+        ranked = list(Product.objects.order_by('-popularity', '-id').values_list('name', flat=True))
+        self.assertEqual(ranked, ["Linen Shirt", "Tote Bag", "Floral Dress"])
+        # Two units sixty days ago (two half-lives) weigh what half a unit sold today does
+        self.dress.refresh_from_db()
+        self.shirt.refresh_from_db()
+        self.assertTrue(math.isclose(self.dress.popularity * 2, self.shirt.popularity, rel_tol=1e-9))
+
+    def test_recompute_all_matches_the_incremental_scores(self):
+        from cart.models import Favorite, Order, Order_items
+
+        now = timezone.now()
+        for days_ago, lines in ((40, [(self.dress, 2), (self.shirt, 1)]), (3, [(self.dress, 1)]), (0, [(self.bag, 4)])):
+            ordered_date = now - datetime.timedelta(days=days_ago)
+            order = Order.objects.create(user=self.user, address='1 Main St', phone=5550100, payment_method='COD',
+                                         is_ordered=True, ordered_date=ordered_date)
+            Order_items.objects.bulk_create([Order_items(order=order, product=product, quantity=quantity)
+                                             for product, quantity in lines])
+            popularity.record_sales([(product.pk, quantity) for product, quantity in lines], when=ordered_date)
+        Order.objects.create(user=self.user, address='1 Main St', phone=5550100, payment_method='ONLINE')
+        Favorite.objects.create(user=self.user, product=self.shirt)
+        Favorite.objects.create(user=self.user, product=self.bag).delete()
+
+        incremental = self.scores()
+        Product.objects.update(units_sold=0, favorites_count=0, popularity=0)
+        self.assertEqual(popularity.recompute_all(), 3)
+        recomputed = self.scores()
+        for pk, (units, favorites, score) in incremental.items():
+            with self.subTest(product=pk):
+                self.assertEqual(recomputed[pk][:2], (units, favorites))
+                self.assertTrue(math.isclose(recomputed[pk][2], score, rel_tol=1e-9, abs_tol=1e-6))
+
+
+class CatalogCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.women = Category.objects.create(name="Womens Wear")
+        cls.dress = Product.objects.create(name="Floral Dress", description="Cotton dress", price=999,
+                                           category=cls.women, gender='W', stock=5)
+
+    def setUp(self):
+        cache.clear()  # Entries from earlier tests outlive their test database
+
+    def test_catalog_changes_bump_the_version(self):
+        changes = [
+            lambda: Product.objects.get(pk=self.dress.pk).save(),
+            lambda: Category.objects.get(pk=self.women.pk).save(),
+            lambda: SubCategory.objects.create(category=self.women, name="Dresses"),
+            lambda: Product.objects.get(pk=self.dress.pk).delete(),
+        ]
+        for change in changes:
+            version = catalog_cache.get_version()
+            with self.captureOnCommitCallbacks(execute=True):
+                change()
+            self.assertNotEqual(catalog_cache.get_version(), version)
+
+    def test_bumps_replace_the_version_without_incr(self):
+        # FileBasedCache.incr() is a get + set that can lose a concurrent bump
+        version = catalog_cache.get_version()
+        with mock.patch.object(cache, 'incr', side_effect=AssertionError("incr is not atomic on every backend")):
+            bumped = catalog_cache.bump_version()
+        self.assertNotEqual(bumped, version)
+        self.assertEqual(catalog_cache.get_version(), bumped)
+
+    def test_product_changes_leave_the_navigation_version_alone(self):
+        version = catalog_cache.get_version(catalog_cache.NAVIGATION)
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.get(pk=self.dress.pk).save()
+        self.assertEqual(catalog_cache.get_version(catalog_cache.NAVIGATION), version)
+
+    def test_detail_page_is_refetched_after_a_change(self):
+        url = f'/productdetail/{self.dress.pk}/'
+        self.assertContains(self.client.get(url), "999")
+
+        Product.objects.filter(pk=self.dress.pk).update(price=1299)  # Bypasses the signals: still cached
+        self.assertNotContains(self.client.get(url), "1299")
+        with self.captureOnCommitCallbacks(execute=True):
+            dress = Product.objects.get(pk=self.dress.pk)
+            dress.save()
+        self.assertContains(self.client.get(url), "1299")
+
+    def test_popularity_listing_follows_favorites(self):
+        from cart.models import Favorite
+
+        bag = Product.objects.create(name="Tote Bag", description="Bag", price=499, category=self.women,
+                                     gender='W', stock=5)
+        user = CustomUser.objects.create_user(username='shopper', password='x')
+        url = '/products/?sort_by=popularity'
+        self.assertEqual(self.client.get(url).context['products'][0], bag)  # Newest first on a tie
+
+        version = catalog_cache.get_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            Favorite.objects.create(user=user, product=self.dress)
+        self.assertEqual(self.client.get(url).context['products'][0], self.dress)
+        # Only the popularity-sorted pages were orphaned
+        self.assertEqual(catalog_cache.get_version(), version)
+
+
+class NavigationMenuTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.women = Category.objects.create(name="Womens Wear")
+        SubCategory.objects.create(category=cls.women, name="Dresses")
+
+    def setUp(self):
+        cache.clear()
+        context_processors._nav_menu = (None, None, None)
+
+    def test_menu_is_rendered_once_per_version(self):
+        with mock.patch('shop.context_processors.render_to_string',
+                        wraps=context_processors.render_to_string) as render:
+            tree, html = context_processors.get_nav_menu()
+            self.assertIn("Dresses", html)
+            self.assertEqual(tree[0]['subcategories'], [{'id': mock.ANY, 'name': "Dresses"}])
+            with self.assertNumQueries(0):
+                for _ in range(3):
+                    self.assertEqual(context_processors.get_nav_menu()[1], html)
+            # Product changes do not touch the menu
+            with self.captureOnCommitCallbacks(execute=True):
+                Product.objects.create(name="Floral Dress", description="Dress", price=999, category=self.women,
+                                       gender='W', stock=5)
+            context_processors.get_nav_menu()
+            self.assertEqual(render.call_count, 1)
+
+    def test_menu_is_rebuilt_after_category_changes(self):
+        context_processors.get_nav_menu()
+        def rename_category():
+            category = Category.objects.get(pk=self.women.pk)
+            category.name = "Ladies"
+            category.save()
+
+        changes = [
+            (lambda: SubCategory.objects.create(category=self.women, name="Kurtas"), "Kurtas"),
+            (rename_category, "Ladies"),
+            (lambda: SubCategory.objects.get(name="Dresses").delete(), None),
+        ]
+        for change, expected in changes:
+            with self.captureOnCommitCallbacks(execute=True):
+                change()
+            html = context_processors.get_nav_menu()[1]
+            if expected:
+                self.assertIn(expected, html)
+        self.assertNotIn("Dresses", html)
+
+
+class ReadinessTests(TestCase):
+    def tearDown(self):
+        warmup._ready.clear()
+
+    def test_ready_without_boot_warm_up(self):
+        self.assertEqual(self.client.get('/ready/').status_code, 200)
+
+    @override_settings(WARMUP_ON_BOOT=True)
+    def test_not_ready_until_warmed_up(self):
+        self.assertEqual(self.client.get('/ready/').status_code, 503)
+        warmup.warm_up(freeze=False)
+        self.assertEqual(self.client.get('/ready/').status_code, 200)
+
+
+class ImportCostTests(unittest.TestCase):
+    def test_urlconf_does_not_import_chatbot_libraries(self):
+        from django.core.management import call_command
+        from io import StringIO
+
+        # Raises CommandError if spaCy/scikit-learn/... are imported while loading the URLconf
+        call_command('benchmark_imports', stdout=StringIO())
+
+
+class ChatbotCacheTests(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache('test', maxsize=2, ttl=60)
+        cache.set('hi', 'greeting')
+        cache.set('bye', 'goodbye')
+        cache.get('hi')
+        cache.set('show me dresses', 'product_search_query')
+        self.assertEqual(cache.get('hi'), 'greeting')
+        self.assertIsNone(cache.get('bye'))
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_entries_expire(self):
+        cache = LRUCache('test', maxsize=10, ttl=5)
+        with mock.patch('shop.chatbot_cache.time.monotonic', return_value=100.0):
+            cache.set('hi', 'greeting')
+        with mock.patch('shop.chatbot_cache.time.monotonic', return_value=106.0):
+            self.assertIsNone(cache.get('hi'))
+        self.assertEqual(cache.stats()['size'], 0)
+
+    def test_get_or_set_counts_hits_and_misses(self):
+        cache = LRUCache('test', maxsize=10, ttl=60)
+        builder = mock.Mock(return_value='greeting')
+        for message in ('Hi', ' hi ', 'HI'):
+            self.assertEqual(cache.get_or_set(normalize_message(message), builder), 'greeting')
+        builder.assert_called_once_with()
+        self.assertEqual((cache.stats()['hits'], cache.stats()['misses']), (2, 1))
+
+
+class ChatbotProductIndexTests(TestCase):
+    """The attribute index must return exactly what the chatbot's ORM filters return."""
+
+    @classmethod
+    def setUpTestData(cls):
+        women = Category.objects.create(name="Womens Wear")
+        kids = Category.objects.create(name="Kids Wear")
+        shoes = Category.objects.create(name="Footwear")
+        bags = Category.objects.create(name="Bags")
+        jewellery = Category.objects.create(name="Jewellery")
+        dresses = SubCategory.objects.create(category=women, name="Dresses")
+        sneakers = SubCategory.objects.create(category=shoes, name="Sneakers")
+        rings = SubCategory.objects.create(category=jewellery, name="Rings")
+        products = [
+            ("Floral Dress", "Cotton summer dress", women, dresses, 'W', "Red", "M"),
+            ("Denim Jacket", "Blue denim jacket with shirt collar", women, None, 'W', "Blue", "L"),
+            ("Graphic T-Shirt", "Soft tee", kids, None, 'K', "red", "s"),
+            ("Running Shoe", "Light sneaker", shoes, sneakers, 'M', "White", "XL"),
+            ("Tote Bag", "Faux leather bag", bags, None, 'U', "Black", None),
+            ("Laptop Backpack", "Padded backpack", bags, None, 'M', "Grey", None),
+            ("Gold Ring", "Ring with a stone", jewellery, rings, 'U', "Gold", None),
+            ("Pearl Necklace", "Necklace for a party dress", jewellery, None, 'W', "White", None),
+            ("Canvas Cap", "Everyday cap", bags, None, 'U', "Blue", "M"),
+        ]
+        for name, description, category, subcategory, gender, color, size in products:
+            Product.objects.create(name=name, description=description, price=999, category=category,
+                                   subcategory=subcategory, gender=gender, stock=5, color=color, size=size)
+        Product.objects.create(name="Old Dress", description="Dress", price=500, category=women, gender='W',
+                               stock=0, color="Red", size="M", available=False)
+
+    def assertMatchesQueryset(self, index, *slots):
+        expected = set(_build_chatbot_product_queryset(*slots, "show me").values_list('id', flat=True))
+        self.assertEqual(index.matching_ids(*slots), expected)
+
+    def test_every_slot_value_matches_the_orm_filters(self):
+        index = ChatbotProductIndex()
+        for group in CATEGORY_GROUPS:
+            with self.subTest(group=group):
+                self.assertMatchesQueryset(index, group, None, None, None)
+        for item_type in ITEM_TYPES:
+            with self.subTest(item_type=item_type):
+                self.assertMatchesQueryset(index, None, item_type, None, None)
+        for slots in [(None, None, "red", None), (None, None, None, "S"), ("women_clothing", "dress", "red", "M"),
+                      ("accessories", None, "white", None), ("bags", None, None, "M")]:
+            with self.subTest(slots=slots):
+                self.assertMatchesQueryset(index, *slots)
+
+    def test_lookup_without_slots_defers_to_the_text_search(self):
+        self.assertIsNone(ChatbotProductIndex().lookup())
+
+    def test_saved_products_are_reindexed(self):
+        index = ChatbotProductIndex()
+        index.build()
+        dress = Product.objects.get(name="Floral Dress")
+        dress.color = "Green"
+        with self.assertNumQueries(0):  # Category names come from the index, not dress.category
+            index.update_product(dress)
+        self.assertEqual(index.lookup(None, None, "green", None), [(dress.pk, "Floral Dress", dress.price)])
+        self.assertEqual(index.lookup(None, "dress", "red", None), [])
+
+    def test_saves_reach_the_index_on_commit(self):
+        index = ChatbotProductIndex()
+        index.build()
+        with mock.patch('shop.signals.chatbot_index', index):
+            with self.captureOnCommitCallbacks(execute=True):
+                dress = Product.objects.get(name="Floral Dress")
+                dress.color = "Green"
+                dress.save()
+                self.assertEqual(index.lookup(None, None, "green", None), [])
+            self.assertEqual(index.lookup(None, None, "green", None), [(dress.pk, "Floral Dress", dress.price)])
+
+            with self.captureOnCommitCallbacks(execute=True):
+                dress.delete()
+            self.assertEqual(index.lookup(None, None, "green", None), [])
+
+
+class SlotMatcherTests(unittest.TestCase):
+    def test_extracts_every_slot_in_one_pass(self):
+        self.assertEqual(extract_slots("show me women's red dresses in size m"), ("women_clothing", "dress", "red", "M"))
+
+    def test_multi_word_and_hyphenated_phrases(self):
+        self.assertEqual(extract_slots("i want extra large white t-shirts")[1:], ("t-shirt", "white", "XL"))
+        self.assertEqual(extract_slots("a green gown in x-large")[1:], ("dress", "green", "XL"))
+
+    def test_matches_whole_words_only(self):
+        self.assertEqual(extract_slots("can you recommend something"), (None, None, None, None))
+        self.assertEqual(extract_slots("i'm looking for scarves"), (None, None, None, None))
+        self.assertEqual(extract_slots("gold earrings for women")[0], "accessories")
+
+
+class ChatbotNlpTests(unittest.TestCase):
+    MESSAGE = "show me women's red dresses and two pairs of shoes"
+
+    def assertUsablePipeline(self, nlp):
+        doc = nlp(self.MESSAGE)
+        self.assertEqual([token.text for token in doc][:5], ["show", "me", "women", "'s", "red"])
+        lemmas = {token.lower_: token.lemma_ for token in doc}
+        self.assertEqual((lemmas['dresses'], lemmas['shoes'], lemmas['pairs']), ('dress', 'shoe', 'pair'))
+        self.assertEqual(chatbot._extract_product_slots(nlp, "women's red dresses in size m"),
+                         ('women_clothing', 'dress', 'red', 'M'))
+
+    def test_blank_mode_needs_no_model_package(self):
+        with mock.patch('spacy.load', side_effect=AssertionError("blank mode must not load a model")):
+            nlp = chatbot_nlp.load_nlp('blank')
+        self.assertEqual(nlp.pipe_names, ['fashion_lemmatizer'])
+        self.assertUsablePipeline(nlp)
+        self.assertEqual(nlp("women")[0].lemma_, 'woman')
+
+    def test_lean_mode_falls_back_without_the_model_package(self):
+        with mock.patch('spacy.load', side_effect=OSError("[E050] Can't find model 'en_core_web_sm'")) as load:
+            nlp = chatbot_nlp.load_nlp('lean')
+        load.assert_called_once_with(chatbot_nlp.MODEL_NAME, exclude=chatbot_nlp.LEAN_EXCLUDE)
+        self.assertEqual(nlp.pipe_names, ['fashion_lemmatizer'])
+        self.assertUsablePipeline(nlp)
+
+    @unittest.skipUnless(importlib.util.find_spec(chatbot_nlp.MODEL_NAME), "spaCy model package not installed")
+    def test_lean_mode_drops_the_parser_and_ner(self):
+        nlp = chatbot_nlp.load_nlp('lean')
+        self.assertTrue(set(chatbot_nlp.LEAN_EXCLUDE).isdisjoint(nlp.pipe_names))
+        self.assertIn('lemmatizer', nlp.pipe_names)
+        self.assertUsablePipeline(nlp)
+
+
+class ChatbotBatchTests(unittest.TestCase):
+    def test_scores_below_the_threshold_fall_back(self):
+        import numpy
+
+        clf = mock.Mock(classes_=numpy.array(['greeting', 'goodbye', 'product_search_query']))
+        scores = numpy.array([[0.8, -1.0, -0.2], [-0.9, -0.7, -0.6], [-1.0, -0.3, 0.1]])
+        self.assertEqual(chatbot._tags_for_scores(clf, scores, -0.5), ['greeting', 'fallback', 'product_search_query'])
+        self.assertEqual(chatbot._tags_for_scores(clf, scores, -0.6)[1], 'fallback')
+        self.assertEqual(chatbot._tags_for_scores(clf, scores, -0.65)[1], 'product_search_query')
+
+    def test_two_intent_models_score_every_intent(self):
+        import numpy
+
+        # LinearSVC returns one score per message for two classes, positive for classes_[1]
+        clf = mock.Mock(classes_=numpy.array(['goodbye', 'greeting']),
+                        decision_function=mock.Mock(return_value=numpy.array([0.7, -0.9, 0.2])))
+        scores = chatbot._class_scores(clf, None)
+        self.assertEqual(scores.shape, (3, 2))
+        self.assertEqual(chatbot._tags_for_scores(clf, scores, -0.5), ['greeting', 'goodbye', 'greeting'])
+        self.assertEqual(chatbot._tags_for_scores(clf, scores, 0.5), ['greeting', 'goodbye', 'fallback'])
+
+    def test_percentile_is_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual((percentile(values, 0.5), percentile(values, 0.95), percentile(values, 0.99)), (50, 95, 99))
+        self.assertIsNone(percentile([], 0.5))
+
+
+class IntentsFileTestCase(unittest.TestCase):
+    """Points the chatbot at a temporary intents file and artifact directory."""
+    INTENTS = [
+        {"tag": "greeting", "patterns": ["hi", "hello"], "responses": ["Hello!"]},
+        {"tag": "goodbye", "patterns": ["bye", "see you"], "responses": ["Bye!"]},
+    ]
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.intents_path = os.path.join(directory.name, 'intents.json')
+        self.artifact_dir = os.path.join(directory.name, 'artifacts')
+        self.write_intents(self.INTENTS)
+        patcher = override_settings(CHATBOT_INTENTS_PATH=self.intents_path, CHATBOT_ARTIFACT_DIR=self.artifact_dir)
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+
+    def write_intents(self, intents):
+        with open(self.intents_path, 'w', encoding='utf-8') as f:
+            json.dump(intents, f)
+        # Make sure the change is visible even on filesystems with coarse timestamps
+        stat = os.stat(self.intents_path)
+        os.utime(self.intents_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    def artifacts(self):
+        return sorted(os.listdir(self.artifact_dir)) if os.path.isdir(self.artifact_dir) else []
+
+
+class ChatbotModelArtifactTests(IntentsFileTestCase):
+    THANKS = {"tag": "thanks", "patterns": ["thank you"], "responses": ["Welcome!"]}
+
+    def digest(self):
+        with open(self.intents_path, 'rb') as f:
+            return chatbot_model.model_digest(f.read())
+
+    def test_artifacts_are_keyed_by_the_intents_and_sklearn_version(self):
+        digest = self.digest()
+        self.assertEqual(self.digest(), digest)
+        with mock.patch('sklearn.__version__', '0.0'):
+            self.assertNotEqual(self.digest(), digest)
+        self.write_intents(self.INTENTS + [self.THANKS])
+        self.assertNotEqual(self.digest(), digest)
+        self.assertNotEqual(chatbot_model.artifact_path(self.digest()), chatbot_model.artifact_path(digest))
+
+    def test_prebuilt_artifact_is_memory_mapped(self):
+        import numpy
+
+        path, digest = chatbot_model.build_artifact()
+        self.assertEqual(self.artifacts(), [os.path.basename(path)])
+        with mock.patch('shop.chatbot_model.train') as train:
+            intents, vectorizer, clf, loaded_digest = chatbot_model.load_model()
+        train.assert_not_called()
+        self.assertEqual((intents, loaded_digest), (self.INTENTS, digest))
+        self.assertIsInstance(clf.coef_, numpy.memmap)
+        self.assertFalse(clf.coef_.flags.writeable)
+        self.assertEqual(clf.predict(vectorizer.transform(["hello"]))[0], "greeting")
+
+    def test_stale_artifact_is_rebuilt(self):
+        _, old_digest = chatbot_model.build_artifact()
+        self.write_intents(self.INTENTS + [self.THANKS])
+        intents, _, clf, digest = chatbot_model.load_model()
+        self.assertNotEqual(digest, old_digest)
+        self.assertIn('thanks', clf.classes_)
+        self.assertEqual(len(self.artifacts()), 2)  # Written for the next worker
+        self.assertIsNotNone(chatbot_model.load_artifact(digest))
+
+        # An artifact whose payload belongs to other intents is never used
+        os.replace(chatbot_model.artifact_path(old_digest), chatbot_model.artifact_path(digest))
+        self.assertIsNone(chatbot_model.load_artifact(digest))
+        with open(chatbot_model.artifact_path(digest), 'wb') as f:
+            f.write(b'truncated')
+        self.assertIsNone(chatbot_model.load_artifact(digest))
+
+    def test_build_command_prunes_old_artifacts(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        call_command('build_chatbot_model', stdout=StringIO())
+        self.write_intents(self.INTENTS + [self.THANKS])
+        call_command('build_chatbot_model', '--keep-old', stdout=StringIO())
+        self.assertEqual(len(self.artifacts()), 2)
+        self.write_intents(self.INTENTS)
+        call_command('build_chatbot_model', stdout=StringIO())
+        self.assertEqual(self.artifacts(), [os.path.basename(chatbot_model.artifact_path(self.digest()))])
+
+
+class ChatbotModelRegistryTests(IntentsFileTestCase):
+    def test_edited_intents_are_swapped_in_after_a_background_reload(self):
+        registry = ModelRegistry()
+        old = registry.get()
+        self.assertIsNone(registry.check_for_changes(force=True))
+
+        self.write_intents(self.INTENTS + [{"tag": "thanks", "patterns": ["thank you"], "responses": ["Welcome!"]}])
+        registry.check_for_changes(force=True).join()
+
+        new = registry.get()
+        self.assertNotEqual(new.digest, old.digest)
+        self.assertIn('thanks', new.clf.classes_)
+        self.assertNotIn('thanks', old.clf.classes_)  # Snapshots taken before the swap are left alone
+
+    def test_two_intent_model_classifies_batches(self):
+        with mock.patch('shop.chatbot_registry.registry', ModelRegistry()):
+            self.assertEqual(chatbot.classify_messages(["Hello", "bye", "hi"]), ['greeting', 'goodbye', 'greeting'])
+
+    def test_invalid_intents_keep_the_current_model(self):
+        registry = ModelRegistry()
+        old = registry.get()
+        with open(self.intents_path, 'a', encoding='utf-8') as f:
+            f.write('{not json')
+        thread = registry.check_for_changes(force=True)
+        thread.join()
+        self.assertIs(registry.get(), old)
+
+
+class ChatbotStreamTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        women = Category.objects.create(name="Womens Wear")
+        cls.dress = Product.objects.create(name="Floral Dress", description="Cotton summer dress", price=799,
+                                           category=women, gender='W', stock=5, color="Red", size="M")
+
+    async def read_events(self, url):
+        response = await self.async_client.get(url)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = ''.join([chunk.decode() async for chunk in response.streaming_content])
+        events = []
+        for block in body.strip().split('\n\n'):
+            name, data = block.split('\n')
+            events.append((name.removeprefix('event: '), json.loads(data.removeprefix('data: '))))
+        return events
+
+    @mock.patch('shop.chatbot._load_nlp', return_value=None)
+    @mock.patch('shop.chatbot_registry.registry.get', return_value=EMPTY_MODEL)
+    async def test_reply_is_sent_before_the_product_matches(self, *mocks):
+        from shop.chatbot_index import chatbot_index
+        chatbot_index.invalidate()
+
+        with mock.patch('shop.chatbot._analyze_message',
+                        return_value=('product_search_query', (None, 'dress', 'red', None))):
+            events = await self.read_events('/chatbot/stream/?message=show+me+red+dresses')
+
+        self.assertEqual([name for name, _ in events], ['reply', 'products', 'done'])
+        self.assertEqual(events[0][1]['response'], "Looking for dress red...")
+        self.assertIn("Floral Dress", events[1][1]['response'])
+
+    @mock.patch('shop.chatbot._load_nlp', return_value=None)
+    @mock.patch('shop.chatbot_registry.registry.get', return_value=EMPTY_MODEL)
+    async def test_embeddable_and_csrf_exempt(self, *mocks):
+        from django.test import AsyncClient
+
+        client = AsyncClient(enforce_csrf_checks=True)
+        with mock.patch('shop.chatbot._analyze_message', return_value=('greeting', None)):
+            response = await client.post('/chatbot/stream/', {'message': 'hi'}, content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('X-Frame-Options', response)
+            self.assertEqual((await client.post('/chatbot/stream/', 'not json',
+                                                content_type='application/json')).status_code, 400)
+
+    @mock.patch('shop.chatbot._load_nlp', return_value=None)
+    @mock.patch('shop.chatbot_registry.registry.get', return_value=EMPTY_MODEL)
+    async def test_other_intents_get_a_single_reply(self, *mocks):
+        with mock.patch('shop.chatbot._analyze_message', return_value=('greeting', None)):
+            events = await self.read_events('/chatbot/stream/?message=hi')
+        self.assertEqual([name for name, _ in events], ['reply', 'done'])
+
+
+class ChatbotSessionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        women = Category.objects.create(name="Womens Wear")
+        for name, color, size in [("Floral Dress", "Red", "M"), ("Party Dress", "Red", "S"),
+                                  ("Summer Dress", "Blue", "M"), ("Linen Shirt", "Red", "M")]:
+            Product.objects.create(name=name, description=name, price=999, category=women, gender='W',
+                                   stock=5, color=color, size=size)
+
+    def setUp(self):
+        cache.clear()
+        chatbot.chatbot_index.invalidate()
+
+    def test_slots_pack_into_one_int(self):
+        for slots in [chatbot_sessions.NO_SLOTS, ('women_clothing', 'dress', 'red', 'M'), (None, 'shirt', None, 'XXL')]:
+            with self.subTest(slots=slots):
+                packed = chatbot_sessions.pack_slots(slots)
+                self.assertIsInstance(packed, int)
+                self.assertEqual(chatbot_sessions.unpack_slots(packed), slots)
+
+    def test_follow_ups_refine_until_the_item_type_changes(self):
+        dresses = (None, 'dress', None, None)
+        red = chatbot_sessions.merge_slots(dresses, (None, None, 'red', None))
+        self.assertEqual(red, (None, 'dress', 'red', None))
+        self.assertTrue(chatbot_sessions.is_refinement(dresses, red))
+        shirts = chatbot_sessions.merge_slots(red, (None, 'shirt', None, None))
+        self.assertEqual(shirts, (None, 'shirt', None, None))
+        self.assertFalse(chatbot_sessions.is_refinement(red, shirts))
+
+    def test_naming_the_other_kind_of_product_starts_over(self):
+        dresses = (None, 'dress', None, None)
+        self.assertEqual(chatbot_sessions.merge_slots(dresses, ('bags', None, None, None)), ('bags', None, None, None))
+        self.assertEqual(chatbot_sessions.merge_slots(('shoes', None, 'red', None), (None, 'dress', None, None)),
+                         (None, 'dress', None, None))
+        self.assertEqual(chatbot_sessions.merge_slots((None, None, 'red', None), dresses), (None, 'dress', 'red', None))
+        self.assertEqual(chatbot_sessions.merge_slots(('women_clothing', 'dress', None, None), dresses),
+                         ('women_clothing', 'dress', None, None))
+
+    @mock.patch('shop.chatbot._load_nlp', return_value=None)
+    @mock.patch('shop.chatbot_registry.registry.get', return_value=EMPTY_MODEL)
+    def test_sessions_are_shared_and_expire_to_a_fresh_search(self, *mocks):
+        with mock.patch.object(cache, 'set', wraps=cache.set) as store:
+            chatbot._get_chatbot_response_logic("show me dresses", "conversation-3")
+        key = chatbot_sessions._cache_key("conversation-3")
+        store.assert_called_once_with(key, mock.ANY, settings.CHATBOT_SESSION_TTL)
+        self.assertEqual(chatbot_sessions.load("conversation-3")[0], (None, 'dress', None, None))
+
+        cache.delete(key)  # Expired: the next message is a search of its own, not a refinement of dresses
+        reply = chatbot._get_chatbot_response_logic("show me red", "conversation-3")
+        self.assertIn("Linen Shirt", reply)
+        self.assertEqual(chatbot_sessions.load("conversation-3")[0], (None, None, 'red', None))
+
+    @mock.patch('shop.chatbot._load_nlp', return_value=None)
+    @mock.patch('shop.chatbot_registry.registry.get', return_value=EMPTY_MODEL)
+    def test_dresses_then_bags_searches_for_bags(self, *mocks):
+        bags = Category.objects.create(name="Bags")
+        Product.objects.create(name="Tote Bag", description="Bag", price=999, category=bags, gender='U', stock=5)
+        self.assertIn("Summer Dress", chatbot._get_chatbot_response_logic("show me dresses", "conversation-2"))
+        reply = chatbot._get_chatbot_response_logic("show me bags", "conversation-2")
+        self.assertIn("Tote Bag", reply)
+        self.assertNotIn("Dress", reply)
+        self.assertEqual(chatbot_sessions.load("conversation-2")[0], ('bags', None, None, None))
+
+    @mock.patch('shop.chatbot._load_nlp', return_value=None)
+    @mock.patch('shop.chatbot_registry.registry.get', return_value=EMPTY_MODEL)
+    def test_follow_ups_filter_the_previous_results(self, *mocks):
+        reply = chatbot._get_chatbot_response_logic("show me dresses", "conversation-1")
+        self.assertIn("Summer Dress", reply)
+        with mock.patch.object(chatbot.chatbot_index, 'matching_ids', wraps=chatbot.chatbot_index.matching_ids) as lookup:
+            reply = chatbot._get_chatbot_response_logic("in red", "conversation-1")
+            self.assertEqual(sorted(lookup.call_args.kwargs['candidate_ids']),
+                             sorted(Product.objects.filter(name__endswith="Dress").values_list('id', flat=True)))
+        self.assertIn("Party Dress", reply)
+        self.assertNotIn("Summer Dress", reply)
+
+        reply = chatbot._get_chatbot_response_logic("size m", "conversation-1")
+        self.assertIn("Floral Dress", reply)
+        self.assertNotIn("Party Dress", reply)
+        self.assertEqual(chatbot_sessions.load("conversation-1")[0], (None, 'dress', 'red', 'M'))
+        # Without a conversation the same message is answered on its own
+        self.assertNotIn("Floral Dress", chatbot._get_chatbot_response_logic("size m"))
@@ -53,6 +53,10 @@ urlpatterns = [
 
 # --- CHATBOT URL ---
     path('chatbot/', views.ChatbotView.as_view(), name='chatbot'),
+    path('chatbot/stream/', views.ChatbotStreamView.as_view(), name='chatbot_stream'),
+    path('chatbot/batch/', views.ChatbotBatchView.as_view(), name='chatbot_batch'),
+    path('chatbot/stats/', views.ChatbotStatsView.as_view(), name='chatbot_stats'),
+    path('ready/', views.ReadinessView.as_view(), name='ready'),
     # ... (URLs for any new pages linked in chatbot_intents.json like /returns/, /track-order/ etc.) ...
     path('returns/', views.HelpView.as_view(), name='returns_policy'), # Example placeholder
     path('track-order/', views.HelpView.as_view(), name='track_order'), # Example placeholder
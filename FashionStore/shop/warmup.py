@@ -0,0 +1,76 @@
+"""
+Boot-time warm-up of the chatbot and the in-process catalog state.
+
+The Fashion Bot (spaCy pipeline + intent classifier), the facet index, the
+in-memory search index and the navigation menu are all built lazily, on the
+first request that needs them in each worker. Every freshly forked or
+recycled gunicorn worker therefore served a slow first request and kept a
+private copy of the spaCy model and SVM.
+
+With WARMUP_ON_BOOT enabled, gunicorn.conf.py preloads the application and
+calls ShopConfig.warm_up() in the master process before any worker is forked.
+Workers then inherit the loaded objects and share their memory pages
+copy-on-write; gc.freeze() moves them out of the collector's generations so
+that a collection in a worker does not write to (and so copy) those pages.
+
+is_ready() backs the /ready/ endpoint: with warm-up enabled it only passes
+once warm_up() has finished in this process (or in the master it was forked from).
+"""
+import gc
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+
+import logging
+logger = logging.getLogger(__name__)
+
+_ready = threading.Event()
+
+
+def enabled():
+    return getattr(settings, 'WARMUP_ON_BOOT', False)
+
+
+def is_ready():
+    return _ready.is_set() or not enabled()
+
+
+def _timed(label, step):
+    started = time.perf_counter()
+    try:
+        step()
+    except Exception as e:
+        # A cold cache is slower, not broken; the first request builds it as before
+        logger.error(f"Warm-up step '{label}' failed: {e}", exc_info=True)
+        return
+    logger.info(f"Warm-up: {label} in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+
+def warm_up(freeze=True):
+    """
+    Loads the chatbot and builds the hot catalog caches in this process, then
+    closes the database connections it opened (a forked worker must not reuse
+    its parent's socket). Safe to call more than once.
+    """
+    from . import chatbot, search
+    from .context_processors import get_nav_menu
+    from .chatbot_index import chatbot_index
+    from .facets import facet_index
+
+    started = time.perf_counter()
+    try:
+        _timed('chatbot model', chatbot._load_fashion_bot_resources)
+        _timed('facet index', facet_index.build)
+        _timed('chatbot product index', chatbot_index.build)
+        if search.get_backend().name == 'memory':  # FTS5 lives in the database
+            _timed('search index', search.rebuild_index)
+        _timed('navigation menu', get_nav_menu)
+    finally:
+        connections.close_all()
+    if freeze:
+        gc.collect()
+        gc.freeze()
+    _ready.set()
+    logger.info(f"Warm-up finished in {time.perf_counter() - started:.2f}s")